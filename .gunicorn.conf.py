@@ -0,0 +1,64 @@
+"""Gunicorn settings; render.yaml runs `gunicorn -c .gunicorn.conf.py wsgi:app`.
+
+GUNICORN_WORKER_CLASS picks how a worker process holds concurrent interviews:
+
+- gevent (default): each request runs in a greenlet. Waiting on OpenAI (HTTP
+  calls, run polling, retry backoff) switches to another request, so one
+  worker holds up to GUNICORN_WORKER_CONNECTIONS requests at once.
+- eventlet: the same with eventlet's green threads.
+- gthread: GUNICORN_THREADS OS threads per worker.
+- sync: one request per worker at a time.
+
+WEB_CONCURRENCY sets the number of worker processes (default: one per CPU,
+or 2 * CPUs + 1 for sync workers). Any setting can still be overridden on
+the command line, e.g. `-w 1 -b 127.0.0.1:5001`.
+"""
+import multiprocessing
+import os
+import time
+
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gevent")
+
+# Workers ignore logging changes (LOG_CONTROL_FILE) from before this point
+os.environ["SERVER_STARTED_AT"] = str(time.time())
+
+if worker_class == "gevent":
+    try:
+        # httpcore uses trio when it is installed, and trio needs select.epoll,
+        # which patching removes; trio only runs async code, so it can keep
+        # the real one
+        import trio  # noqa: F401
+    except ImportError:
+        pass
+    # Patch before gunicorn imports more of the standard library (ssl in
+    # particular), so neither the master nor the workers keep blocking versions
+    from gevent import monkey
+
+    monkey.patch_all()
+
+GREEN_WORKERS = ("gevent", "eventlet")
+cpus = multiprocessing.cpu_count()
+
+bind = f"0.0.0.0:{os.getenv('PORT', 10000)}"
+workers = int(os.getenv("WEB_CONCURRENCY", 2 * cpus + 1 if worker_class == "sync" else cpus))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 200))
+if worker_class == "gthread":
+    threads = int(os.getenv("GUNICORN_THREADS", 8))
+
+# A final answer waits for the whole resolution run (up to OPENAI_TOTAL_TIMEOUT
+# plus polling); a sync worker that is still waiting must not be killed. Green
+# workers only miss their heartbeat if something blocks the event loop.
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 150))
+graceful_timeout = 30
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+
+# Import the app in each worker, after it has patched the standard library;
+# the app's pools, locks and background threads are then green ones
+preload_app = False
+
+if worker_class in GREEN_WORKERS:
+    # Every request a worker holds may be waiting on OpenAI at once; the
+    # per-process defaults are sized for a handful of threads
+    os.environ.setdefault("OPENAI_POOL_MAX_CONNECTIONS", str(worker_connections))
+    os.environ.setdefault("OPENAI_POOL_MAX_KEEPALIVE", str(min(worker_connections, 100)))
+    os.environ.setdefault("OPENAI_MAX_CONCURRENCY", str(worker_connections))
@@ -1,232 +1,206 @@
-from flask import Flask, render_template, request, jsonify, send_from_directory
-from openai import OpenAI
+import startup
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context, g
 import os
 import json
 from dotenv import load_dotenv
 from flask_cors import CORS
-import re
-import traceback
 from datetime import datetime
+from dataclasses import dataclass
+import uuid
 import time
-import markdown
-from pydantic import BaseModel, Field
-from typing import Literal, List, Optional, Union
+import functools
+import markdown_render
+from assistant_registry import AssistantRegistry
+from prompts import (
+    ASSISTANT_MODEL,
+    FIRST_QUESTION_INSTRUCTIONS,
+    GENERATE_RESOLUTION_INSTRUCTIONS,
+    NEXT_QUESTION_INSTRUCTIONS,
+    QUESTION_ASSISTANT_INSTRUCTIONS,
+    RESOLUTION_ASSISTANT_INSTRUCTIONS,
+    RESOLUTION_PLAN_INSTRUCTIONS,
+    REPAIR_QUESTION_INSTRUCTIONS,
+    initial_user_message,
+    resolution_request_message,
+)
+from fast_json import FastJSONProvider
+from transcript_store import create_transcript_store
+from resolution_store import create_resolution_store
+import idempotency
+from static_assets import StaticAssets
+from cooperative import green_mode
+import compaction
+from cache import TTLCache
+import logs
+from question_bank import QuestionBank
+from jobs import QueueFull, create_job_queue
+import metrics
+import interview
+
+startup.mark("imports")
 
 # Load environment variables
 load_dotenv()
 
+logs.setup_logging()
+log = logs.get_logger("app")
+
+# The openai SDK (with pydantic and its HTTP stack) is most of the import
+# time, and pages and static files never need it: it is imported, and the
+# client built, by the first request that calls OpenAI.
+questions = startup.deferred_import('questions')
+openai_http = startup.deferred_import('openai_http')
+cassette = startup.deferred_import('cassette')
+
 # Get API key with error handling
 api_key = os.getenv('OPENAI_API_KEY')
 if not api_key:
-    raise ValueError("OpenAI API key not found in .env file")
-
-# Configure OpenAI
-client = OpenAI(api_key=api_key)
-
-# Question type definitions
-class Question(BaseModel):
-    type: str = Field(..., description="Question type: TEXT, CHOICE, or YES/NO")
-    text: str = Field(..., description="The question text")
-    options: Optional[List[str]] = Field(default=None, description="Options for CHOICE questions")
-
-class QuestionChoice(BaseModel):
-    type: Literal["CHOICE"]
-    text: str
-    options: List[str]
-
-class QuestionYesNo(BaseModel):
-    type: Literal["YES/NO"]
-    text: str
-
-class QuestionText(BaseModel):
-    type: Literal["TEXT"]
-    text: str
-
-def format_question_data(data: dict) -> dict:
-    """Format and validate question data to ensure consistent structure."""
-    formatted = {
-        "type": data.get("type", "TEXT").upper(),
-        "text": data.get("text") or data.get("question", ""),
-        "options": data.get("options", None)
-    }
-    
-    # Clean up the type
-    if formatted["type"] not in ["TEXT", "CHOICE", "YES/NO"]:
-        formatted["type"] = "TEXT"
-    
-    # Ensure text is a string
-    formatted["text"] = str(formatted["text"]).strip()
-    
-    # Handle options for CHOICE type
-    if formatted["type"] == "CHOICE" and not formatted["options"]:
-        formatted["type"] = "TEXT"  # Fallback to TEXT if no options provided
-    
-    # Clean up options if present
-    if formatted["options"]:
-        formatted["options"] = [str(opt).strip() for opt in formatted["options"]]
-    
-    return formatted
+    if not cassette.replaying():
+        raise ValueError("OpenAI API key not found in .env file")
+    # Replayed responses come from the cassette; the key is never sent anywhere
+    api_key = 'replay'
+
+def create_governor():
+    from rate_governor import create_rate_governor
+    return create_rate_governor(
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'openai_rate.db')
+    )
+
+def create_client():
+    # Requests share one tuned connection pool and go through the rate
+    # governor, which does the retrying, so the SDK's own retries are off
+    from openai import OpenAI
+    return OpenAI(
+        api_key=api_key,
+        max_retries=0,
+        http_client=openai_http.create_http_client(rate_governor)
+    )
+
+rate_governor = startup.Deferred('rate_governor', create_governor)
+client = startup.Deferred('openai_client', create_client)
+
+def given(value):
+    """value, or the SDK's marker for an omitted optional parameter"""
+    from openai import NOT_GIVEN
+    return value or NOT_GIVEN
+
+def openai_pool_stats():
+    # Nothing to report, or import, before the first OpenAI call
+    return openai_http.pool_stats() if client.built else []
+
+startup.mark("config")
 
 # Initialize Flask app
 app = Flask(__name__, static_url_path='/static', static_folder='static')
+app.json = FastJSONProvider(app)
 CORS(app)
 
-# Ensure the static directory exists
-with app.app_context():
-    os.makedirs('static', exist_ok=True)
-    os.makedirs('static/images', exist_ok=True)
-
-# Simple static file serving
-@app.route('/static/<path:filename>')
-def serve_static(filename):
-    try:
-        return send_from_directory('static', filename)
-    except Exception as e:
-        app.logger.error(f"Error serving static file {filename}: {str(e)}")
-        return f"Error serving file: {str(e)}", 500
-
-@app.route('/<path:filename>')
-def serve_root_static(filename):
-    try:
-        return app.send_static_file(filename)
-    except Exception as e:
-        app.logger.error(f"Error serving root static file {filename}: {str(e)}")
-        return f"Error serving file: {str(e)}", 500
+@app.before_request
+def start_request_timer():
+    # Label the request's spans with its route, not its URL, to keep /jobs/<job_id> one series
+    metrics.set_endpoint(request.url_rule.rule if request.url_rule else "unmatched")
+    metrics.request_started()
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    if 'request_started' in g:
+        metrics.observe_request(time.perf_counter() - g.request_started, response.status_code)
+    startup.first_response()
+    return response
+
+@app.teardown_request
+def finish_request(exc=None):
+    # Runs even when a handler raised, so the in-flight count can't drift
+    if 'request_started' in g:
+        metrics.request_finished()
+
+# Static files are answered by middleware before Flask routing; templates link
+# them with asset_url() to get the fingerprinted URL from build_static.py
+static_files = StaticAssets(app.wsgi_app, app.static_folder)
+app.wsgi_app = static_files
+app.jinja_env.globals['asset_url'] = static_files.url
+
+# Compile the page templates now rather than in the first request for each
+for template_name in app.jinja_env.list_templates(extensions=['html']):
+    app.jinja_env.get_template(template_name)
+
+startup.mark("flask")
+
+# Transcripts longer than this many (estimated) tokens are sent as a profile
+# summary plus the last CONTEXT_RECENT_TURNS question/answer turns
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', 2000))
+CONTEXT_RECENT_TURNS = max(1, int(os.getenv('CONTEXT_RECENT_TURNS', 3)))
+
+def compact_messages(messages):
+    """Compact a transcript to the context budget; None when it already fits"""
+    with metrics.span("compaction"):
+        compacted = compaction.compact(messages, CONTEXT_TOKEN_BUDGET, CONTEXT_RECENT_TURNS)
+    if compacted is not None:
+        metrics.observe_compaction(compacted.tokens_before, compacted.tokens_after)
+        log.info("Compacted transcript from ~%d to ~%d tokens", compacted.tokens_before, compacted.tokens_after)
+    return compacted
+
+def format_conversation_history(message_texts):
+    """Format the interview messages (oldest first) as the initial info plus Q&A pairs"""
+    conversation_pairs = []
+    
+    # Skip the initial user info message
+    for i in range(1, len(message_texts), 2):
+        if i + 1 < len(message_texts):
+            question = message_texts[i]
+            answer = message_texts[i + 1]
+            # Clean up the question format if it's JSON
+            if question.strip().startswith('{'):
+                try:
+                    q_data = json.loads(question)
+                    question = q_data.get('text', question)
+                except:
+                    pass
+            conversation_pairs.append(f"Q: {question}\nA: {answer}")
+    
+    # Get the initial user info
+    initial_info = message_texts[0]
+    
+    return (
+        f"Initial User Information:\n{initial_info}\n\n"
+        "Conversation History:\n" + 
+        "\n\n".join(conversation_pairs)
+    )
 
-def create_question_assistant():
-    """Create a new assistant for asking questions"""
-    return client.beta.assistants.create(
+def compacted_history(message_texts):
+    """format_conversation_history, with older turns folded into a profile when over budget"""
+    messages = [
+        {"role": "assistant" if i % 2 else "user", "content": text}
+        for i, text in enumerate(message_texts)
+    ]
+    compacted = compact_messages(messages)
+    if compacted is None:
+        return format_conversation_history(message_texts)
+    return format_conversation_history([compacted.summary, *(m["content"] for m in compacted.recent)])
+
+# Assistants are shared by every session and worker, keyed by their definition
+assistant_registry = AssistantRegistry(
+    os.getenv('ASSISTANT_REGISTRY_PATH', os.path.join(app.instance_path, 'assistants.json'))
+)
+
+def get_question_assistant_id():
+    """Return the shared question assistant, creating it on first use"""
+    return assistant_registry.get_or_create(
+        client,
         name="Resolution Question Assistant",
-        instructions="""You are an expert at asking insightful questions to help people create meaningful New Year's resolutions. 
-Your role is to ask one question at a time to understand the person's goals, motivations, and circumstances.
-
-IMPORTANT: You must ALWAYS format your responses as valid JSON with this structure:
-{
-    "type": "TEXT" | "CHOICE" | "YES/NO",
-    "text": "Your question here",
-    "options": ["option1", "option2", "option3"]  // Only for CHOICE type
-}
-
-Guidelines:
-1. Keep questions concise (under 20 words)
-2. Before asking a question, review all previous questions and answers to ensure you are building towards a well rounded 2025 new year's resolution plan
-3. Make questions specific to their resolution focus
-4. Use appropriate question types:
-   - TEXT: For open-ended responses
-   - CHOICE: When offering specific options (must include options array)
-   - YES/NO: For binary decisions
-5. Never use numerical scales or ratings
-6. Focus on understanding their specific situation and goals so that the resolution coach can create a highly personalized plan
-
-Example responses:
-{"type": "YES/NO", "text": "Have you tried setting this type of goal before?"}
-{"type": "CHOICE", "text": "What's your biggest obstacle?", "options": ["Time", "Motivation", "Resources", "Knowledge"]}
-{"type": "TEXT", "text": "What would success look like for this resolution?"}""",
-        model="gpt-4o-mini",
+        model=ASSISTANT_MODEL,
+        instructions=QUESTION_ASSISTANT_INSTRUCTIONS,
         tools=[]
     )
 
-def create_resolution_assistant():
-    """Create a new resolution assistant for this session"""
-    print("Creating new resolution assistant")
-    return client.beta.assistants.create(
+def get_resolution_assistant_id():
+    """Return the shared resolution assistant, creating it on first use"""
+    return assistant_registry.get_or_create(
+        client,
         name="Resolution Assistant",
-        instructions="""You are an expert resolution coach that creates highly personalized New Year's resolutions.
-        Your role is to analyze the user's responses and create a detailed, actionable plan that reflects their
-        specific situation, preferences, and goals.
-
-        ANALYSIS APPROACH:
-        1. Review all user responses carefully
-        2. Note specific details about their:
-           - Current situation and habits
-           - Preferences and style
-           - Support system and resources
-           - Challenges and concerns
-           - Experience level
-           - Time availability
-           - Location and environment
-
-        LOCATION UTILIZATION (Use location data from initial questions, DO NOT ask for more):
-        1. Urban Locations:
-           - Reference specific local gyms, studios, or fitness centers with links
-           - Mention nearby parks, trails, or recreational areas with maps
-           - Suggest local classes, workshops, or community programs with registration links
-           - Include location-specific events and meetups with links
-           - Reference public transportation options with relevant links
-
-        2. Suburban Locations:
-           - Incorporate home-based and neighborhood activities
-           - Mention local community centers and facilities with links
-           - Suggest ways to connect with neighbors (NextDoor, local Facebook groups)
-           - Include both indoor and outdoor options
-           - Reference local clubs and groups with joining information
-
-        3. Rural Locations:
-           - Focus on home-based and outdoor activities
-           - Suggest ways to leverage natural surroundings
-           - Include online and remote options with links
-           - Mention regional events and gatherings with links
-           - Reference local community resources with contact info
-
-        RESOLUTION CREATION RULES:
-        1. Be highly specific - avoid generic advice
-        2. Reference their actual responses
-        3. Use their name and location naturally
-        4. Build on their existing habits
-        5. Address their stated challenges
-        6. Incorporate their preferences
-        7. Match their experience level
-        8. Consider their time availability
-        9. Reference local opportunities with links
-        10. Suggest specific tools they mentioned
-
-        FORMATTING AND LINKING:
-        1. Use HTML tags for formatting:
-           - <h1> for main section headings
-           - <h2> for subsection headings
-           - Bullet points with -
-           - <b>text</b> for emphasis
-           - <a href="URL">link text</a> for hyperlinks
-           - Always close all HTML tags properly
-
-        2. Required Link Types:
-           - Equipment/Products: Link to quality options on Amazon or specialized retailers
-           - Local Resources: Link to official websites, Google Maps, or social media
-           - Online Communities: Link to relevant groups, forums, or platforms
-           - Learning Resources: Link to courses, tutorials, or educational content
-           - Apps/Tools: Link to app stores or official websites
-           - Events: Link to registration or information pages
-
-        3. Structure:
-           - Keep paragraphs short and scannable
-           - Use bullet points for lists
-           - Include specific dates and numbers
-           - Break long-term goals into phases
-           - Embed relevant links naturally within text
-
-        LINK PLACEMENT RULES:
-        1. Resources Section:
-           - Every recommended tool or resource should have a link
-           - Group similar resources together
-           - Include both free and paid options when relevant
-           - Provide alternatives when possible
-
-        2. Action Plan:
-           - Link to specific tools or resources mentioned
-           - Include links to local venues or facilities
-           - Reference online communities or groups
-           - Link to relevant tutorials or guides
-
-        3. Support System:
-           - Link to local community groups
-           - Include relevant online forums
-           - Reference professional services with links
-           - Add links to networking platforms
-
-        Remember: Every resolution should feel personally crafted for this specific user,
-        incorporating their unique context and preferences. Make all resources easily
-        accessible through relevant, working links.""",
-        model="gpt-4o-mini"
+        model=ASSISTANT_MODEL,
+        instructions=RESOLUTION_ASSISTANT_INSTRUCTIONS
     )
 
 @app.route('/')
@@ -239,413 +213,902 @@ def index():
     """Start the resolution creation process"""
     return render_template('index.html', landing_page=False)
 
+# First questions depend only on the resolution focus, so validated ones are
+# reused for sessions with the same type and (normalized) resolution idea
+first_question_cache = TTLCache(
+    max_entries=int(os.getenv('FIRST_QUESTION_CACHE_SIZE', 2048)),
+    ttl=int(os.getenv('FIRST_QUESTION_CACHE_TTL', 24 * 3600))
+)
+
+def stored_first_question(session):
+    """The question bank's or the cache's first question for a new session, or None"""
+    question = question_bank.first_question(session.resolution_type) if question_bank else None
+    if question is not None:
+        log.info("First question served from the question bank for %s", session.resolution_type)
+        return question
+    question = first_question_cache.get(session.cache_key)
+    if question is not None:
+        log.info("First question cache hit (%s)", first_question_cache.stats())
+    else:
+        log.info("First question cache miss")
+    return question
+
+def first_question_from_reply(session, raw_reply):
+    """The model's first question, validated and cached for similar sessions"""
+    question = questions.parse_question(raw_reply) or repaired_question(raw_reply)
+    if session.cacheable(question):
+        first_question_cache.set(session.cache_key, question)
+    return question or questions.text_question(raw_reply)
+
+# INTERVIEW_MODE=bank serves questions from the offline bank built by
+# build_question_bank.py, calling the model only once an interview leaves it
+INTERVIEW_MODE = os.getenv('INTERVIEW_MODE', 'model').lower()
+QUESTION_BANK_PATH = os.getenv('QUESTION_BANK_PATH', os.path.join(app.instance_path, 'question_bank.json.gz'))
+question_bank = QuestionBank.load(QUESTION_BANK_PATH) if INTERVIEW_MODE == 'bank' else None
+if question_bank is not None:
+    log.info("Loaded question bank from %s: %s", QUESTION_BANK_PATH, question_bank.stats())
+elif INTERVIEW_MODE == 'bank':
+    log.warning("Question bank not found at %s, asking the model for every question", QUESTION_BANK_PATH)
+
+def bank_next_question(thread_id):
+    """The bank's next question for this interview, or None if it has left the bank"""
+    if question_bank is None:
+        return None
+    transcript = transcripts.get(thread_id)
+    return question_bank.next_question(transcript) if transcript else None
+
 @app.route('/start_session', methods=['POST'])
 def start_session():
     try:
-        print("\nStarting new session...")
-        data = request.json
-        name = data.get('name', 'User')
-        location = data.get('location', '')
-        resolution_type = data.get('resolutionType', '')
-        specific_resolution = data.get('specificResolution', '')
-        
-        print(f"Creating thread for user: {name}")
-        print(f"Location: {location}")
-        print(f"Resolution Type: {resolution_type}")
-        print(f"Specific Resolution: {specific_resolution}")
-        
-        # Create new assistants for this session
-        question_assistant = create_question_assistant()
-        resolution_assistant = create_resolution_assistant()
-        print(f"Created assistants - Question: {question_assistant.id}, Resolution: {resolution_assistant.id}")
-        
-        thread = client.beta.threads.create()
-        print(f"Thread created with ID: {thread.id}")
-        
-        # Store assistant IDs in the response
-        session_data = {
-            "question_assistant_id": question_assistant.id,
-            "resolution_assistant_id": resolution_assistant.id,
-            "thread_id": thread.id
-        }
-        
-        # Format initial message without indentation
-        initial_message = (
-            f"Hi, I'm {name} from {location}. I'd like help creating New Year's resolutions. "
-            f"I'm specifically interested in {resolution_type}. "
-            f"My specific resolution idea is: {specific_resolution}"
-        ).strip()
-        
-        print("Adding initial message...")
-        print(f"Initial message: {initial_message}")
-        client.beta.threads.messages.create(
-            thread_id=thread.id,
-            role="user",
-            content=initial_message
+        log.info("Starting new session")
+        session = interview.NewSession.parse(request.json)
+        log.debug(
+            "Session details - name: %s, location: %s, resolution type: %s, resolution idea: %s",
+            logs.payload(session.name), logs.payload(session.location), session.resolution_type,
+            logs.payload(session.specific_resolution)
         )
-        print("Initial message added")
         
-        # Format instructions without indentation
-        instructions = (
-            f"You are helping {name} create a meaningful and achievable New Year's resolution focused on {resolution_type}. "
-            f"Their initial idea is: {specific_resolution}\n\n"
-            "Ask a strategic question that will help you understand what they need to succeed. "
-            "Your goal is to gather information that will help create a SMART resolution "
-            "(Specific, Measurable, Achievable, Relevant, Time-bound).\n\n"
-            "Consider asking about:\n"
-            "- Their current situation and starting point\n"
-            "- Past experiences and what worked/didn't work\n"
-            "- Available resources and support systems\n"
-            "- Potential obstacles and how to overcome them\n"
-            "- Their definition of success\n"
-            "- Timeline and milestones\n\n"
-            "Format your question as JSON:\n"
-            "1. Keep it under 15 words\n"
-            "2. Make it specific to their resolution focus\n"
-            "3. Use this structure:\n"
-            '{"type": "TEXT" | "CHOICE" | "YES/NO", "text": "Your question", "options": ["option1", "option2"] // for CHOICE only}'
-        ).strip()
+        # Look up the shared assistants (created once per definition)
+        question_assistant_id, resolution_assistant_id = conversation.assistant_ids()
+        log.debug("Using assistants - Question: %s, Resolution: %s", question_assistant_id, resolution_assistant_id)
         
-        print("Creating run for first question...")
-        print(f"Instructions: {instructions}")
-        run = client.beta.threads.runs.create(
-            thread_id=thread.id,
-            assistant_id=question_assistant.id,
-            instructions=instructions
-        )
-        print(f"Run created with ID: {run.id}")
+        question = stored_first_question(session)
+        if question is not None:
+            # Seed the thread with the stored question so the interview reads the same
+            thread_id = conversation.start(session.initial_message, assistant_reply=json.dumps(question))
+        else:
+            thread_id = conversation.start(session.initial_message)
+            raw_reply = conversation.ask(
+                thread_id, question_assistant_id, FIRST_QUESTION_INSTRUCTIONS,
+                response_format=questions.QUESTION_RESPONSE_FORMAT
+            )
+            question = first_question_from_reply(session, raw_reply)
         
-        run = wait_for_run(thread.id, run.id)
-        print(f"Run completed with status: {run.status}")
+        response_data = interview.session_response(question, thread_id, question_assistant_id, resolution_assistant_id)
+        log.debug("Sending response: %s", logs.payload(response_data))
         
-        messages = client.beta.threads.messages.list(thread_id=thread.id)
-        first_question = messages.data[0].content[0].text.value
-        print(f"Raw first question: {first_question}")
-        
-        try:
-            # Try to parse as JSON
-            if first_question.strip().startswith('{'):
-                question_data = json.loads(first_question)
-            else:
-                # If not JSON, create a text question
-                question_data = {
-                    "type": "TEXT",
-                    "text": first_question.strip()
-                }
-            
-            # Format the data
-            formatted_data = format_question_data(question_data)
-            print(f"Formatted question data: {formatted_data}")
-            
-            # Validate with Pydantic
-            question = Question(**formatted_data)
-            print(f"Validated question: {question.model_dump()}")
-            
-            response_data = {
-                "question": question.model_dump(),
-                "threadId": thread.id,
-                "questionNumber": 1,
-                **session_data
-            }
-            print(f"Sending response: {response_data}")
-            
-            return jsonify(response_data)
-            
-        except Exception as e:
-            print(f"Error processing first question: {str(e)}")
-            print(f"Falling back to text question")
-            
-            # Fallback to simple text question
-            response_data = {
-                "question": {
-                    "type": "TEXT",
-                    "text": first_question.strip(),
-                    "options": None
-                },
-                "threadId": thread.id,
-                "questionNumber": 1,
-                **session_data
-            }
-            print(f"Sending fallback response: {response_data}")
-            
-            return jsonify(response_data)
+        return jsonify(response_data)
         
     except Exception as e:
-        print(f"Error in start_session: {str(e)}")
-        print(f"Full traceback: {traceback.format_exc()}")
-        return jsonify({"error": str(e)}), 500
+        return interview.failure(e, "start_session")
+
+# Run completion settings: stream run events when possible, otherwise poll
+# with a backoff that starts fast and settles at the old 1 second interval.
+RUN_STREAMING = os.getenv('RUN_STREAMING', 'true').lower() != 'false'
+POLL_INITIAL_DELAY = 0.05
+POLL_BACKOFF = 1.5
+POLL_MAX_DELAY = 1.0
+
+TERMINAL_RUN_EVENTS = {
+    'thread.run.completed': 'completed',
+    'thread.run.failed': 'failed',
+    'thread.run.cancelled': 'cancelled',
+    'thread.run.expired': 'expired',
+}
+
+@dataclass
+class RunResult:
+    """A finished run plus how much waiting it took"""
+    run: object
+    polls: int
+    elapsed: float
+    streamed: bool
+
+def check_run_status(run):
+    """Raise for runs that ended without completing"""
+    if run.status == 'failed':
+        error = run.last_error
+        raise Exception(f"Run failed: {error.code} - {error.message}")
+    elif run.status in ['cancelled', 'expired']:
+        raise Exception(f"Run failed with status: {run.status}")
+
+def usage_counts(usage):
+    """(prompt tokens, cached prompt tokens) from a run's or completion's usage"""
+    if usage is None:
+        return 0, 0
+    if not isinstance(usage, dict):
+        usage = usage.model_dump()
+    details = usage.get('prompt_tokens_details') or usage.get('prompt_token_details') or {}
+    return usage.get('prompt_tokens') or 0, details.get('cached_tokens') or 0
+
+def record_usage(usage):
+    """Report how much of a call's prompt was served from the prompt cache"""
+    prompt_tokens, cached_tokens = usage_counts(usage)
+    if not prompt_tokens:
+        return
+    metrics.observe_prompt_tokens(prompt_tokens, cached_tokens)
+    log.info(
+        "Prompt tokens: %d (%d cached, %d uncached)",
+        prompt_tokens, cached_tokens, prompt_tokens - cached_tokens
+    )
+
+def repaired_question(raw_reply):
+    """Turn a malformed question reply into a question with one cheap call.
+
+    The call sees only the bad reply, not the interview, and is held to the
+    question schema. Returns None if the repair fails too.
+    """
+    log.warning("Malformed question reply, repairing: %s", logs.payload(raw_reply))
+    try:
+        with metrics.span("question_repair"):
+            completion = client.chat.completions.create(
+                model=ASSISTANT_MODEL,
+                messages=[
+                    {"role": "system", "content": REPAIR_QUESTION_INSTRUCTIONS},
+                    {"role": "user", "content": raw_reply}
+                ],
+                response_format=questions.QUESTION_RESPONSE_FORMAT,
+                max_tokens=200,
+                timeout=15
+            )
+        record_usage(completion.usage)
+        return questions.parse_question(completion.choices[0].message.content or "")
+    except Exception as e:
+        log.warning("Question repair failed: %s", e)
+        return None
+
+def question_from_reply(raw_reply):
+    """The reply as a validated question, repaired once if it is malformed"""
+    return questions.parse_question(raw_reply) or repaired_question(raw_reply) or questions.text_question(raw_reply)
+
+def run_params(thread_id, assistant_id, instructions, truncation_strategy=None, response_format=None):
+    """Arguments of runs.create.
+
+    instructions are appended to the assistant's own, which stay a stable
+    prefix for prompt caching.
+    """
+    return {
+        "thread_id": thread_id,
+        "assistant_id": assistant_id,
+        "additional_instructions": instructions,
+        "truncation_strategy": given(truncation_strategy),
+        "response_format": given(response_format),
+    }
+
+class RunWatch:
+    """The deadline, poll backoff and outcome of waiting for one run.
+
+    The sync and async apps make the calls and report each streamed event
+    or polled run here, so both wait for runs the same way.
+    """
+
+    def __init__(self, max_wait_time):
+        self.started = time.time()
+        self.max_wait_time = max_wait_time
+        self.delay = POLL_INITIAL_DELAY
+        self.polls = 0
+        self.run = None
+
+    def elapsed(self):
+        return time.time() - self.started
+
+    def remaining(self):
+        return max(self.max_wait_time - self.elapsed(), 0)
+
+    def check_deadline(self):
+        if self.elapsed() > self.max_wait_time:
+            raise TimeoutError("Assistant response took too long")
+
+    def streamed(self, event):
+        """Note a streamed event; True once it ended the run (raising if the run failed)"""
+        self.check_deadline()
+        if event.event.startswith('thread.run.'):
+            self.run = event.data
+        if event.event in TERMINAL_RUN_EVENTS:
+            check_run_status(event.data)
+            return True
+        return False
+
+    def stream_result(self):
+        """The result of a run its stream completed, or None to finish by polling"""
+        if self.run is None or self.run.status != 'completed':
+            return None
+        result = RunResult(self.run, 0, self.elapsed(), True)
+        log.info("Run %s completed via stream in %.2fs", self.run.id, result.elapsed)
+        return result
+
+    def polled(self, run):
+        """Note a polled run; its result once completed, otherwise None (raising if it failed)"""
+        self.polls += 1
+        log.debug("Run status: %s", run.status, extra={"sample": 0.1})
+        if run.status == 'completed':
+            result = RunResult(run, self.polls, self.elapsed(), False)
+            log.info("Run %s completed after %d polls in %.2fs", run.id, self.polls, result.elapsed)
+            return result
+        if run.status == 'requires_action':
+            # The caller answers it right away; poll quickly again afterwards
+            log.info("Run requires action - submitting empty tool outputs")
+            self.delay = POLL_INITIAL_DELAY
+            return None
+        check_run_status(run)
+        return None
+
+    def next_delay(self):
+        """Seconds to wait before the next poll, backing off from 50ms up to 1s"""
+        delay = self.delay
+        self.delay = min(delay * POLL_BACKOFF, POLL_MAX_DELAY)
+        return delay
+
+def iter_run_events(thread_id, assistant_id, instructions, max_wait_time=30, truncation_strategy=None,
+                    response_format=None, watch=None):
+    """Create a streaming run and yield its events until it finishes.
+
+    Required actions are answered with empty tool outputs, as before. Raises
+    TimeoutError once max_wait_time is exceeded and an exception if the run
+    fails, is cancelled or expires.
+    """
+    watch = watch or RunWatch(max_wait_time)
+    stream = client.beta.threads.runs.create(
+        **run_params(thread_id, assistant_id, instructions, truncation_strategy, response_format),
+        stream=True,
+        timeout=max_wait_time
+    )
+    while stream is not None:
+        events, stream = stream, None
+        # Closing the stream returns its connection to the pool; left to the
+        # garbage collector it can be lost (under gevent) and the pool drained
+        with events:
+            for event in events:
+                finished = watch.streamed(event)
+                yield event
+                if finished:
+                    return
+                if event.event == 'thread.run.requires_action':
+                    log.info("Run requires action - submitting empty tool outputs")
+                    stream = client.beta.threads.runs.submit_tool_outputs(
+                        thread_id=thread_id,
+                        run_id=event.data.id,
+                        tool_outputs=[],
+                        stream=True
+                    )
+                    break
+
+def run_to_completion(thread_id, assistant_id, instructions, max_wait_time=30, truncation_strategy=None,
+                      response_format=None):
+    """Run an assistant on a thread and wait for it to finish.
+
+    Uses the streaming run API so we return as soon as the run completes, or
+    create-then-poll when RUN_STREAMING is off.
+    Errors once a streamed run exists are raised, never retried by polling:
+    creating another run on the thread would fail while the first is active.
+    """
+    watch = RunWatch(max_wait_time)
+    if RUN_STREAMING:
+        for _ in iter_run_events(
+            thread_id, assistant_id, instructions, max_wait_time, truncation_strategy, response_format, watch
+        ):
+            pass
+        result = watch.stream_result()
+        if result is not None:
+            return result
+        if watch.run is not None:
+            # Stream ended early; finish by polling the same run
+            return wait_for_run(thread_id, watch.run.id, max_wait_time=watch.remaining())
+
+    run = client.beta.threads.runs.create(
+        **run_params(thread_id, assistant_id, instructions, truncation_strategy, response_format)
+    )
+    log.debug("Run created with ID: %s", run.id)
+    return wait_for_run(thread_id, run.id, max_wait_time=watch.remaining())
 
 def wait_for_run(thread_id, run_id, max_wait_time=30):
-    """Helper function to wait for a run to complete and handle required actions"""
-    start_time = time.time()
-    
+    """Poll a run until it completes, backing off from 50ms up to 1s between polls"""
+    watch = RunWatch(max_wait_time)
     while True:
-        if time.time() - start_time > max_wait_time:
-            raise TimeoutError("Assistant response took too long")
-            
+        watch.check_deadline()
         run = client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run_id)
-        print(f"Run status: {run.status}")
-        
-        if run.status == 'completed':
-            return run
-        elif run.status == 'requires_action':
-            print("Run requires action - submitting empty tool outputs")
+        result = watch.polled(run)
+        if result is not None:
+            return result
+        if run.status == 'requires_action':
             client.beta.threads.runs.submit_tool_outputs(
                 thread_id=thread_id,
                 run_id=run_id,
                 tool_outputs=[]
             )
-        elif run.status == 'failed':
-            error = run.last_error
-            raise Exception(f"Run failed: {error.code} - {error.message}")
-        elif run.status in ['cancelled', 'expired']:
-            raise Exception(f"Run failed with status: {run.status}")
-            
-        time.sleep(1)
+            continue
+        time.sleep(watch.next_delay())
+
+def run_reply(thread_id, run_id):
+    """Fetch only the message written by the given run.
+
+    Filtering by run and asking for a single message keeps the payload the
+    same size at question 10 as at question 1.
+    """
+    messages = client.beta.threads.messages.list(thread_id=thread_id, run_id=run_id, limit=1)
+    if not messages.data:
+        raise ValueError("No messages received from assistant")
+    return messages.data[0].content[0].text.value
+
+# Conversation backends. The interview endpoints only talk to `conversation`,
+# so interviews can run on Assistants API threads or on a local transcript
+# with one Chat Completions call per question.
+
+# Every message of every interview is mirrored here as it passes through
+transcripts = create_transcript_store()
+
+CHAT_QUESTION_ASSISTANT_ID = "chat:question"
+CHAT_RESOLUTION_ASSISTANT_ID = "chat:resolution"
+
+CHAT_ASSISTANT_INSTRUCTIONS = {
+    CHAT_QUESTION_ASSISTANT_ID: QUESTION_ASSISTANT_INSTRUCTIONS,
+    CHAT_RESOLUTION_ASSISTANT_ID: RESOLUTION_ASSISTANT_INSTRUCTIONS,
+}
+
+def opening_messages(initial_message, assistant_reply=None):
+    """The first messages of an interview, optionally with the first reply already in it"""
+    messages = [{"role": "user", "content": initial_message}]
+    if assistant_reply is not None:
+        messages.append({"role": "assistant", "content": assistant_reply})
+    return messages
+
+def mirrored_transcript(thread_id, expected_messages=None):
+    """Message texts from the local mirror, oldest first.
+
+    None when the mirror is missing or doesn't hold the expected message
+    count, e.g. after a restart or when another worker's memory holds the
+    session; the thread then has to be listed.
+    """
+    messages = transcripts.get(thread_id)
+    if messages is None or expected_messages not in (None, len(messages)):
+        log.info("Transcript for %s not mirrored locally, listing thread", thread_id)
+        return None
+    return [message["content"] for message in messages]
+
+def thread_message(message):
+    """A listed thread message as a transcript entry"""
+    return {"role": message.role, "content": message.content[0].text.value}
+
+def finished_run(result):
+    """Report a completed run's waiting and prompt cache use"""
+    metrics.observe_run(result.polls, result.streamed)
+    record_usage(result.run.usage)
+    log.debug("Run completed with status: %s (%d polls)", result.run.status, result.polls)
+
+def completion_reply(completion):
+    """A chat completion's reply text, after reporting its prompt cache use"""
+    record_usage(completion.usage)
+    return completion.choices[0].message.content or ""
+
+class AssistantsConversation:
+    """Interview state lives in an OpenAI thread and each reply is a run"""
+
+    def assistant_ids(self):
+        with metrics.span("assistant_lookup"):
+            return get_question_assistant_id(), get_resolution_assistant_id()
+
+    def start(self, initial_message, assistant_reply=None):
+        """Create the interview thread, optionally with the first reply already in it"""
+        messages = opening_messages(initial_message, assistant_reply)
+        with metrics.span("thread_create"):
+            thread = client.beta.threads.create(messages=messages)
+        log.info("Thread created with ID: %s", thread.id)
+        transcripts.create(thread.id, messages)
+        return thread.id
+
+    def add_user_message(self, thread_id, content):
+        with metrics.span("message_create"):
+            client.beta.threads.messages.create(
+                thread_id=thread_id,
+                role="user",
+                content=content
+            )
+        transcripts.append(thread_id, "user", content)
+
+    def add_assistant_message(self, thread_id, content):
+        """Record a reply that didn't come from a run, e.g. a question bank question"""
+        with metrics.span("message_create"):
+            client.beta.threads.messages.create(
+                thread_id=thread_id,
+                role="assistant",
+                content=content
+            )
+        transcripts.append(thread_id, "assistant", content)
+
+    def run_context(self, thread_id, instructions):
+        """Run instructions and truncation strategy that keep the run within the context budget.
+
+        When the thread is over budget the run only reads its recent turns,
+        and the profile of the older ones is appended to the instructions.
+        """
+        compacted = compact_messages(transcripts.get(thread_id) or [])
+        if compacted is None:
+            return instructions, None
+        truncation_strategy = {"type": "last_messages", "last_messages": len(compacted.recent)}
+        return f"{instructions}\n\n{compacted.summary}", truncation_strategy
+
+    def ask(self, thread_id, assistant_id, instructions, max_wait_time=30, response_format=None):
+        """Run the assistant on the thread and return its reply"""
+        instructions, truncation_strategy = self.run_context(thread_id, instructions)
+        with metrics.span("run"):
+            result = run_to_completion(
+                thread_id, assistant_id, instructions, max_wait_time, truncation_strategy, response_format
+            )
+        finished_run(result)
+
+        with metrics.span("message_list"):
+            reply = run_reply(thread_id, result.run.id)
+        transcripts.append(thread_id, "assistant", reply)
+        return reply
+
+    def ask_question(self, thread_id, assistant_id, instructions, max_wait_time=30):
+        """Ask for the next interview question and return it validated"""
+        return question_from_reply(
+            self.ask(thread_id, assistant_id, instructions, max_wait_time, response_format=questions.QUESTION_RESPONSE_FORMAT)
+        )
+
+    def stream(self, thread_id, assistant_id, instructions, max_wait_time=60):
+        """Yield the reply's text as it is generated by a streaming run.
+
+        With RUN_STREAMING off the run is polled like any other and the whole
+        reply is yielded once it is done.
+        """
+        if not RUN_STREAMING:
+            yield self.ask(thread_id, assistant_id, instructions, max_wait_time)
+            return
+        instructions, truncation_strategy = self.run_context(thread_id, instructions)
+        parts = []
+        with metrics.span("run_stream"):
+            for event in iter_run_events(thread_id, assistant_id, instructions, max_wait_time, truncation_strategy):
+                if event.event == 'thread.message.delta':
+                    for part in event.data.delta.content or []:
+                        if part.type == 'text' and part.text and part.text.value:
+                            parts.append(part.text.value)
+                            yield part.text.value
+                elif event.event == 'thread.run.completed':
+                    record_usage(event.data.usage)
+        transcripts.append(thread_id, "assistant", ''.join(parts))
+
+    def transcript(self, thread_id, expected_messages=None):
+        """Message texts, oldest first.
+
+        Served from the local mirror; the thread is only listed (every page)
+        when the mirror can't be used.
+        """
+        texts = mirrored_transcript(thread_id, expected_messages)
+        if texts is not None:
+            return texts
+
+        with metrics.span("transcript_list"):
+            messages = [
+                thread_message(msg)
+                for msg in client.beta.threads.messages.list(thread_id=thread_id, order="asc", limit=100)
+            ]
+        transcripts.create(thread_id, messages)
+        return [message["content"] for message in messages]
+
+    def summarize(self, thread_id, expected_messages=None):
+        """Copy the interview into a fresh thread as Q&A pairs for the resolution run"""
+        conversation_history = compacted_history(self.transcript(thread_id, expected_messages))
+        
+        log.debug("Formatted conversation history: %s", logs.payload(conversation_history))
+        
+        # Create new thread for resolution holding the formatted conversation history
+        return self.start(resolution_request_message(conversation_history))
+
+class ChatConversation:
+    """Interview state lives in a local transcript; each reply is one chat completion"""
+
+    def assistant_ids(self):
+        return CHAT_QUESTION_ASSISTANT_ID, CHAT_RESOLUTION_ASSISTANT_ID
+
+    def start(self, initial_message, assistant_reply=None):
+        session_id = f"chat_{uuid.uuid4().hex}"
+        transcripts.create(session_id, opening_messages(initial_message, assistant_reply))
+        log.info("Chat session created with ID: %s", session_id)
+        return session_id
+
+    def add_user_message(self, session_id, content):
+        self.append(session_id, "user", content)
+
+    def add_assistant_message(self, session_id, content):
+        self.append(session_id, "assistant", content)
+
+    def append(self, session_id, role, content):
+        if not transcripts.append(session_id, role, content):
+            raise ValueError(f"Unknown or expired session: {session_id}")
+
+    def messages_for(self, session_id, assistant_id, instructions):
+        """The assistant's instructions, the transcript, then this turn's instructions.
+
+        Only the end of the list changes between turns, so everything up to
+        the newest message can be served from the prompt cache. Transcripts
+        over the context budget are sent compacted.
+        """
+        transcript = transcripts.get(session_id)
+        if transcript is None:
+            raise ValueError(f"Unknown or expired session: {session_id}")
+        compacted = compact_messages(transcript)
+        if compacted is not None:
+            transcript = compacted.messages()
+        messages = [{"role": "system", "content": CHAT_ASSISTANT_INSTRUCTIONS.get(assistant_id, "")}, *transcript]
+        if instructions:
+            messages.append({"role": "system", "content": instructions})
+        return messages
+
+    def ask(self, session_id, assistant_id, instructions, max_wait_time=30, response_format=None):
+        with metrics.span("completion"):
+            completion = client.chat.completions.create(
+                model=ASSISTANT_MODEL,
+                messages=self.messages_for(session_id, assistant_id, instructions),
+                response_format=given(response_format),
+                timeout=max_wait_time
+            )
+        reply = completion_reply(completion)
+        self.append(session_id, "assistant", reply)
+        return reply
+
+    def ask_question(self, session_id, assistant_id, instructions, max_wait_time=30):
+        """Ask for the next interview question and return it validated"""
+        return question_from_reply(
+            self.ask(session_id, assistant_id, instructions, max_wait_time, response_format=questions.QUESTION_RESPONSE_FORMAT)
+        )
+
+    def stream(self, session_id, assistant_id, instructions, max_wait_time=60):
+        chunks = client.chat.completions.create(
+            model=ASSISTANT_MODEL,
+            messages=self.messages_for(session_id, assistant_id, instructions),
+            stream=True,
+            stream_options={"include_usage": True},
+            timeout=max_wait_time
+        )
+        parts = []
+        with metrics.span("completion_stream"), chunks:
+            for chunk in chunks:
+                if getattr(chunk, 'usage', None) is not None:
+                    record_usage(chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+        self.append(session_id, "assistant", ''.join(parts))
+
+    def transcript(self, session_id, expected_messages=None):
+        return [message["content"] for message in transcripts.get(session_id) or []]
+
+    def summarize(self, session_id, expected_messages=None):
+        """Start a new session holding the interview as Q&A pairs"""
+        conversation_history = compacted_history(self.transcript(session_id))
+        return self.start(resolution_request_message(conversation_history))
+
+CONVERSATION_BACKEND = os.getenv('CONVERSATION_BACKEND', 'assistants').lower()
+
+if CONVERSATION_BACKEND == 'chat':
+    conversation = ChatConversation()
+else:
+    conversation = AssistantsConversation()
+
+# Finished plans get a permalink whose page is served without any model call
+resolution_store = create_resolution_store(os.path.join(app.instance_path, 'resolutions.db'))
+
+# Repeated answer submissions (double-clicks, retries) share one run; see idempotency.py
+idempotency_store = idempotency.create_idempotency_store()
+IDEMPOTENCY_WAIT = float(os.getenv('IDEMPOTENCY_WAIT', 120))
+
+startup.mark("stores")
+
+def publish_resolution(resolution):
+    """Store a finished plan and return its permalink, or None if it couldn't be stored"""
+    try:
+        with metrics.span("resolution_save"):
+            key = resolution_store.save(resolution)
+    except Exception as e:
+        log.warning("Could not store resolution: %s", e)
+        return None
+    return f"/resolutions/{key}"
+
+def resolution_plan_job(params, progress):
+    """Background version of the final step of /submit_answer"""
+    metrics.set_endpoint("job:resolution_plan")
+    progress("summarizing")
+    plan_thread_id = conversation.summarize(params["threadId"], expected_messages=params.get("expectedMessages"))
+    progress("generating")
+    resolution = conversation.ask(
+        plan_thread_id,
+        params["resolutionAssistantId"],
+        RESOLUTION_PLAN_INSTRUCTIONS,
+        max_wait_time=60
+    )
+    return interview.plan_response(resolution, publish_resolution(resolution))
+
+def generate_resolution_job(params, progress):
+    """Background version of /generate-resolution"""
+    metrics.set_endpoint("job:generate_resolution")
+    progress("generating")
+    resolution_assistant_id = params.get("resolutionAssistantId") or conversation.assistant_ids()[1]
+    resolution = conversation.ask(
+        params["threadId"],
+        resolution_assistant_id,
+        GENERATE_RESOLUTION_INSTRUCTIONS,
+        max_wait_time=60
+    )
+    return interview.resolution_response(params["threadId"], resolution, publish_resolution(resolution), unescape=True)
+
+# Clients that send "background": true get a job ID back instead of
+# waiting for the resolution, and poll /jobs/<job_id> for it
+job_queue = create_job_queue()
+job_queue.register("resolution_plan", resolution_plan_job)
+job_queue.register("generate_resolution", generate_resolution_job)
+resumed_jobs = job_queue.resume_stale(older_than=int(os.getenv('JOB_STALE_AFTER', 300)))
+if resumed_jobs:
+    log.info("Resumed %d unfinished background jobs", resumed_jobs)
+
+startup.mark("jobs")
+
+def enqueue_job(kind, params):
+    """Submit a job and return a 202 response, or a 503 when the queue is full.
+
+    The response is a plain (body, status, headers) tuple so the async app
+    can return it too.
+    """
+    try:
+        job_id = job_queue.submit(kind, params)
+    except QueueFull as e:
+        log.warning("Refusing background job: %s", e)
+        return interview.queue_full()
+    log.info("Queued %s job %s", kind, job_id)
+    return {"jobId": job_id, "status": "queued", "statusUrl": f"/jobs/{job_id}"}, 202, {}
+
+def idempotency_key(path, headers, data):
+    """Key of the answer submission in a request body, or None without one"""
+    if not isinstance(data, dict):
+        return None
+    return idempotency.request_key(
+        path,
+        data.get('threadId'),
+        data.get('questionNumber'),
+        headers.get('Idempotency-Key') or data.get('idempotencyKey')
+    )
+
+def duplicate_error(e):
+    """Response to a keyed request that can neither run nor be replayed.
+
+    A plain (body, status, headers) tuple, like enqueue_job's, so the async
+    app can return it too.
+    """
+    log.warning("Refusing duplicate request: %s", e)
+    if isinstance(e, idempotency.KeyReused):
+        return {"error": "This answer was already submitted with different content"}, 422, {}
+    return {"error": "This answer is still being processed, please retry shortly"}, 409, {"Retry-After": "5"}
+
+def idempotent(view):
+    """Run a view once per idempotency key; duplicates get the first response"""
+    @functools.wraps(view)
+    def handle():
+        data = request.get_json(silent=True)
+        key = idempotency_key(request.path, request.headers, data)
+        if key is None:
+            return view()
+
+        first_response = None
+        def run():
+            nonlocal first_response
+            first_response = app.make_response(view())
+            return idempotency.StoredResponse(
+                first_response.status_code, first_response.get_data(), first_response.content_type
+            )
+
+        try:
+            stored, outcome = idempotency.single_flight(
+                idempotency_store, key, idempotency.fingerprint(data), run, wait=IDEMPOTENCY_WAIT
+            )
+        except (idempotency.KeyReused, idempotency.Busy) as e:
+            return duplicate_error(e)
+        if outcome == "ran":
+            return first_response
+        return replayed_response(key, stored, outcome)
+    return handle
+
+def replayed_response(key, stored, outcome):
+    """A stored response, as a (body, status, headers) tuple both apps can return"""
+    log.info("Replaying the response to %s (%s)", key, outcome)
+    return stored.body, stored.status, {'Content-Type': stored.content_type, 'Idempotent-Replayed': 'true'}
+
+def refused_plan_job(answer):
+    """The 503 for a final answer whose background plan the queue has no
+    room for, or None. Checked before the answer is recorded."""
+    if answer.final and answer.background and job_queue.full():
+        log.warning("Refusing background job: %d jobs already queued or running", job_queue.max_pending)
+        return interview.queue_full()
+    return None
+
+def add_answer(answer, key, data):
+    """Append the user's answer to the thread, once per idempotency key.
+
+    A request that fails after this is released and may be retried with the
+    same key; the retry skips the append and only redoes what failed.
+    """
+    added = idempotency.step_once(
+        idempotency_store, key, idempotency.fingerprint(data), "answer",
+        lambda: conversation.add_user_message(answer.thread_id, answer.text)
+    )
+    log.debug("Answer added to thread" if added else "Answer already added by an earlier attempt")
+
+metrics.Gauge(
+    "resolutionpal_jobs_pending",
+    "Background jobs queued or running in this worker",
+    lambda: job_queue.stats()["pending"]
+)
+metrics.Gauge(
+    "resolutionpal_openai_connections",
+    "Connections in this worker's OpenAI pools, by state",
+    lambda: {
+        state: sum(pool[state] for pool in openai_pool_stats())
+        for state in ("open", "idle")
+    },
+    labelname="state"
+)
+metrics.Gauge(
+    "resolutionpal_openai_breaker_open",
+    "1 while the OpenAI circuit breaker is refusing requests",
+    lambda: int(rate_governor.built and rate_governor.breaker.state == "open")
+)
+
+metrics.Gauge(
+    "resolutionpal_render_cache_lookups",
+    "Rendered resolution cache lookups in this worker, by result",
+    lambda: {
+        "hit": markdown_render.render_cache.hits,
+        "miss": markdown_render.render_cache.misses
+    },
+    labelname="result"
+)
+metrics.Gauge(
+    "resolutionpal_render_cache_hit_ratio",
+    "Share of /render-resolution lookups served from the rendered HTML cache",
+    lambda: markdown_render.render_cache.stats()["hit_ratio"]
+)
+metrics.Gauge(
+    "resolutionpal_render_cache_bytes",
+    "Size of the rendered HTML held in this worker's cache",
+    lambda: markdown_render.render_cache.bytes
+)
+
+metrics.Gauge(
+    "resolutionpal_idempotent_requests",
+    "Keyed answer submissions in this worker, by whether they ran, were replayed, merged or refused",
+    idempotency.outcomes,
+    labelname="outcome"
+)
+
+metrics.Gauge(
+    "resolutionpal_startup_seconds",
+    "Time each startup phase of this worker took",
+    lambda: startup.stats()["phases"],
+    labelname="phase"
+)
+
+metrics.Gauge(
+    "resolutionpal_log_records_dropped",
+    "Log records dropped because the log writer fell behind",
+    logs.dropped_records
+)
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Latency histograms and gauges in the Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    """Connection pool and rate governor state of this worker process"""
+    return jsonify({
+        "pid": os.getpid(),
+        "green_threads": green_mode(),
+        "openai_pools": openai_pool_stats(),
+        "openai_governor": rate_governor.stats() if rate_governor.built else None,
+        "render_cache": markdown_render.render_cache.stats(),
+        "resolution_store": resolution_store.stats(),
+        "idempotency": {**idempotency_store.stats(), "outcomes": idempotency.outcomes()},
+        "static_files": static_files.stats(),
+        "startup": startup.stats()
+    })
+
+@app.route('/admin/logging', methods=['GET', 'POST'])
+def admin_logging():
+    """Read or change the log level, payload logging and sampling of every worker.
+
+    Only available when ADMIN_TOKEN is set, and requires it as a bearer token.
+    """
+    admin_token = os.getenv('ADMIN_TOKEN')
+    if not admin_token:
+        return jsonify({"error": "Not found"}), 404
+    if request.headers.get('Authorization') != f"Bearer {admin_token}":
+        return jsonify({"error": "Unauthorized"}), 401
+
+    if request.method == 'POST':
+        data = request.get_json() or {}
+        if not isinstance(data, dict):
+            return jsonify({"error": "Expected a JSON object"}), 400
+        try:
+            updated = logs.update_settings(
+                level=data.get('level'),
+                payloads=data.get('payloads'),
+                sample_rate=data.get('sampleRate')
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        log.warning("Logging settings changed: %s", updated)
+    return jsonify(logs.settings())
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Progress of a background job, with its result once it is done"""
+    job = job_queue.status(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    return jsonify(job)
 
 @app.route('/get_next_question', methods=['POST'])
+@idempotent
 def get_next_question():
     try:
-        print("\n=== Getting Next Question ===")
+        log.info("Getting next question")
         data = request.json
-        thread_id = data.get('threadId')
-        answer = data.get('answer')
-        question_number = data.get('questionNumber', 0)
-        question_assistant_id = data.get('question_assistant_id')
-        resolution_assistant_id = data.get('resolution_assistant_id')
-        
-        if not all([thread_id, question_assistant_id, resolution_assistant_id]):
-            raise ValueError("Missing required session data")
-        
-        print(f"Thread ID: {thread_id}")
-        print(f"Previous answer: {answer}")
-        print(f"Question number: {question_number}")
-        
-        if not thread_id:
-            raise ValueError("Thread ID is required")
+        answer = interview.Answer.for_next_question(data)
+        log.debug(
+            "Thread %s, question %s, previous answer: %s",
+            answer.thread_id, answer.question_number, logs.payload(answer.text)
+        )
             
         # Add the user's answer to the thread
-        print("Adding user's answer to thread...")
-        client.beta.threads.messages.create(
-            thread_id=thread_id,
-            role="user",
-            content=str(answer)
-        )
-        print("Answer added to thread")
+        add_answer(answer, idempotency_key(request.path, request.headers, data), data)
         
         # If we've reached 10 questions, generate the resolution
-        if question_number >= 9:
-            print("Reached final question, generating resolution...")
-            return generate_resolution(thread_id)
+        if answer.final:
+            log.info("Reached final question, generating resolution")
+            return generate_resolution(answer.thread_id, answer.resolution_assistant_id)
             
         # Get the next question
-        print("Creating run for next question...")
-        run = client.beta.threads.runs.create(
-            thread_id=thread_id,
-            assistant_id=question_assistant_id,
-            instructions=f"""Ask question #{question_number + 1}. 
-            Remember to:
-            1. Keep it under 15 words
-            2. Make it specific to their previous answers
-            3. Never repeat a previous question
-            4. Vary the question type from the last question
-            5. Return the response in the specified JSON format with type and text fields"""
-        )
-        print(f"Run created with ID: {run.id}")
-        
-        run = wait_for_run(thread_id, run.id)
+        question = conversation.ask_question(answer.thread_id, answer.question_assistant_id, NEXT_QUESTION_INSTRUCTIONS)
+        return jsonify(interview.question_response(answer, question))
         
-        # Get the assistant's response
-        print("Retrieving assistant's response...")
-        messages = client.beta.threads.messages.list(thread_id=thread_id)
-        last_message = messages.data[0].content[0].text.value
-        print(f"Raw response: {last_message}")
-        
-        try:
-            # Parse the response as JSON
-            question_data = json.loads(last_message)
-            # Format the data to match our expected structure
-            formatted_data = format_question_data(question_data)
-            # Validate with Pydantic
-            question = Question(**formatted_data)
-            
-            return jsonify({
-                "question": question.model_dump(),
-                "threadId": thread_id,
-                "questionNumber": question_number + 1,
-                "question_assistant_id": question_assistant_id,
-                "resolution_assistant_id": resolution_assistant_id
-            })
-            
-        except json.JSONDecodeError as e:
-            print(f"Failed to parse JSON response: {e}")
-            # Fallback to text extraction
-            return jsonify({
-                "question": {
-                    "type": "TEXT",
-                    "text": last_message.strip(),
-                    "options": None
-                },
-                "threadId": thread_id,
-                "questionNumber": question_number + 1,
-                "question_assistant_id": question_assistant_id,
-                "resolution_assistant_id": resolution_assistant_id
-            })
-            
-        except Exception as e:
-            print(f"Error processing question: {e}")
-            return jsonify({
-                "question": {
-                    "type": "TEXT",
-                    "text": "Error processing question. Please try again.",
-                    "options": None
-                },
-                "threadId": thread_id,
-                "questionNumber": question_number + 1,
-                "question_assistant_id": question_assistant_id,
-                "resolution_assistant_id": resolution_assistant_id
-            })
-        
-    except TimeoutError as e:
-        print(f"Timeout error: {str(e)}")
-        return jsonify({"error": "Request timed out. Please try again."}), 504
+    except (idempotency.KeyReused, idempotency.Busy) as e:
+        return duplicate_error(e)
     except Exception as e:
-        print(f"Error in get_next_question: {str(e)}")
-        print(f"Full traceback: {traceback.format_exc()}")
-        return jsonify({"error": str(e)}), 500
+        return interview.failure(e, "get_next_question")
 
-def generate_resolution(thread_id):
+def generate_resolution(thread_id, resolution_assistant_id=None, unescape=False):
     """Generate the final resolution using the resolution assistant"""
     try:
-        print("\n=== Generating Resolution ===")
-        
-        # Get the conversation history first
-        messages = client.beta.threads.messages.list(thread_id=thread_id)
-        conversation_history = [
-            {
-                "role": msg.role,
-                "content": msg.content[0].text.value
-            } for msg in messages.data
-        ]
-        
-        print("Conversation history:", conversation_history)
-        
-        # Create a run with the resolution assistant
-        print("Creating resolution run...")
-        instructions = f"""Based on the conversation history, create a personalized resolution plan.
-        
-        IMPORTANT CONTEXT:
-        The user has provided detailed information about their goals, preferences, and current situation.
-        Pay special attention to their specific answers about routines, preferences, and challenges.
-        Use all of this context to create a highly personalized plan.
-
-        REQUIRED SECTIONS:
-        1. Title - Make it personal and specific to their goal
-        2. Vision - 2-3 sentences describing their ideal end state
-        3. Key Goals - 3-5 specific, measurable sub-goals
-        4. Personal Motivation - Connect to their specific reasons and situation
-        5. Action Plan - Break down by time periods, with relevant links:
-           - January (Getting Started) - Include links to initial resources
-           - February-March (Building Habits) - Link to tools and communities
-           - April-June (Growing Stronger) - Add progressive resource links
-           - July-September (Maintaining Momentum) - Include support group links
-           - October-December (Achieving Milestones) - Link to advanced resources
-        6. Milestones - 4-5 specific checkpoints with dates:
-           Example: <b>January 15</b>: Set up <a href="URL">recommended tool</a>
-        7. Resources & Tools - Include links to all recommended resources
-        8. Support System - Link to relevant communities and groups
-        9. Encouragement - One sentence of personalized motivation
-
-        HTML FORMATTING REQUIREMENTS:
-        1. Use proper heading tags:
-           <h1>Main Title</h1>
-           <h2>Section Headings</h2>
-           <h3>Subsection Headings</h3>
-
-        2. Use proper formatting tags:
-           - Bold: <b>important text</b>
-           - Links: <a href="URL">descriptive text</a>
-           - Combine when needed: <b><a href="URL">important link</a></b>
-           Example: "Start with <b>daily practice</b> using <a href="URL">this beginner guide</a>"
-
-        3. Lists and Structure:
-           - Use bullet points with single dash (-)
-           - Keep paragraphs short and focused
-           - Use bold tags for emphasis within paragraphs
-           - Include specific dates and metrics
-           - Format milestone dates with <b>Date</b>: Description
-        
-        PERSONALIZATION RULES:
-        1. Reference specific details they mentioned
-        2. Use their name and location naturally
-        3. Incorporate their stated preferences
-        4. Address their specific challenges
-        5. Build on their existing habits
-        6. Reference their support system
-        7. Match their experience level
-        8. Include location-specific suggestions where relevant
-        9. Consider seasonal factors if applicable
-        10. Balance general and local resources
-        
-        Add relevant links throughout content
-
-        LINK REQUIREMENTS:
-        1. Every recommended resource must have a working link
-        2. Include links for:
-           - Tools and apps
-           - Local facilities
-           - Online communities
-           - Learning resources
-           - Equipment or supplies
-           - Support groups
-           - Professional services
-        3. Use descriptive link text
-        4. Embed links naturally in content
+        log.info("Generating resolution")
+        if not resolution_assistant_id:
+            resolution_assistant_id = conversation.assistant_ids()[1]
         
-        Make every section highly specific to their situation - avoid generic advice.
-        Use location data to enhance the plan naturally, without making it the main focus.
-        
-        IMPORTANT FORMATTING REMINDERS:
-        - Always use HTML tags properly
-        - Close all tags correctly
-        - Include relevant, working links
-        - Use descriptive link text
-        - Format dates with <b>Date</b>: Description"""
-        
-        run = client.beta.threads.runs.create(
-            thread_id=thread_id,
-            assistant_id=resolution_assistant_id, # type: ignore
-            instructions=instructions
+        # Wait for the resolution assistant with timeout
+        resolution = conversation.ask(
+            thread_id,
+            resolution_assistant_id,
+            GENERATE_RESOLUTION_INSTRUCTIONS,
+            max_wait_time=60
         )
+        log.info("Generated resolution: %d characters", len(resolution))
+        log.debug("Resolution: %s", logs.payload(resolution))
         
-        print(f"Created run with ID: {run.id}")
-        
-        # Wait for completion with timeout
-        run = wait_for_run(thread_id, run.id, max_wait_time=60)
-        print(f"Run completed with status: {run.status}")
-        
-        # Get the resolution
-        messages = client.beta.threads.messages.list(thread_id=thread_id)
-        if not messages.data:
-            raise ValueError("No messages received from assistant")
-            
-        resolution = messages.data[0].content[0].text.value
-        print("Generated resolution:", resolution[:100] + "...")
-        
-        return jsonify({
-            "resolution": resolution,
-            "threadId": thread_id,
-            "isComplete": True
-        })
+        return jsonify(interview.resolution_response(thread_id, resolution, publish_resolution(resolution), unescape))
         
     except Exception as e:
-        print(f"Error generating resolution: {str(e)}")
-        print(f"Full traceback: {traceback.format_exc()}")
-        return jsonify({
-            "error": str(e),
-            "resolution": None,
-            "threadId": thread_id
-        }), 500
+        log.exception("Error generating resolution: %s", e)
+        return interview.resolution_error(thread_id, e)
 
 @app.route('/generate-resolution', methods=['POST'])
 def handle_generate_resolution():
@@ -655,29 +1118,103 @@ def handle_generate_resolution():
         
         if not thread_id:
             return jsonify({"error": "No thread ID provided"}), 400
+
+        if data.get('background'):
+            return enqueue_job("generate_resolution", {"threadId": thread_id})
             
-        response = generate_resolution(thread_id)
-        
-        # Process the markdown to ensure proper rendering
-        if isinstance(response, tuple):
-            return response
-            
-        resolution_data = response.get_json()
-        if resolution_data and 'resolution' in resolution_data:
-            # Clean up any escaped markdown
-            resolution_text = resolution_data['resolution']
-            # Ensure markdown is properly formatted
-            resolution_text = resolution_text.replace('\\*', '*')  # Unescape any escaped asterisks
-            resolution_data['resolution'] = resolution_text
-            
-            return jsonify(resolution_data)
-            
-        return response
+        # Unescape the model's escaped markdown asterisks
+        return generate_resolution(thread_id, unescape=True)
         
     except Exception as e:
-        print(f"Error in handle_generate_resolution: {str(e)}")
-        print(f"Full traceback: {traceback.format_exc()}")
-        return jsonify({"error": str(e)}), 500
+        return interview.failure(e, "handle_generate_resolution")
+
+def sse_event(event, data):
+    """Format a Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/stream-resolution', methods=['POST'])
+def stream_resolution():
+    """Stream the final resolution to the browser over Server-Sent Events.
+
+    Accepts the /submit_answer payload for the final answer, or just a
+    threadId to resume the interview thread like /generate-resolution.
+    Emits `delta` events with HTML as the model writes it, then a `done`
+    event with the same fields the non-streaming endpoint returns.
+
+    A final answer is idempotent like /submit_answer: a duplicate waits for
+    the stream it repeats, and it and later retries get a stream holding
+    just its `start` and `done` events.
+    """
+    data = request.get_json() or {}
+    thread_id = data.get('threadId') if isinstance(data, dict) else None
+    if not thread_id:
+        return jsonify({"error": "No thread ID provided"}), 400
+    try:
+        answer = interview.Answer.streamed(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    resolution_assistant_id = data.get('resolutionAssistantId')
+
+    key = idempotency_key(request.path, request.headers, data) if answer else None
+    if key is not None:
+        try:
+            stored, outcome = idempotency.claim_or_wait(
+                idempotency_store, key, idempotency.fingerprint(data), wait=IDEMPOTENCY_WAIT
+            )
+        except (idempotency.KeyReused, idempotency.Busy) as e:
+            return duplicate_error(e)
+        if stored is not None:
+            return replayed_response(key, stored, outcome)
+
+    def generate():
+        replay = None
+        try:
+            # Open the stream right away so the client can drop its spinner
+            start = sse_event('start', {"threadId": thread_id})
+            yield start
+            try:
+                assistant_id = resolution_assistant_id or conversation.assistant_ids()[1]
+                if answer:
+                    add_answer(answer, key, data)
+                    plan_thread_id = conversation.summarize(thread_id, expected_messages=answer.expected_messages)
+                    instructions = RESOLUTION_PLAN_INSTRUCTIONS
+                else:
+                    plan_thread_id = thread_id
+                    instructions = GENERATE_RESOLUTION_INSTRUCTIONS
+
+                parts = []
+                for text in conversation.stream(plan_thread_id, assistant_id, instructions):
+                    parts.append(text)
+                    yield sse_event('delta', {"text": text})
+                resolution = ''.join(parts)
+                log.info("Streamed resolution: %d characters", len(resolution))
+
+                permalink = publish_resolution(resolution)
+                if answer:
+                    done = sse_event('done', interview.plan_response(resolution, permalink))
+                else:
+                    done = sse_event('done', interview.resolution_response(thread_id, resolution, permalink, unescape=True))
+                replay = start + done
+                yield done
+            except Exception as e:
+                log.exception("Error in stream_resolution: %s", e)
+                yield sse_event('error', {"error": str(e)})
+        finally:
+            # A stream that failed or lost its client before the plan was
+            # finished can run again; a finished one is replayed
+            if key is not None:
+                if replay is None:
+                    idempotency_store.release(key)
+                else:
+                    idempotency_store.finish(
+                        key, idempotency.StoredResponse(200, replay.encode(), 'text/event-stream')
+                    )
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 @app.route('/render-resolution', methods=['POST'])
 def render_resolution():
@@ -690,330 +1227,96 @@ def render_resolution():
         # Clean up any escaped markdown
         markdown_text = markdown_text.replace('\\*', '*')  # Unescape any escaped asterisks
         
-        # Convert markdown to HTML
-        html = markdown.markdown(markdown_text)
-        return jsonify({"html": html})
+        # The same text always renders the same HTML, so its hash is the ETag
+        digest = markdown_render.content_hash(markdown_text)
+        if request.if_none_match.contains(digest):
+            response = Response(status=304)
+        else:
+            with metrics.span("markdown_render"):
+                html = markdown_render.render(markdown_text, digest)
+            response = jsonify({"html": html})
+        response.set_etag(digest)
+        return response
         
     except Exception as e:
-        print(f"Error in render_resolution: {str(e)}")
+        log.exception("Error in render_resolution: %s", e)
         return jsonify({"error": str(e)}), 500
 
+@app.route('/resolutions/<resolution_id>', methods=['GET'])
+def resolution_page(resolution_id):
+    """Permalink page of a finished resolution, precompressed and cacheable for a year"""
+    variants = resolution_store.page(
+        resolution_id,
+        lambda content: render_template('resolution.html', content=content),
+        build=static_files.build
+    )
+    if variants is None:
+        return "Resolution not found", 404
+
+    coding = request.accept_encodings.best_match([c for c in ('br', 'gzip') if c in variants]) or 'identity'
+    body, etag = variants[coding]
+    headers = {
+        'Cache-Control': 'public, max-age=31536000, immutable',
+        'Vary': 'Accept-Encoding'
+    }
+    if request.if_none_match.contains(etag):
+        response = Response(status=304, headers=headers)
+    else:
+        response = Response(body, mimetype='text/html', headers=headers)
+        if coding != 'identity':
+            response.headers['Content-Encoding'] = coding
+    response.set_etag(etag)
+    return response
+
 @app.route('/submit_answer', methods=['POST'])
+@idempotent
 def submit_answer():
     try:
-        print("\n=== Processing Answer Submission ===")
+        log.info("Processing answer submission")
         data = request.json
-        thread_id = data.get('threadId')
-        answer = data.get('answer')
-        question_assistant_id = data.get('questionAssistantId')
-        resolution_assistant_id = data.get('resolutionAssistantId')
-        question_number = int(data.get('questionNumber', 1))
-
-        print(f"Current Question Number: {question_number}")
-        print(f"Thread ID: {thread_id}")
-        print(f"Answer: {answer}")
+        answer = interview.Answer.submitted(data)
+        log.debug("Thread %s, question %d, answer: %s", answer.thread_id, answer.question_number, logs.payload(answer.text))
 
-        if not all([thread_id, answer, question_assistant_id, resolution_assistant_id]):
-            raise ValueError("Missing required data for answer submission")
+        # Nothing is recorded for a request that will be refused anyway
+        refused = refused_plan_job(answer)
+        if refused is not None:
+            return refused
 
         # Add the user's answer to the thread
-        client.beta.threads.messages.create(
-            thread_id=thread_id,
-            role="user",
-            content=answer
-        )
-        print("Added user's answer to thread")
+        add_answer(answer, idempotency_key(request.path, request.headers, data), data)
 
         # We want to generate resolution after the 10th question (when question_number is 10)
-        if question_number >= 10:
-            print(f"\n=== Generating Resolution (Question {question_number}) ===")
-            
-            # Get all messages and organize them into Q&A pairs
-            messages = client.beta.threads.messages.list(thread_id=thread_id)
-            conversation_pairs = []
-            
-            # Messages are in reverse chronological order, so we need to reverse them
-            message_list = list(reversed(messages.data))
-            
-            # Skip the initial user info message
-            for i in range(1, len(message_list), 2):
-                if i + 1 < len(message_list):
-                    question = message_list[i].content[0].text.value
-                    answer = message_list[i + 1].content[0].text.value
-                    # Clean up the question format if it's JSON
-                    if question.strip().startswith('{'):
-                        try:
-                            q_data = json.loads(question)
-                            question = q_data.get('text', question)
-                        except:
-                            pass
-                    conversation_pairs.append(f"Q: {question}\nA: {answer}")
-            
-            # Get the initial user info
-            initial_info = message_list[0].content[0].text.value
-            
-            # Format the conversation history
-            conversation_history = (
-                f"Initial User Information:\n{initial_info}\n\n"
-                "Conversation History:\n" + 
-                "\n\n".join(conversation_pairs)
-            )
-            
-            print("\nFormatted conversation history:")
-            print(conversation_history)
-            
-            # Create new thread for resolution
-            new_thread = client.beta.threads.create()
-            print(f"\nCreated new thread for resolution: {new_thread.id}")
-            
-            # Add the formatted conversation history
-            client.beta.threads.messages.create(
-                thread_id=new_thread.id,
-                role="user",
-                content=f"""Please create a personalized resolution plan based on this conversation:
-
-{conversation_history}
+        if answer.final:
+            log.info("Generating resolution after question %d", answer.question_number)
 
-The user has shared their goals, challenges, and preferences through this conversation.
-Please use all of this information to create a detailed, personalized resolution plan."""
-            )
+            if answer.background:
+                return enqueue_job("resolution_plan", answer.plan_job())
             
-            instructions = """
-IMPORTANT CONTEXT:
-The user has provided detailed information about their goals, preferences, and current situation.
-Pay special attention to their specific answers about routines, preferences, and challenges.
-Use all of this context to create a highly personalized plan.
-
-REQUIRED SECTIONS:
-1. Title - Make it personal and specific to their goal
-2. Vision - 2-3 sentences describing their ideal end state
-3. Key Goals - 3-5 specific, measurable sub-goals
-4. Personal Motivation - Connect to their specific reasons and situation
-5. Action Plan - Break down by time periods, with relevant links:
-   - January (Getting Started) - Include links to initial resources
-   - February-March (Building Habits) - Link to tools and communities
-   - April-June (Growing Stronger) - Add progressive resource links
-   - July-September (Maintaining Momentum) - Include support group links
-   - October-December (Achieving Milestones) - Link to advanced resources
-6. Milestones - 4-5 specific checkpoints with dates:
-   Example: <b>January 15</b>: Set up <a href="URL">recommended tool</a>
-7. Resources & Tools - Include links to all recommended resources
-8. Support System - Link to relevant communities and groups
-9. Encouragement - One sentence of personalized motivation
-
-HTML FORMATTING REQUIREMENTS:
-Format your response using this exact structure:
-
-<div class="resolution-card">
-    <h1 class="resolution-title">[Personal and specific title]</h1>
-    
-    <h2>Your Vision</h2>
-    <p>[2-3 sentences describing ideal end state]</p>
-    
-    <h2>Key Goals</h2>
-    <ul>
-        [3-5 specific, measurable sub-goals]
-    </ul>
-    
-    <h2>Why This Matters</h2>
-    <p>[Connect to their specific motivation and situation]</p>
-    
-    <h2>Action Plan</h2>
-    <h3>January (Getting Started)</h3>
-    <ul>
-        [3-5 specific actions with resource links]
-    </ul>
-    
-    <h3>February-March (Building Habits)</h3>
-    <ul>
-        [3-5 actions with community links]
-    </ul>
-    
-    <h3>April-June (Growing Stronger)</h3>
-    <ul>
-        [3-5 actions with progressive resources]
-    </ul>
-    
-    <h3>July-September (Maintaining Momentum)</h3>
-    <ul>
-        [3-5 actions with support links]
-    </ul>
-    
-    <h3>October-December (Achieving Milestones)</h3>
-    <ul>
-        [3-5 actions with advanced resources]
-    </ul>
-    
-    <h2>Key Milestones</h2>
-    <ul>
-        [4-5 specific checkpoints with dates and links]
-    </ul>
-    
-    <h2>Tools and Resources</h2>
-    <ul>
-        [4-6 specific tools/resources with links]
-    </ul>
-    
-    <h2>Your Support System</h2>
-    <ul>
-        [List of communities and support groups with links]
-    </ul>
-    
-    <h2>Words of Encouragement</h2>
-    <p>[Personal and motivating message based on their situation]</p>
-</div>
-
-PERSONALIZATION RULES:
-1. Reference specific details they mentioned
-2. Use their name and location naturally
-3. Incorporate their stated preferences
-4. Address their specific challenges
-5. Build on their existing habits
-6. Reference their support system
-7. Match their experience level
-8. Include location-specific suggestions where relevant
-9. Consider seasonal factors if applicable
-10. Balance general and local resources
-
-LINK REQUIREMENTS:
-1. Every recommended resource must have a working link
-2. Include links for:
-   - Tools and apps
-   - Local facilities
-   - Online communities
-   - Learning resources
-   - Equipment or supplies
-   - Support groups
-   - Professional services
-3. Use descriptive link text
-4. Embed links naturally in content
-
-FORMATTING REMINDERS:
-- Use proper HTML tags throughout
-- Format dates as <b>Date</b>: Description
-- Use <b>bold</b> for emphasis
-- Use <a href="URL">descriptive text</a> for links
-- Keep paragraphs focused and concise
-- Make every section highly specific to their situation
-- Use their location data to enhance the plan naturally
-
-Important:
-1. Make the resolution SMART (Specific, Measurable, Achievable, Relevant, Time-bound)
-2. Use bullet points for all lists
-3. Keep the tone encouraging but realistic
-4. Base everything on the user's actual responses
-5. DO NOT ask any questions - this is the final resolution
-6. Use the exact HTML structure provided"""
-
-            try:
-                print("Creating resolution run...")
-                run = client.beta.threads.runs.create(
-                    thread_id=new_thread.id,
-                    assistant_id=resolution_assistant_id,
-                    instructions=instructions
-                )
-                print(f"Created resolution run with ID: {run.id}")
-                
-                run = wait_for_run(new_thread.id, run.id)
-                print(f"Resolution run completed with status: {run.status}")
-                
-                messages = client.beta.threads.messages.list(thread_id=new_thread.id)
-                resolution = messages.data[0].content[0].text.value
-                print("Successfully generated resolution")
-                print(f"Resolution length: {len(resolution)} characters")
-                
-                return jsonify({
-                    "done": True,
-                    "resolution": resolution
-                })
-            except Exception as e:
-                print(f"Error generating resolution: {str(e)}")
-                print(f"Full resolution error traceback: {traceback.format_exc()}")
-                raise
+            plan_thread_id = conversation.summarize(answer.thread_id, expected_messages=answer.expected_messages)
+            resolution = conversation.ask(plan_thread_id, answer.resolution_assistant_id, RESOLUTION_PLAN_INSTRUCTIONS)
+            log.info("Generated resolution: %d characters", len(resolution))
+            return jsonify(interview.plan_response(resolution, publish_resolution(resolution)))
 
         # Get next question
-        print(f"\n=== Getting Question {question_number + 1} ===")
-        instructions = (
-            "Based on the previous answers, ask your next strategic question to help create a meaningful resolution. "
-            "Each question should build towards creating a SMART resolution "
-            "(Specific, Measurable, Achievable, Relevant, Time-bound).\n\n"
-            "Consider what information you still need about:\n"
-            "- Specific goals and desired outcomes\n"
-            "- How to measure progress\n"
-            "- Resources and support needed\n"
-            "- Realistic timeframes\n"
-            "- Potential obstacles\n"
-            "- Motivation and commitment level\n\n"
-            "Format your question as JSON:\n"
-            "1. Keep it under 15 words\n"
-            "2. Make it specific to their resolution focus\n"
-            "3. Use this structure:\n"
-            '{"type": "TEXT" | "CHOICE" | "YES/NO", "text": "Your question", "options": ["option1", "option2"] // for CHOICE only}'
-        ).strip()
-
-        run = client.beta.threads.runs.create(
-            thread_id=thread_id,
-            assistant_id=question_assistant_id,
-            instructions=instructions
-        )
-        print(f"Created question run with ID: {run.id}")
-
-        run = wait_for_run(thread_id, run.id)
-        print(f"Question run completed with status: {run.status}")
+        log.info("Getting question %d", answer.question_number + 1)
 
-        messages = client.beta.threads.messages.list(thread_id=thread_id)
-        next_question = messages.data[0].content[0].text.value
-        print(f"Raw question response: {next_question}")
+        question = bank_next_question(answer.thread_id)
+        if question is not None:
+            log.info("Next question served from the question bank")
+            conversation.add_assistant_message(answer.thread_id, json.dumps(question))
+        else:
+            question = conversation.ask_question(answer.thread_id, answer.question_assistant_id, NEXT_QUESTION_INSTRUCTIONS)
 
-        try:
-            # Try to parse as JSON
-            if next_question.strip().startswith('{'):
-                question_data = json.loads(next_question)
-            else:
-                # If not JSON, create a text question
-                question_data = {
-                    "type": "TEXT",
-                    "text": next_question.strip()
-                }
-
-            # Format the data
-            formatted_data = format_question_data(question_data)
-            print(f"Formatted question data: {formatted_data}")
-
-            # Validate with Pydantic
-            question = Question(**formatted_data)
-            print(f"Validated question: {question.model_dump()}")
-
-            return jsonify({
-                "question": question.model_dump(),
-                "threadId": thread_id,
-                "questionNumber": question_number + 1,
-                "questionAssistantId": question_assistant_id,
-                "resolutionAssistantId": resolution_assistant_id,
-                "done": False
-            })
-
-        except Exception as e:
-            print(f"Error processing next question: {str(e)}")
-            print(f"Falling back to text question")
-
-            return jsonify({
-                "question": {
-                    "type": "TEXT",
-                    "text": next_question.strip(),
-                    "options": None
-                },
-                "threadId": thread_id,
-                "questionNumber": question_number + 1,
-                "questionAssistantId": question_assistant_id,
-                "resolutionAssistantId": resolution_assistant_id,
-                "done": False
-            })
+        return jsonify(interview.next_question_response(answer, question))
 
+    except (idempotency.KeyReused, idempotency.Busy) as e:
+        return duplicate_error(e)
     except Exception as e:
-        print(f"Error in submit_answer: {str(e)}")
-        print(f"Full traceback: {traceback.format_exc()}")
-        return jsonify({"error": str(e)}), 500
+        return interview.failure(e, "submit_answer")
+
+startup.mark("routes")
+startup_stats = startup.stats()
+log.info("Started in %.3fs: %s", startup_stats["boot_seconds"], startup_stats["phases"])
 
 if __name__ == '__main__':
     app.run(port=5001) 
\ No newline at end of file
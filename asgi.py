@@ -0,0 +1,464 @@
+"""Async (ASGI) serving mode for ResolutionPal.
+
+The interview endpoints (/start_session, /get_next_question, /submit_answer
+and /generate-resolution) run as coroutines on one shared AsyncOpenAI client,
+so a request waiting on OpenAI no longer holds a worker thread. Local work
+that can block (the SQLite-backed transcript, job and idempotency stores,
+transcript compaction) runs in a thread via asyncio.to_thread, so one slow
+write or lock wait doesn't stall every other connection. All other
+routes (pages, static files, /render-resolution, /stream-resolution, /jobs) are
+served by the Flask app in app.py through an ASGI adapter. Requests are
+parsed and answered by the same code as in the sync app (interview.py and the
+helpers imported from app.py); only the OpenAI calls here are awaited.
+
+    pip install -r requirements-async.txt
+    uvicorn asgi:application --port 5001
+"""
+import asyncio
+import functools
+import json
+import time
+
+from asgiref.wsgi import WsgiToAsgi
+from openai import NOT_GIVEN, AsyncOpenAI
+from quart import Quart, jsonify, request
+
+import app as sync_app
+import idempotency
+import interview
+import logs
+import metrics
+from openai_http import create_async_http_client
+from questions import QUESTION_RESPONSE_FORMAT, parse_question, text_question
+from app import (
+    ASSISTANT_MODEL,
+    FIRST_QUESTION_INSTRUCTIONS,
+    GENERATE_RESOLUTION_INSTRUCTIONS,
+    IDEMPOTENCY_WAIT,
+    NEXT_QUESTION_INSTRUCTIONS,
+    RESOLUTION_PLAN_INSTRUCTIONS,
+    RUN_STREAMING,
+    ChatConversation,
+    RunWatch,
+    bank_next_question,
+    completion_reply,
+    enqueue_job,
+    compacted_history,
+    duplicate_error,
+    finished_run,
+    first_question_from_reply,
+    idempotency_key,
+    idempotency_store,
+    mirrored_transcript,
+    opening_messages,
+    publish_resolution,
+    refused_plan_job,
+    repaired_question,
+    replayed_response,
+    resolution_request_message,
+    run_params,
+    stored_first_question,
+    thread_message,
+    transcripts,
+)
+
+log = logs.get_logger("asgi")
+
+# Shared by every coroutine in the process
+async_client = AsyncOpenAI(
+    api_key=sync_app.api_key,
+    max_retries=0,
+    http_client=create_async_http_client(sync_app.rate_governor)
+)
+
+async_app = Quart(__name__)
+
+ASYNC_PATHS = {'/start_session', '/get_next_question', '/submit_answer', '/generate-resolution'}
+
+@async_app.before_request
+async def start_request_timer():
+    metrics.set_endpoint(request.url_rule.rule if request.url_rule else "unmatched")
+    metrics.request_started()
+    request.started = time.perf_counter()
+
+@async_app.after_request
+async def record_request_time(response):
+    if hasattr(request, 'started'):
+        metrics.observe_request(time.perf_counter() - request.started, response.status_code)
+    return response
+
+@async_app.teardown_request
+async def finish_request(exc=None):
+    if hasattr(request, 'started'):
+        metrics.request_finished()
+
+@async_app.after_request
+async def add_cors_headers(response):
+    """Match the headers flask-cors adds to the sync app"""
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    if request.method == 'OPTIONS':
+        response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
+        requested = request.headers.get('Access-Control-Request-Headers')
+        if requested:
+            response.headers['Access-Control-Allow-Headers'] = requested
+    return response
+
+async def run_to_completion(thread_id, assistant_id, instructions, max_wait_time=30, truncation_strategy=None,
+                            response_format=None):
+    """Async version of app.run_to_completion"""
+    watch = RunWatch(max_wait_time)
+    if RUN_STREAMING:
+        stream = await async_client.beta.threads.runs.create(
+            **run_params(thread_id, assistant_id, instructions, truncation_strategy, response_format),
+            stream=True,
+            timeout=max_wait_time
+        )
+        while stream is not None:
+            events, stream = stream, None
+            async with events:
+                async for event in events:
+                    if watch.streamed(event):
+                        break
+                    if event.event == 'thread.run.requires_action':
+                        log.info("Run requires action - submitting empty tool outputs")
+                        stream = await async_client.beta.threads.runs.submit_tool_outputs(
+                            thread_id=thread_id,
+                            run_id=event.data.id,
+                            tool_outputs=[],
+                            stream=True
+                        )
+                        break
+
+        result = watch.stream_result()
+        if result is not None:
+            return result
+        if watch.run is not None:
+            return await wait_for_run(thread_id, watch.run.id, max_wait_time=watch.remaining())
+
+    run = await async_client.beta.threads.runs.create(
+        **run_params(thread_id, assistant_id, instructions, truncation_strategy, response_format)
+    )
+    log.debug("Run created with ID: %s", run.id)
+    return await wait_for_run(thread_id, run.id, max_wait_time=watch.remaining())
+
+async def wait_for_run(thread_id, run_id, max_wait_time=30):
+    """Async version of app.wait_for_run"""
+    watch = RunWatch(max_wait_time)
+    while True:
+        watch.check_deadline()
+        run = await async_client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run_id)
+        result = watch.polled(run)
+        if result is not None:
+            return result
+        if run.status == 'requires_action':
+            await async_client.beta.threads.runs.submit_tool_outputs(
+                thread_id=thread_id,
+                run_id=run_id,
+                tool_outputs=[]
+            )
+            continue
+        await asyncio.sleep(watch.next_delay())
+
+async def run_reply(thread_id, run_id):
+    """Async version of app.run_reply"""
+    messages = await async_client.beta.threads.messages.list(thread_id=thread_id, run_id=run_id, limit=1)
+    if not messages.data:
+        raise ValueError("No messages received from assistant")
+    return messages.data[0].content[0].text.value
+
+async def question_from_reply(raw_reply):
+    """Async version of app.question_from_reply; only a repair leaves the event loop"""
+    question = parse_question(raw_reply)
+    if question is None:
+        question = await asyncio.to_thread(repaired_question, raw_reply)
+    return question or text_question(raw_reply)
+
+class AsyncAssistantsConversation:
+    """Async version of app.AssistantsConversation"""
+
+    async def assistant_ids(self):
+        # The registry is only slow the first time; keep it off the event loop
+        with metrics.span("assistant_lookup"):
+            return await asyncio.gather(
+                asyncio.to_thread(sync_app.get_question_assistant_id),
+                asyncio.to_thread(sync_app.get_resolution_assistant_id)
+            )
+
+    async def start(self, initial_message, assistant_reply=None):
+        messages = opening_messages(initial_message, assistant_reply)
+        with metrics.span("thread_create"):
+            thread = await async_client.beta.threads.create(messages=messages)
+        log.info("Thread created with ID: %s", thread.id)
+        await asyncio.to_thread(transcripts.create, thread.id, messages)
+        return thread.id
+
+    async def add_user_message(self, thread_id, content):
+        with metrics.span("message_create"):
+            await async_client.beta.threads.messages.create(
+                thread_id=thread_id,
+                role="user",
+                content=content
+            )
+        await asyncio.to_thread(transcripts.append, thread_id, "user", content)
+
+    async def add_assistant_message(self, thread_id, content):
+        with metrics.span("message_create"):
+            await async_client.beta.threads.messages.create(
+                thread_id=thread_id,
+                role="assistant",
+                content=content
+            )
+        await asyncio.to_thread(transcripts.append, thread_id, "assistant", content)
+
+    async def ask(self, thread_id, assistant_id, instructions, max_wait_time=30, response_format=None):
+        instructions, truncation_strategy = await asyncio.to_thread(
+            sync_app.conversation.run_context, thread_id, instructions
+        )
+        with metrics.span("run"):
+            result = await run_to_completion(
+                thread_id, assistant_id, instructions, max_wait_time, truncation_strategy, response_format
+            )
+        finished_run(result)
+        with metrics.span("message_list"):
+            reply = await run_reply(thread_id, result.run.id)
+        await asyncio.to_thread(transcripts.append, thread_id, "assistant", reply)
+        return reply
+
+    async def ask_question(self, thread_id, assistant_id, instructions, max_wait_time=30):
+        return await question_from_reply(
+            await self.ask(thread_id, assistant_id, instructions, max_wait_time, response_format=QUESTION_RESPONSE_FORMAT)
+        )
+
+    async def transcript(self, thread_id, expected_messages=None):
+        """Served from the local mirror, like app.AssistantsConversation.transcript"""
+        texts = await asyncio.to_thread(mirrored_transcript, thread_id, expected_messages)
+        if texts is not None:
+            return texts
+
+        with metrics.span("transcript_list"):
+            messages = [
+                thread_message(msg)
+                async for msg in async_client.beta.threads.messages.list(thread_id=thread_id, order="asc", limit=100)
+            ]
+        await asyncio.to_thread(transcripts.create, thread_id, messages)
+        return [message["content"] for message in messages]
+
+    async def summarize(self, thread_id, expected_messages=None):
+        conversation_history = await asyncio.to_thread(
+            compacted_history, await self.transcript(thread_id, expected_messages)
+        )
+        return await self.start(resolution_request_message(conversation_history))
+
+class AsyncChatConversation:
+    """Async version of app.ChatConversation, sharing its local transcripts.
+
+    The local calls read and write the transcript store (SQLite with
+    TRANSCRIPT_DB) and compact transcripts, so they run in a thread.
+    """
+
+    def __init__(self, local):
+        self.local = local
+
+    async def assistant_ids(self):
+        return await asyncio.to_thread(self.local.assistant_ids)
+
+    async def start(self, initial_message, assistant_reply=None):
+        return await asyncio.to_thread(self.local.start, initial_message, assistant_reply)
+
+    async def add_user_message(self, session_id, content):
+        await asyncio.to_thread(self.local.add_user_message, session_id, content)
+
+    async def add_assistant_message(self, session_id, content):
+        await asyncio.to_thread(self.local.add_assistant_message, session_id, content)
+
+    async def ask(self, session_id, assistant_id, instructions, max_wait_time=30, response_format=None):
+        with metrics.span("completion"):
+            completion = await async_client.chat.completions.create(
+                model=ASSISTANT_MODEL,
+                messages=await asyncio.to_thread(self.local.messages_for, session_id, assistant_id, instructions),
+                response_format=response_format or NOT_GIVEN,
+                timeout=max_wait_time
+            )
+        reply = completion_reply(completion)
+        await asyncio.to_thread(self.local.append, session_id, "assistant", reply)
+        return reply
+
+    async def ask_question(self, session_id, assistant_id, instructions, max_wait_time=30):
+        return await question_from_reply(
+            await self.ask(session_id, assistant_id, instructions, max_wait_time, response_format=QUESTION_RESPONSE_FORMAT)
+        )
+
+    async def transcript(self, session_id, expected_messages=None):
+        return await asyncio.to_thread(self.local.transcript, session_id)
+
+    async def summarize(self, session_id, expected_messages=None):
+        return await asyncio.to_thread(self.local.summarize, session_id)
+
+if isinstance(sync_app.conversation, ChatConversation):
+    conversation = AsyncChatConversation(sync_app.conversation)
+else:
+    conversation = AsyncAssistantsConversation()
+
+@async_app.route('/start_session', methods=['POST'])
+async def start_session():
+    try:
+        session = interview.NewSession.parse(await request.get_json())
+        question = stored_first_question(session)
+
+        (question_assistant_id, resolution_assistant_id), thread_id = await asyncio.gather(
+            conversation.assistant_ids(),
+            conversation.start(
+                session.initial_message,
+                assistant_reply=json.dumps(question) if question is not None else None
+            )
+        )
+
+        if question is None:
+            raw_reply = await conversation.ask(
+                thread_id, question_assistant_id, FIRST_QUESTION_INSTRUCTIONS,
+                response_format=QUESTION_RESPONSE_FORMAT
+            )
+            # Only a malformed reply needs the repair call
+            question = await asyncio.to_thread(first_question_from_reply, session, raw_reply)
+
+        return jsonify(interview.session_response(question, thread_id, question_assistant_id, resolution_assistant_id))
+
+    except Exception as e:
+        return interview.failure(e, "start_session")
+
+async def add_answer(answer, key, data):
+    """Async version of app.add_answer"""
+    added = await idempotency.step_once_async(
+        idempotency_store, key, idempotency.fingerprint(data), "answer",
+        lambda: conversation.add_user_message(answer.thread_id, answer.text)
+    )
+    log.debug("Answer added to thread" if added else "Answer already added by an earlier attempt")
+
+def idempotent(view):
+    """Async version of app.idempotent"""
+    @functools.wraps(view)
+    async def handle():
+        data = await request.get_json(silent=True)
+        key = idempotency_key(request.path, request.headers, data)
+        if key is None:
+            return await view()
+
+        first_response = None
+        async def run():
+            nonlocal first_response
+            first_response = await async_app.make_response(await view())
+            return idempotency.StoredResponse(
+                first_response.status_code, await first_response.get_data(), first_response.content_type
+            )
+
+        try:
+            stored, outcome = await idempotency.single_flight_async(
+                idempotency_store, key, idempotency.fingerprint(data), run, wait=IDEMPOTENCY_WAIT
+            )
+        except (idempotency.KeyReused, idempotency.Busy) as e:
+            return duplicate_error(e)
+        if outcome == "ran":
+            return first_response
+        return replayed_response(key, stored, outcome)
+    return handle
+
+@async_app.route('/get_next_question', methods=['POST'])
+@idempotent
+async def get_next_question():
+    try:
+        data = await request.get_json()
+        answer = interview.Answer.for_next_question(data)
+
+        await add_answer(answer, idempotency_key(request.path, request.headers, data), data)
+
+        if answer.final:
+            return await generate_resolution(answer.thread_id, answer.resolution_assistant_id)
+
+        question = await conversation.ask_question(answer.thread_id, answer.question_assistant_id, NEXT_QUESTION_INSTRUCTIONS)
+        return jsonify(interview.question_response(answer, question))
+
+    except (idempotency.KeyReused, idempotency.Busy) as e:
+        return duplicate_error(e)
+    except Exception as e:
+        return interview.failure(e, "get_next_question")
+
+async def generate_resolution(thread_id, resolution_assistant_id=None, unescape=False):
+    """Async version of app.generate_resolution"""
+    try:
+        if not resolution_assistant_id:
+            resolution_assistant_id = (await conversation.assistant_ids())[1]
+
+        resolution = await conversation.ask(
+            thread_id,
+            resolution_assistant_id,
+            GENERATE_RESOLUTION_INSTRUCTIONS,
+            max_wait_time=60
+        )
+        permalink = await asyncio.to_thread(publish_resolution, resolution)
+        return jsonify(interview.resolution_response(thread_id, resolution, permalink, unescape))
+
+    except Exception as e:
+        log.exception("Error generating resolution: %s", e)
+        return interview.resolution_error(thread_id, e)
+
+@async_app.route('/generate-resolution', methods=['POST'])
+async def handle_generate_resolution():
+    try:
+        data = await request.get_json()
+        thread_id = data.get('threadId')
+
+        if not thread_id:
+            return jsonify({"error": "No thread ID provided"}), 400
+
+        if data.get('background'):
+            return await asyncio.to_thread(enqueue_job, "generate_resolution", {"threadId": thread_id})
+
+        return await generate_resolution(thread_id, unescape=True)
+
+    except Exception as e:
+        return interview.failure(e, "handle_generate_resolution")
+
+@async_app.route('/submit_answer', methods=['POST'])
+@idempotent
+async def submit_answer():
+    try:
+        data = await request.get_json()
+        answer = interview.Answer.submitted(data)
+
+        refused = refused_plan_job(answer)
+        if refused is not None:
+            return refused
+
+        await add_answer(answer, idempotency_key(request.path, request.headers, data), data)
+
+        if answer.final:
+            if answer.background:
+                return await asyncio.to_thread(enqueue_job, "resolution_plan", answer.plan_job())
+
+            plan_thread_id = await conversation.summarize(answer.thread_id, expected_messages=answer.expected_messages)
+            resolution = await conversation.ask(plan_thread_id, answer.resolution_assistant_id, RESOLUTION_PLAN_INSTRUCTIONS)
+            log.info("Generated resolution: %d characters", len(resolution))
+            permalink = await asyncio.to_thread(publish_resolution, resolution)
+            return jsonify(interview.plan_response(resolution, permalink))
+
+        question = await asyncio.to_thread(bank_next_question, answer.thread_id)
+        if question is not None:
+            await conversation.add_assistant_message(answer.thread_id, json.dumps(question))
+        else:
+            question = await conversation.ask_question(answer.thread_id, answer.question_assistant_id, NEXT_QUESTION_INSTRUCTIONS)
+
+        return jsonify(interview.next_question_response(answer, question))
+
+    except (idempotency.KeyReused, idempotency.Busy) as e:
+        return duplicate_error(e)
+    except Exception as e:
+        return interview.failure(e, "submit_answer")
+
+# Everything that isn't an interview endpoint goes to the Flask app
+flask_asgi = WsgiToAsgi(sync_app.app)
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan' or scope.get('path') in ASYNC_PATHS:
+        await async_app(scope, receive, send)
+    else:
+        await flask_asgi(scope, receive, send)
@@ -0,0 +1,114 @@
+"""Process-wide registry for the OpenAI assistants used by ResolutionPal.
+
+Assistants are identified by a hash of their definition (name, model,
+instructions and tools). The first worker that needs an assistant looks it up
+(local file, then assistant metadata upstream) and only creates it when no
+match exists. IDs are persisted to a JSON file guarded by an advisory lock so
+every gunicorn worker on the machine shares them. Changing the prompt text
+changes the hash, which creates a fresh assistant on next use.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+import logs
+
+log = logs.get_logger("assistants")
+
+HASH_METADATA_KEY = "definition_hash"
+
+
+def definition_hash(name, model, instructions, tools=None):
+    """Return a stable hash for an assistant definition."""
+    payload = json.dumps(
+        {
+            "name": name,
+            "model": model,
+            "instructions": instructions,
+            "tools": tools or [],
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AssistantRegistry:
+    """Create-or-lookup cache of assistant IDs shared across worker processes."""
+
+    def __init__(self, path):
+        self.path = path
+        self._ids = {}
+        self._lock = threading.Lock()
+
+    def get_or_create(self, client, name, model, instructions, tools=None):
+        """Return the ID of the assistant matching this definition, creating it once."""
+        key = definition_hash(name, model, instructions, tools)
+        assistant_id = self._ids.get(key)
+        if assistant_id:
+            return assistant_id
+
+        with self._lock:
+            assistant_id = self._ids.get(key)
+            if assistant_id:
+                return assistant_id
+
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path + ".lock", "w") as lock_file:
+                # Serialise creation across gunicorn workers on this machine
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    entries = self._read()
+                    entry = entries.get(name)
+                    if entry and entry.get("hash") == key:
+                        assistant_id = entry["id"]
+                    else:
+                        assistant_id = self._find_remote(client, key)
+                        if not assistant_id:
+                            assistant = client.beta.assistants.create(
+                                name=name,
+                                model=model,
+                                instructions=instructions,
+                                tools=tools or [],
+                                metadata={HASH_METADATA_KEY: key},
+                            )
+                            assistant_id = assistant.id
+                            log.info("Created assistant '%s': %s", name, assistant_id)
+                        entries[name] = {
+                            "id": assistant_id,
+                            "hash": key,
+                            "model": model,
+                            "updated_at": datetime.now(timezone.utc).isoformat(),
+                        }
+                        self._write(entries)
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+            self._ids[key] = assistant_id
+            return assistant_id
+
+    def _find_remote(self, client, key):
+        """Look for an existing assistant created from the same definition."""
+        try:
+            for assistant in client.beta.assistants.list(limit=100):
+                if (assistant.metadata or {}).get(HASH_METADATA_KEY) == key:
+                    log.info("Reusing assistant '%s': %s", assistant.name, assistant.id)
+                    return assistant.id
+        except Exception as e:
+            log.warning("Assistant lookup failed, creating a new one: %s", e)
+        return None
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _write(self, entries):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entries, f, indent=2)
+        os.replace(tmp_path, self.path)
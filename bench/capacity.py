@@ -0,0 +1,129 @@
+"""Find how many concurrent interviews one worker process sustains, per worker class.
+
+For each worker class the app is started under gunicorn with the shipped
+.gunicorn.conf.py and a single worker, against the fake OpenAI. Users are
+then stepped up (--levels) and each step runs for --duration seconds. A step
+is sustained when no interview fails and the p95 of /submit_answer stays
+under --max-p95; the first step that isn't ends that worker class.
+
+    python bench/capacity.py --output capacity.json
+    python bench/capacity.py --workers sync gevent --levels 1,4,16,64,256 --run-latency 2
+
+The result lists every step (throughput, p95, errors) and the highest
+sustained user count per worker class.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fake_openai  # noqa: E402
+from load_test import LoadTest, free_port, start_app, summarize, wait_until_ready  # noqa: E402
+
+APP_CMD = "gunicorn -c .gunicorn.conf.py -w 1 -b 127.0.0.1:{port} wsgi:app"
+ENDPOINT = "/submit_answer"
+
+
+def run_step(target, users, duration, timeout):
+    test = LoadTest(target, users, interviews=0, duration=duration, timeout=timeout)
+    results = summarize(test, test.run())
+    endpoint = results["endpoints"].get(ENDPOINT, {})
+    return {
+        "users": users,
+        "interviews_completed": results["interviews"]["completed"],
+        "interviews_failed": results["interviews"]["failed"],
+        "interviews_per_minute": results["throughput"]["interviews_per_minute"],
+        "p95": endpoint.get("p95"),
+        "errors": results["errors"],
+    }
+
+
+def sustained(step, max_p95):
+    return (
+        step["interviews_failed"] == 0
+        and not step["errors"]
+        and step["p95"] is not None
+        and step["p95"] <= max_p95
+    )
+
+
+def measure(worker_class, levels, args, base_url, workdir):
+    port = free_port()
+    env = {"GUNICORN_WORKER_CLASS": worker_class, **dict(item.split("=", 1) for item in args.app_env)}
+    process = start_app(APP_CMD, port, base_url, env, workdir)
+    target = f"http://127.0.0.1:{port}"
+    steps = []
+    try:
+        wait_until_ready(target, process, timeout=60)
+        for users in levels:
+            step = run_step(target, users, args.duration, args.timeout)
+            step["sustained"] = sustained(step, args.max_p95)
+            steps.append(step)
+            print(
+                f"{worker_class:>8} {users:>5} users: {step['interviews_per_minute']} interviews/min, "
+                f"p95 {step['p95']}s, {step['interviews_failed']} failed",
+                file=sys.stderr,
+            )
+            if not step["sustained"]:
+                break
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+    passed = [step["users"] for step in steps if step["sustained"]]
+    return {"max_sustained_users": max(passed) if passed else 0, "steps": steps}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", nargs="+", default=["sync", "gthread", "gevent"],
+                        help="Gunicorn worker classes to compare")
+    parser.add_argument("--levels", default="1,2,4,8,16,32,64,128,256",
+                        help="Comma-separated concurrent user counts to step through")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds per step")
+    parser.add_argument("--max-p95", type=float, default=10.0,
+                        help=f"Highest acceptable {ENDPOINT} p95 in seconds for a sustained step")
+    parser.add_argument("--timeout", type=float, default=120, help="Seconds to wait for any one response")
+    parser.add_argument("--app-env", action="append", default=[], metavar="NAME=VALUE",
+                        help="Extra environment for the app (repeatable)")
+    parser.add_argument("--output", help="Write the JSON results here instead of stdout")
+    fake_openai.add_arguments(parser)
+    args = parser.parse_args()
+    levels = [int(level) for level in args.levels.split(",")]
+
+    fake_server, base_url = fake_openai.serve(**fake_openai.fake_settings(args))
+    workdir = tempfile.mkdtemp(prefix="resolutionpal-capacity-")
+    try:
+        results = {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "config": {
+                "levels": levels,
+                "duration": args.duration,
+                "max_p95": args.max_p95,
+                "app_cmd": APP_CMD,
+                "app_env": args.app_env,
+                "fake": fake_openai.fake_settings(args),
+            },
+            "workers": {
+                worker_class: measure(worker_class, levels, args, base_url, workdir)
+                for worker_class in args.workers
+            },
+        }
+    finally:
+        fake_server.shutdown()
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    for worker_class, result in results["workers"].items():
+        print(f"{worker_class}: {result['max_sustained_users']} concurrent interviews per worker", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
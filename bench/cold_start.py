@@ -0,0 +1,131 @@
+"""Measure how long the app takes to import and to answer its first request.
+
+Each run starts fresh processes, so nothing is cached between them:
+
+- import: `import app` in a new interpreter, timed inside it
+- first byte: from starting --app-cmd until the first byte of a response to
+  GET --path arrives (the request is sent as soon as the port accepts
+  connections and waits in the listen queue until the worker is ready)
+
+    python bench/cold_start.py --runs 10 --output cold_start.json
+
+After each first-byte run the app's own /stats "startup" section (time per
+startup phase and deferred construction) is saved alongside, when present.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from load_test import ROOT, Client, free_port, start_app  # noqa: E402
+
+IMPORT_SCRIPT = "import time; started = time.perf_counter(); import app; print(time.perf_counter() - started)"
+# No OpenAI request is made; anything that tries fails fast
+UNUSED_BASE_URL = "http://127.0.0.1:9/v1"
+
+
+def app_env(workdir):
+    return {
+        **os.environ,
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": UNUSED_BASE_URL,
+        "ASSISTANT_REGISTRY_PATH": os.path.join(workdir, "assistants.json"),
+        "LOG_LEVEL": "WARNING",
+    }
+
+
+def import_time(workdir):
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SCRIPT], cwd=ROOT, env=app_env(workdir),
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def first_byte(port, path, timeout):
+    request = f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n".encode()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=timeout) as s:
+                s.sendall(request)
+                if s.recv(1):
+                    return
+        except OSError:
+            time.sleep(0.005)
+    raise SystemExit(f"No response on port {port} after {timeout}s")
+
+
+def boot_to_first_byte(command, path, workdir, timeout):
+    port = free_port()
+    started = time.perf_counter()
+    process = start_app(command, port, UNUSED_BASE_URL, {"LOG_LEVEL": "WARNING"}, workdir)
+    try:
+        first_byte(port, path, timeout)
+        elapsed = time.perf_counter() - started
+        client = Client(f"http://127.0.0.1:{port}", timeout=10)
+        status, stats = client.request("GET", "/stats")
+        client.close()
+        return elapsed, stats.get("startup") if status == 200 and isinstance(stats, dict) else None
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def summary(values):
+    values = sorted(values)
+    return {
+        "runs": len(values),
+        "median": round(statistics.median(values), 4),
+        "min": round(values[0], 4),
+        "max": round(values[-1], 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--app-cmd", default="gunicorn -c .gunicorn.conf.py -w 1 -b 127.0.0.1:{port} wsgi:app",
+                        help="Command that serves the app on {port}")
+    parser.add_argument("--path", default="/", help="Path of the first request")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--output", help="Write the JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="resolutionpal-cold-start-")
+    imports = [import_time(workdir) for _ in range(args.runs)]
+    boots, startups = [], []
+    for _ in range(args.runs):
+        elapsed, startup = boot_to_first_byte(args.app_cmd, args.path, workdir, args.timeout)
+        boots.append(elapsed)
+        startups.append(startup)
+
+    results = {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": {"runs": args.runs, "app_cmd": args.app_cmd, "path": args.path},
+        "import_seconds": summary(imports),
+        "boot_to_first_byte_seconds": summary(boots),
+        "startup": startups,
+    }
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    print(
+        f"import app: median {results['import_seconds']['median']}s, "
+        f"boot to first byte of GET {args.path}: median {results['boot_to_first_byte_seconds']['median']}s",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
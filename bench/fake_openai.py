@@ -0,0 +1,379 @@
+"""A local stand-in for the OpenAI endpoints ResolutionPal uses.
+
+Implements just enough of assistants, threads, messages, runs (polled and
+streamed) and chat completions for the app to run whole interviews without
+spending tokens. Runs take a configurable time to complete, and any request
+can be made to fail with a 500 or a 429 to exercise retries.
+
+    python bench/fake_openai.py --port 8765 --run-latency 1.5
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=fake gunicorn wsgi:app
+
+Question assistants reply with a CHOICE question; anything else replies with
+a short HTML plan. State is in memory and lost on exit.
+"""
+import argparse
+import itertools
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+RESOLUTION_HTML = (
+    "<div class='resolution-card'><h1>Your Resolution Plan</h1>"
+    "<p>Walk for 20 minutes after lunch on weekdays, and log each walk.</p></div>"
+)
+
+
+class FakeOpenAI:
+    """In-memory state plus the latency and failure settings"""
+
+    def __init__(self, run_latency=1.0, run_jitter=0.25, api_latency=0.02,
+                 error_rate=0.0, rate_limit_rate=0.0):
+        self.run_latency = run_latency
+        self.run_jitter = run_jitter
+        self.api_latency = api_latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.assistants = {}
+        self.threads = {}
+        self.runs = {}
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def new_id(self, prefix):
+        return f"{prefix}_{next(self._ids):08d}"
+
+    def run_duration(self):
+        return max(0.0, random.gauss(self.run_latency, self.run_latency * self.run_jitter))
+
+    def reply_for(self, assistant_id, question_number):
+        assistant = self.assistants.get(assistant_id, {})
+        if "question" in (assistant.get("name") or "").lower():
+            return json.dumps({
+                "type": "CHOICE",
+                "text": f"Benchmark question {question_number}?",
+                "options": ["Often", "Sometimes", "Rarely"],
+            })
+        return RESOLUTION_HTML
+
+    def message(self, thread_id, role, content, run_id=None, assistant_id=None, visible_at=0.0):
+        return {
+            "id": self.new_id("msg"),
+            "object": "thread.message",
+            "created_at": int(time.time()),
+            "thread_id": thread_id,
+            "role": role,
+            "content": [{"type": "text", "text": {"value": content, "annotations": []}}],
+            "run_id": run_id,
+            "assistant_id": assistant_id,
+            "attachments": [],
+            "metadata": {},
+            "status": "completed",
+            "_visible_at": visible_at,
+        }
+
+    def start_run(self, thread_id, body):
+        """Create a run whose reply appears once its latency has passed"""
+        duration = self.run_duration()
+        run_id = self.new_id("run")
+        with self._lock:
+            messages = self.threads[thread_id]["messages"]
+            question_number = sum(1 for m in messages if m["role"] == "assistant") + 1
+            content = self.reply_for(body.get("assistant_id"), question_number)
+            done_at = time.time() + duration
+            messages.append(self.message(
+                thread_id, "assistant", content, run_id, body.get("assistant_id"), visible_at=done_at
+            ))
+            run = {
+                "id": run_id,
+                "object": "thread.run",
+                "created_at": int(time.time()),
+                "thread_id": thread_id,
+                "assistant_id": body.get("assistant_id"),
+                "instructions": body.get("instructions"),
+                "model": "fake",
+                "tools": [],
+                "metadata": {},
+                "status": "queued",
+                "_done_at": done_at,
+            }
+            self.runs[run_id] = run
+        return run, content
+
+    def run_view(self, run):
+        status = "completed" if time.time() >= run["_done_at"] else "in_progress"
+        return {**public(run), "status": status}
+
+
+def public(obj):
+    return {k: v for k, v in obj.items() if not k.startswith("_")}
+
+
+def page(items):
+    return {
+        "object": "list",
+        "data": items,
+        "first_id": items[0]["id"] if items else None,
+        "last_id": items[-1]["id"] if items else None,
+        "has_more": False,
+    }
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    fake = None
+
+    def log_message(self, *args):
+        pass
+
+    # --- plumbing ---
+
+    def send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_events(self, events):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for event, data in events:
+            if event == "sleep":
+                time.sleep(data)
+                continue
+            payload = data if isinstance(data, str) else json.dumps(data)
+            chunk = f"event: {event}\ndata: {payload}\n\n".encode()
+            self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}") if length else {}
+
+    def handle_request(self, method):
+        fake = self.fake
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        body = self.read_body() if method == "POST" else {}
+        with fake._lock:
+            fake.requests += 1
+            fake.in_flight += 1
+            fake.peak_in_flight = max(fake.peak_in_flight, fake.in_flight)
+        try:
+            if url.path == "/_stats":
+                return self.send_json(200, {
+                    "requests": fake.requests,
+                    "peak_in_flight": fake.peak_in_flight,
+                    "threads": len(fake.threads),
+                    "runs": len(fake.runs),
+                })
+            roll = random.random()
+            if roll < fake.rate_limit_rate:
+                return self.send_json(
+                    429, {"error": {"message": "Rate limit reached (injected)", "type": "requests"}},
+                    {"retry-after-ms": "200"},
+                )
+            if roll < fake.rate_limit_rate + fake.error_rate:
+                return self.send_json(500, {"error": {"message": "Server error (injected)", "type": "server_error"}})
+            time.sleep(fake.api_latency)
+            self.route(method, url.path, query, body)
+        finally:
+            with fake._lock:
+                fake.in_flight -= 1
+
+    def do_GET(self):
+        self.handle_request("GET")
+
+    def do_POST(self):
+        self.handle_request("POST")
+
+    # --- endpoints ---
+
+    def route(self, method, path, query, body):
+        fake = self.fake
+        parts = [p for p in path.split("/") if p and p != "v1"]
+
+        if parts == ["assistants"]:
+            if method == "POST":
+                assistant = {
+                    "id": fake.new_id("asst"),
+                    "object": "assistant",
+                    "created_at": int(time.time()),
+                    "name": body.get("name"),
+                    "model": body.get("model"),
+                    "instructions": body.get("instructions"),
+                    "tools": body.get("tools") or [],
+                    "metadata": body.get("metadata") or {},
+                }
+                fake.assistants[assistant["id"]] = assistant
+                return self.send_json(200, assistant)
+            return self.send_json(200, page(list(fake.assistants.values())))
+
+        if parts == ["threads"] and method == "POST":
+            thread_id = fake.new_id("thread")
+            fake.threads[thread_id] = {"messages": [
+                fake.message(thread_id, m["role"], m["content"]) for m in body.get("messages") or []
+            ]}
+            return self.send_json(200, {
+                "id": thread_id, "object": "thread", "created_at": int(time.time()), "metadata": {},
+            })
+
+        if len(parts) >= 2 and parts[0] == "threads":
+            thread_id = parts[1]
+            if thread_id not in fake.threads:
+                return self.send_json(404, {"error": {"message": f"No thread found with id '{thread_id}'."}})
+
+            if parts[2:] == ["messages"] and method == "POST":
+                message = fake.message(thread_id, body.get("role", "user"), body.get("content", ""))
+                with fake._lock:
+                    fake.threads[thread_id]["messages"].append(message)
+                return self.send_json(200, public(message))
+
+            if parts[2:] == ["messages"]:
+                now = time.time()
+                messages = [m for m in fake.threads[thread_id]["messages"] if m["_visible_at"] <= now]
+                if query.get("run_id"):
+                    messages = [m for m in messages if m["run_id"] == query["run_id"]]
+                if query.get("order", "desc") == "desc":
+                    messages = messages[::-1]
+                limit = int(query.get("limit", 20))
+                return self.send_json(200, page([public(m) for m in messages[:limit]]))
+
+            if parts[2:] == ["runs"] and method == "POST":
+                run, content = fake.start_run(thread_id, body)
+                if not body.get("stream"):
+                    return self.send_json(200, public(run))
+                return self.send_events(self.run_events(run, content))
+
+            if len(parts) == 4 and parts[2] == "runs":
+                run = fake.runs.get(parts[3])
+                if run is None:
+                    return self.send_json(404, {"error": {"message": "No run found"}})
+                return self.send_json(200, fake.run_view(run))
+
+        if parts == ["chat", "completions"] and method == "POST":
+            return self.chat_completion(body)
+
+        self.send_json(404, {"error": {"message": f"Unknown endpoint {method} {path}"}})
+
+    def run_events(self, run, content):
+        fake = self.fake
+        message_id = fake.new_id("msg")
+        yield "thread.run.created", public(run)
+        yield "thread.run.in_progress", {**public(run), "status": "in_progress"}
+        yield "sleep", max(0.0, run["_done_at"] - time.time())
+        yield "thread.message.created", {"id": message_id, "object": "thread.message", "run_id": run["id"]}
+        for piece in re.findall(r".{1,40}", content, re.S):
+            yield "thread.message.delta", {
+                "id": message_id,
+                "object": "thread.message.delta",
+                "delta": {"content": [{"index": 0, "type": "text", "text": {"value": piece}}]},
+            }
+        yield "thread.run.completed", {**public(run), "status": "completed"}
+        yield "done", "[DONE]"
+
+    def chat_completion(self, body):
+        fake = self.fake
+        messages = body.get("messages") or []
+        system = (messages[0]["content"] if messages and messages[0]["role"] == "system" else "").lower()
+        question_number = sum(1 for m in messages if m["role"] == "assistant") + 1
+        if not system.startswith("you are an expert resolution coach"):
+            content = json.dumps({
+                "type": "CHOICE",
+                "text": f"Benchmark question {question_number}?",
+                "options": ["Often", "Sometimes", "Rarely"],
+            })
+        else:
+            content = RESOLUTION_HTML
+        completion_id = fake.new_id("chatcmpl")
+        duration = fake.run_duration()
+        if body.get("stream"):
+            def events():
+                yield "sleep", duration
+                for piece in re.findall(r".{1,40}", content, re.S):
+                    yield "message", {
+                        "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                        "model": "fake", "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+                    }
+                yield "message", "[DONE]"
+            return self.send_events(events())
+        time.sleep(duration)
+        self.send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "fake",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0,
+                "prompt_tokens_details": {"cached_tokens": 0},
+            },
+        })
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 drops connections when a worker opens many at once
+    request_queue_size = 1024
+
+    def handle_error(self, request, client_address):
+        # Clients dropping idle keep-alive connections is routine, not an error
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def serve(port=0, **settings):
+    """Start the fake in a background thread; returns (server, base_url)"""
+    handler = type("FakeHandler", (Handler,), {"fake": FakeOpenAI(**settings)})
+    server = Server(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/v1"
+
+
+def add_arguments(parser):
+    parser.add_argument("--run-latency", type=float, default=1.0, help="Mean seconds for a run to complete")
+    parser.add_argument("--run-jitter", type=float, default=0.25, help="Run latency standard deviation, as a fraction of the mean")
+    parser.add_argument("--api-latency", type=float, default=0.02, help="Seconds added to every other request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with a 429")
+
+
+def fake_settings(args):
+    return {
+        "run_latency": args.run_latency,
+        "run_jitter": args.run_jitter,
+        "api_latency": args.api_latency,
+        "error_rate": args.error_rate,
+        "rate_limit_rate": args.rate_limit_rate,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+    server, base_url = serve(args.port, **fake_settings(args))
+    print(f"Fake OpenAI listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
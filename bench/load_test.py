@@ -0,0 +1,418 @@
+"""Drive complete interviews against the app and report latency and throughput.
+
+Each synthetic user runs /start_session followed by /submit_answer for ten
+answers, the last of which generates the resolution, then starts over until
+the requested number of interviews is done. By default the script starts a
+fake OpenAI (bench/fake_openai.py) and the app under --app-cmd pointed at
+it, so nothing is spent on real tokens:
+
+    python bench/load_test.py --users 20 --interviews 100 --output results.json
+    python bench/load_test.py --app-cmd "uvicorn asgi:application --port {port}" --output asgi.json
+    python bench/load_test.py --target http://127.0.0.1:5000   # an app already running
+
+While the test runs /metrics is scraped for resolutionpal_requests_in_flight
+to show how busy the workers were. Results are written as JSON; pass an
+earlier result as --baseline to exit non-zero when throughput or any
+endpoint's p95 got worse by more than --tolerance.
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import re
+import shlex
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fake_openai  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+QUESTIONS = 10
+RESOLUTION_TYPES = ["Health", "Career", "Finance", "Relationships", "Learning"]
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not values:
+        return None
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class Client:
+    """One keep-alive connection to the app"""
+
+    def __init__(self, target, timeout):
+        url = urlparse(target)
+        self.host, self.port = url.hostname, url.port or 80
+        self.timeout = timeout
+        self.connection = None
+
+    def request(self, method, path, body=None):
+        """Returns (status, parsed JSON or text)"""
+        data = json.dumps(body).encode() if body is not None else None
+        headers = {"Content-Type": "application/json"} if data is not None else {}
+        for attempt in range(2):
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self.connection.request(method, path, body=data, headers=headers)
+                response = self.connection.getresponse()
+                raw = response.read()
+                break
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                # The server closed an idle keep-alive connection; reconnect once
+                self.connection.close()
+                self.connection = None
+                if attempt:
+                    raise
+        if response.getheader("Content-Type", "").startswith("application/json"):
+            return response.status, json.loads(raw)
+        return response.status, raw.decode(errors="replace")
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+
+
+class LoadTest:
+    def __init__(self, target, users, interviews, duration=None, ramp=0.0, timeout=120):
+        self.target = target
+        self.users = users
+        self.interviews = interviews
+        self.duration = duration
+        self.ramp = ramp
+        self.timeout = timeout
+        self.samples = defaultdict(list)
+        self.errors = Counter()
+        self.completed = 0
+        self.failed = 0
+        self._started_interviews = 0
+        self._lock = threading.Lock()
+        self._deadline = None
+
+    def _next_interview(self):
+        with self._lock:
+            if self._deadline is not None and time.monotonic() >= self._deadline:
+                return None
+            if self._deadline is None and self._started_interviews >= self.interviews:
+                return None
+            self._started_interviews += 1
+            return self._started_interviews
+
+    def _timed(self, client, path, body):
+        started = time.perf_counter()
+        try:
+            status, reply = client.request("POST", path, body)
+        except (OSError, http.client.HTTPException) as e:
+            client.close()
+            client.connection = None
+            status, reply = None, None
+            error = e.__class__.__name__
+        else:
+            error = None if status == 200 else str(status)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.samples[path].append((elapsed, error is None))
+            if error:
+                self.errors[f"{path} {error}"] += 1
+        return reply if error is None else None
+
+    def interview(self, client, number):
+        session = self._timed(client, "/start_session", {
+            "name": f"User {number}",
+            "location": "Benchmark City",
+            "resolutionType": RESOLUTION_TYPES[number % len(RESOLUTION_TYPES)],
+            "specificResolution": f"Benchmark goal {number}",
+        })
+        if session is None:
+            return False
+        question = session["question"]
+        for question_number in range(1, QUESTIONS + 1):
+            options = question.get("options") or []
+            reply = self._timed(client, "/submit_answer", {
+                "threadId": session["threadId"],
+                "answer": options[0] if options else "A typical benchmark answer",
+                "questionAssistantId": session["question_assistant_id"],
+                "resolutionAssistantId": session["resolution_assistant_id"],
+                "questionNumber": question_number,
+            })
+            if reply is None:
+                return False
+            if reply.get("done"):
+                return True
+            question = reply["question"]
+        return False
+
+    def user(self, index):
+        if self.ramp:
+            time.sleep(self.ramp * index / self.users)
+        client = Client(self.target, self.timeout)
+        try:
+            while True:
+                number = self._next_interview()
+                if number is None:
+                    return
+                ok = self.interview(client, number)
+                with self._lock:
+                    if ok:
+                        self.completed += 1
+                    else:
+                        self.failed += 1
+        finally:
+            client.close()
+
+    def run(self):
+        if self.duration:
+            self._deadline = time.monotonic() + self.duration
+        started = time.perf_counter()
+        threads = [threading.Thread(target=self.user, args=(i,), daemon=True) for i in range(self.users)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - started
+
+
+class SaturationSampler(threading.Thread):
+    """Scrapes the in-flight gauge from /metrics while the test runs"""
+
+    GAUGE = re.compile(r"^(resolutionpal_requests_in_flight|resolutionpal_process_pid) (\S+)$", re.M)
+
+    def __init__(self, target, interval):
+        super().__init__(daemon=True)
+        self.client = Client(target, timeout=10)
+        self.interval = interval
+        self.by_pid = defaultdict(list)
+        self.failures = 0
+        self._finished = threading.Event()
+
+    def run(self):
+        while not self._finished.wait(self.interval):
+            try:
+                status, text = self.client.request("GET", "/metrics")
+            except (OSError, http.client.HTTPException):
+                self.client.close()
+                self.client.connection = None
+                status, text = None, ""
+            values = dict(self.GAUGE.findall(text)) if status == 200 else {}
+            if "resolutionpal_requests_in_flight" not in values:
+                self.failures += 1
+                continue
+            # The scrape itself is one of the requests in flight
+            in_flight = float(values["resolutionpal_requests_in_flight"]) - 1
+            self.by_pid[values.get("resolutionpal_process_pid", "?")].append(in_flight)
+
+    def stop(self):
+        self._finished.set()
+        self.join()
+        self.client.close()
+
+    def report(self):
+        samples = [v for values in self.by_pid.values() for v in values]
+        return {
+            "samples": len(samples),
+            "failed_scrapes": self.failures,
+            "mean_in_flight": round(sum(samples) / len(samples), 2) if samples else None,
+            "max_in_flight": max(samples) if samples else None,
+            "workers": {
+                pid: {
+                    "samples": len(values),
+                    "mean_in_flight": round(sum(values) / len(values), 2),
+                    "max_in_flight": max(values),
+                }
+                for pid, values in sorted(self.by_pid.items())
+            },
+        }
+
+
+def summarize(test, elapsed):
+    endpoints = {}
+    total = 0
+    for path, samples in sorted(test.samples.items()):
+        latencies = sorted(seconds for seconds, _ in samples)
+        total += len(samples)
+        endpoints[path] = {
+            "requests": len(samples),
+            "errors": sum(1 for _, ok in samples if not ok),
+            "mean": round(sum(latencies) / len(latencies), 4),
+            "p50": round(percentile(latencies, 50), 4),
+            "p95": round(percentile(latencies, 95), 4),
+            "p99": round(percentile(latencies, 99), 4),
+            "max": round(latencies[-1], 4),
+        }
+    return {
+        "duration_seconds": round(elapsed, 2),
+        "interviews": {"completed": test.completed, "failed": test.failed},
+        "throughput": {
+            "requests_per_second": round(total / elapsed, 2) if elapsed else None,
+            "interviews_per_minute": round(test.completed * 60 / elapsed, 2) if elapsed else None,
+        },
+        "endpoints": endpoints,
+        "errors": dict(test.errors),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of this run against a baseline result, as readable strings"""
+    regressions = []
+    old_rate = baseline["throughput"]["interviews_per_minute"]
+    new_rate = results["throughput"]["interviews_per_minute"]
+    if old_rate and new_rate is not None and new_rate < old_rate * (1 - tolerance):
+        regressions.append(f"throughput {new_rate} interviews/min, baseline {old_rate}")
+    for path, stats in results["endpoints"].items():
+        old = baseline["endpoints"].get(path)
+        if old and stats["p95"] > old["p95"] * (1 + tolerance):
+            regressions.append(f"{path} p95 {stats['p95']}s, baseline {old['p95']}s")
+        if old is not None:
+            old_error_rate = old["errors"] / old["requests"]
+            if stats["errors"] / stats["requests"] > old_error_rate + tolerance / 10:
+                regressions.append(f"{path} errors {stats['errors']}/{stats['requests']}, baseline {old['errors']}/{old['requests']}")
+    return regressions
+
+
+def wait_until_ready(target, process, timeout):
+    client = Client(target, timeout=5)
+    deadline = time.monotonic() + timeout
+    try:
+        while time.monotonic() < deadline:
+            if process is not None and process.poll() is not None:
+                raise SystemExit(f"The app exited with status {process.returncode} before it was ready")
+            try:
+                if client.request("GET", "/metrics")[0] == 200:
+                    return
+            except (OSError, http.client.HTTPException):
+                client.close()
+                client.connection = None
+            time.sleep(0.25)
+    finally:
+        client.close()
+    raise SystemExit(f"{target} was not ready after {timeout}s")
+
+
+def start_app(command, port, base_url, extra_env, workdir):
+    env = {
+        **os.environ,
+        "OPENAI_BASE_URL": base_url,
+        "OPENAI_API_KEY": "bench",
+        # Keep fake assistant IDs out of the real registry
+        "ASSISTANT_REGISTRY_PATH": os.path.join(workdir, "assistants.json"),
+        "LOG_LEVEL": "WARNING",
+        **extra_env,
+    }
+    return subprocess.Popen(shlex.split(command.format(port=port)), cwd=ROOT, env=env)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10, help="Concurrent synthetic users")
+    parser.add_argument("--interviews", type=int, default=50, help="Interviews to complete in total")
+    parser.add_argument("--duration", type=float, help="Run for this many seconds instead of a fixed number of interviews")
+    parser.add_argument("--ramp", type=float, default=0.0, help="Seconds over which to start the users")
+    parser.add_argument("--timeout", type=float, default=120, help="Seconds to wait for any one response")
+    parser.add_argument("--target", help="URL of an app that is already running (its OpenAI endpoint is up to you)")
+    parser.add_argument("--app-cmd", default="gunicorn -w 2 --threads 8 -b 127.0.0.1:{port} wsgi:app",
+                        help="Command that serves the app on {port}")
+    parser.add_argument("--app-env", action="append", default=[], metavar="NAME=VALUE",
+                        help="Extra environment for the app (repeatable), e.g. RUN_STREAMING=false")
+    parser.add_argument("--fake-url", help="Use a fake (or real) OpenAI already listening here instead of starting one")
+    parser.add_argument("--sample-interval", type=float, default=0.5, help="Seconds between /metrics scrapes")
+    parser.add_argument("--output", help="Write the JSON results here instead of stdout")
+    parser.add_argument("--label", help="Name for this run, e.g. the serving mode")
+    parser.add_argument("--baseline", help="Earlier results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed fractional slowdown before a regression")
+    fake_openai.add_arguments(parser)
+    args = parser.parse_args()
+
+    fake_server = process = None
+    workdir = tempfile.mkdtemp(prefix="resolutionpal-bench-")
+    try:
+        base_url = args.fake_url
+        if args.target is None and base_url is None:
+            fake_server, base_url = fake_openai.serve(**fake_openai.fake_settings(args))
+        target = args.target
+        if target is None:
+            port = free_port()
+            extra_env = dict(item.split("=", 1) for item in args.app_env)
+            process = start_app(args.app_cmd, port, base_url, extra_env, workdir)
+            target = f"http://127.0.0.1:{port}"
+        wait_until_ready(target, process, timeout=60)
+
+        test = LoadTest(target, args.users, args.interviews, args.duration, args.ramp, args.timeout)
+        sampler = SaturationSampler(target, args.sample_interval)
+        sampler.start()
+        elapsed = test.run()
+        sampler.stop()
+
+        results = {
+            "label": args.label,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(time.time() - elapsed)),
+            "config": {
+                "users": args.users,
+                "interviews": args.interviews,
+                "duration": args.duration,
+                "target": args.target,
+                "app_cmd": None if args.target else args.app_cmd,
+                "app_env": args.app_env,
+                "fake": None if fake_server is None else fake_openai.fake_settings(args),
+            },
+            **summarize(test, elapsed),
+            "saturation": sampler.report(),
+        }
+        if fake_server is not None:
+            fake = fake_server.RequestHandlerClass.fake
+            results["upstream"] = {"requests": fake.requests, "peak_in_flight": fake.peak_in_flight}
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if fake_server is not None:
+            fake_server.shutdown()
+
+    exit_status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        results["regressions"] = regressions
+        exit_status = 1 if regressions else 0
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    print(
+        f"{results['interviews']['completed']} interviews in {results['duration_seconds']}s "
+        f"({results['throughput']['interviews_per_minute']}/min), "
+        f"{results['interviews']['failed']} failed",
+        file=sys.stderr,
+    )
+    for path, stats in results["endpoints"].items():
+        print(f"  {path}: p50 {stats['p50']}s  p95 {stats['p95']}s  p99 {stats['p99']}s  errors {stats['errors']}",
+              file=sys.stderr)
+    for regression in results.get("regressions", []):
+        print(f"REGRESSION: {regression}", file=sys.stderr)
+    sys.exit(exit_status)
+
+
+if __name__ == "__main__":
+    main()
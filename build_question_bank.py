@@ -0,0 +1,139 @@
+"""Build the offline question bank served when INTERVIEW_MODE=bank.
+
+    python build_question_bank.py
+    python build_question_bank.py --category "Learn Programming - Develop coding skills"
+
+For each resolution focus this asks the question model for a tree of
+interview questions. CHOICE and YES/NO questions branch on each option for
+the first --branch-depth questions; after that a single follow-up that
+works for any answer is generated. TEXT questions end the tree unless
+--text-follow-ups is given, so free-text answers go to the model at
+interview time. Every question is validated against the Question model
+before it is written.
+"""
+import argparse
+import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app import (
+    ASSISTANT_MODEL,
+    FIRST_QUESTION_INSTRUCTIONS,
+    NEXT_QUESTION_INSTRUCTIONS,
+    QUESTION_ASSISTANT_INSTRUCTIONS,
+    QUESTION_BANK_PATH,
+    client,
+    initial_user_message,
+)
+from questions import QUESTION_RESPONSE_FORMAT, parse_question
+from question_bank import QuestionBank, normalize_answer, normalize_category
+
+SHARED_QUESTION_RULES = (
+    "This question will be reused for many different people. "
+    "Do not mention anyone's name or location. "
+    "Prefer CHOICE or YES/NO questions with short options. "
+    "Respond with the JSON object only."
+)
+
+# Stands in for an answer when one follow-up has to suit every answer
+ANY_ANSWER = "(Answers to this question vary; your next question must make sense for any answer.)"
+
+
+def load_categories(path="static/main.js"):
+    """Read the resolution focus options offered by the frontend"""
+    with open(path) as f:
+        source = f.read()
+    block = source[source.index("id: 'resolutionType'"):]
+    block = block[block.index("options: {"):block.index("step: 4")]
+    return re.findall(r'^\s*"([^"]+)",?\s*$', block, re.M)
+
+
+def ask(transcript, instructions, model, attempts=3):
+    """Ask the model for one question and return it validated"""
+    messages = [
+        {"role": "system", "content": QUESTION_ASSISTANT_INSTRUCTIONS},
+        *transcript,
+        {"role": "system", "content": f"{instructions}\n\n{SHARED_QUESTION_RULES}"},
+    ]
+    for attempt in range(attempts):
+        completion = client.chat.completions.create(
+            model=model,
+            messages=messages,
+            response_format=QUESTION_RESPONSE_FORMAT,
+        )
+        question = parse_question(completion.choices[0].message.content or "")
+        if question is not None:
+            return question
+        print(f"Invalid question on attempt {attempt + 1}")
+    raise ValueError("Model did not return a valid question")
+
+
+def build_category(category, args):
+    """Generate the question tree for one resolution focus"""
+    nodes = []
+
+    def add(question):
+        nodes.append({"q": question, "next": {}})
+        return len(nodes) - 1
+
+    transcript = [
+        {"role": "user", "content": initial_user_message("someone", "their hometown", category, category)}
+    ]
+    root = add(ask(transcript, FIRST_QUESTION_INSTRUCTIONS, args.model))
+    pending = [(root, transcript, 1)]
+
+    while pending:
+        index, transcript, depth = pending.pop()
+        if depth >= args.questions:
+            continue
+
+        question = nodes[index]["q"]
+        transcript = transcript + [{"role": "assistant", "content": json.dumps(question)}]
+        if question["type"] == "CHOICE":
+            answers = question["options"]
+        elif question["type"] == "YES/NO":
+            answers = ["Yes", "No"]
+        else:
+            answers = []
+
+        if answers and depth <= args.branch_depth and len(nodes) + len(answers) <= args.max_nodes:
+            for answer in answers:
+                answered = transcript + [{"role": "user", "content": answer}]
+                child = add(ask(answered, NEXT_QUESTION_INSTRUCTIONS, args.model))
+                nodes[index]["next"][normalize_answer(answer)] = child
+                pending.append((child, answered, depth + 1))
+        elif answers or args.text_follow_ups:
+            answered = transcript + [{"role": "user", "content": ANY_ANSWER}]
+            child = add(ask(answered, NEXT_QUESTION_INSTRUCTIONS, args.model))
+            nodes[index]["next"]["*"] = child
+            pending.append((child, answered, depth + 1))
+
+    print(f"Built {len(nodes)} questions for {category}")
+    return normalize_category(category), nodes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--category", action="append", help="Resolution focus to build (default: all in static/main.js)")
+    parser.add_argument("--output", default=QUESTION_BANK_PATH)
+    parser.add_argument("--model", default=ASSISTANT_MODEL)
+    parser.add_argument("--questions", type=int, default=10, help="Questions per interview")
+    parser.add_argument("--branch-depth", type=int, default=3, help="Branch on every option for the first N questions")
+    parser.add_argument("--max-nodes", type=int, default=80, help="Stop branching once a resolution focus has this many questions")
+    parser.add_argument("--text-follow-ups", action="store_true", help="Continue past TEXT questions instead of handing over to the model")
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    categories = args.category or load_categories()
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        built = dict(pool.map(lambda category: build_category(category, args), categories))
+
+    bank = QuestionBank(built)
+    bank.save(args.output, model=args.model, built_at=int(time.time()))
+    print(f"Wrote {bank.stats()} to {args.output} in {time.time() - started:.0f}s")
+
+
+if __name__ == "__main__":
+    main()
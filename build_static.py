@@ -0,0 +1,105 @@
+"""Build the fingerprinted static assets served by static_assets.py.
+
+    python build_static.py
+
+Every file under static/ (including the Tailwind output in static/dist/, so
+run `npm run build:css` first) is copied to static/build/ under a name that
+contains a hash of its content, e.g. dist/styles.3f2a1b9c0d4e.css, with gzip
+and, when the brotli package is installed, brotli variants of the files
+that compress. static/build/manifest.json maps each original path to its
+fingerprinted one; templates link assets through it, so a changed file gets
+a new URL and every URL can be cached forever.
+
+Files from earlier builds are kept (only the manifest is replaced), because
+pages rendered and cached before this build still link them. --clean
+removes them first.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+import time
+
+from static_assets import BUILD_DIR, MANIFEST_NAME, STATIC_DIR
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Already compressed formats gain nothing from another pass
+PRECOMPRESSED_TYPES = {"image/png", "image/jpeg", "image/gif", "image/webp", "font/woff", "font/woff2"}
+MIN_COMPRESS_SIZE = 256
+
+
+def fingerprinted(path, digest):
+    root, ext = os.path.splitext(path)
+    return f"{root}.{digest}{ext}"
+
+
+def source_files(static_dir, build_dir):
+    for dirpath, dirnames, filenames in os.walk(static_dir):
+        dirnames[:] = sorted(d for d in dirnames if os.path.join(dirpath, d) != build_dir)
+        for filename in sorted(filenames):
+            if not filename.startswith("."):
+                path = os.path.join(dirpath, filename)
+                yield os.path.relpath(path, static_dir).replace(os.sep, "/"), path
+
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def build(static_dir, build_dir):
+    """Write the fingerprinted files and variants and return the manifest"""
+    files = {}
+    for name, path in source_files(static_dir, build_dir):
+        with open(path, "rb") as f:
+            data = f.read()
+        target = fingerprinted(name, hashlib.sha256(data).hexdigest()[:12])
+        target_path = os.path.join(build_dir, target)
+        write(target_path, data)
+
+        encodings = []
+        content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        if content_type not in PRECOMPRESSED_TYPES and len(data) >= MIN_COMPRESS_SIZE:
+            if brotli is not None:
+                compressed = brotli.compress(data, quality=11)
+                if len(compressed) < len(data):
+                    write(target_path + ".br", compressed)
+                    encodings.append("br")
+            compressed = gzip.compress(data, compresslevel=9, mtime=0)
+            if len(compressed) < len(data):
+                write(target_path + ".gz", compressed)
+                encodings.append("gzip")
+
+        files[name] = {"path": target, "encodings": encodings}
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--static-dir", default=STATIC_DIR)
+    parser.add_argument("--clean", action="store_true",
+                        help="Remove files from earlier builds, which cached pages may still link")
+    args = parser.parse_args()
+
+    build_dir = os.path.join(args.static_dir, BUILD_DIR)
+    if args.clean:
+        shutil.rmtree(build_dir, ignore_errors=True)
+
+    started = time.time()
+    files = build(args.static_dir, build_dir)
+    with open(os.path.join(build_dir, MANIFEST_NAME), "w") as f:
+        json.dump({"files": files, "built_at": int(time.time())}, f, indent=2, sort_keys=True)
+    compressed = sum(1 for entry in files.values() if entry["encodings"])
+    print(f"Fingerprinted {len(files)} files ({compressed} precompressed) into {build_dir} in {time.time() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""Record OpenAI traffic to a cassette file and replay it without the network.
+
+With OPENAI_CASSETTE set, the OpenAI clients' transport either:
+
+- record: sends requests as usual and appends each response, with its
+  timing, to the cassette (gzipped JSON lines);
+- replay: answers every request from the cassette and never opens a
+  connection. Delays are the recorded ones scaled by OPENAI_CASSETTE_SPEED
+  (0 replays instantly), streamed runs included, chunk by chunk.
+
+Requests are matched on method, path, query and JSON body with keys
+sorted. Repeated identical requests (such as run status polls) get the
+recorded responses in order, then the last one again. A request that was
+never recorded falls back to the recorded responses for the same endpoint
+(e.g. POST threads/messages) in turn, so a build whose prompts have changed
+can still be replayed; it is answered with a 404 only when the endpoint
+never appears in the cassette.
+
+Recording sits beneath the rate governor, so retried requests are recorded
+and replayed as they happened. Cassettes contain prompts and user answers
+but never request headers, so no API key. Record with a single worker
+process: every worker appends to the same file.
+"""
+import asyncio
+import codecs
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import parse_qsl
+
+try:
+    import httpx
+except ImportError:  # newer openai releases depend on httpx2 instead
+    import httpx2 as httpx
+
+import logs
+from rate_governor import endpoint_name, local_error
+
+log = logs.get_logger("cassette")
+
+# Response headers worth keeping; the rest describe the original connection
+KEPT_HEADERS = ("content-type", "retry-after", "retry-after-ms", "openai-processing-ms")
+
+
+def request_key(request, body):
+    """Identify a request by what it asks for, ignoring headers and key order"""
+    try:
+        body = json.dumps(json.loads(body), sort_keys=True, separators=(",", ":"))
+    except ValueError:
+        body = body.decode(errors="replace")
+    query = sorted(parse_qsl(request.url.query.decode()))
+    text = f"{request.method} {request.url.path}?{query} {body}"
+    return hashlib.sha256(text.encode()).hexdigest()[:24]
+
+
+def endpoint_key(request):
+    return f"{request.method} {endpoint_name(request)}"
+
+
+class Cassette:
+    """Recorded responses, indexed by request and by endpoint"""
+
+    def __init__(self, path):
+        self.path = path
+        self.by_request = defaultdict(list)
+        self.by_endpoint = defaultdict(list)
+        self._positions = defaultdict(int)
+        self._lock = threading.Lock()
+        self._fd = None
+
+    def load(self):
+        with gzip.open(self.path, "rt") as f:
+            for line in f:
+                entry = json.loads(line)
+                self.by_request[entry["key"]].append(entry)
+                self.by_endpoint[entry["endpoint"]].append(entry)
+        log.info("Loaded %d recorded OpenAI responses from %s",
+                 sum(len(entries) for entries in self.by_request.values()), self.path)
+        return self
+
+    def match(self, key, endpoint):
+        """The next recorded response for a request, or None"""
+        with self._lock:
+            entries = self.by_request.get(key)
+            if entries:
+                position = self._positions[key]
+                self._positions[key] = position + 1
+                return entries[min(position, len(entries) - 1)]
+            entries = self.by_endpoint.get(endpoint)
+            if entries:
+                position = self._positions[endpoint]
+                self._positions[endpoint] = position + 1
+                log.debug("No exact recording for %s, using the endpoint's response %d", endpoint, position)
+                return entries[position % len(entries)]
+        return None
+
+    def append(self, entry):
+        # Each entry is its own gzip member, written in one append so that
+        # concurrent writers don't interleave within a line
+        data = gzip.compress((json.dumps(entry, separators=(",", ":")) + "\n").encode())
+        with self._lock:
+            if self._fd is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+            os.write(self._fd, data)
+
+
+class _Recording:
+    """Collects a response's chunks as the client reads them, then saves it"""
+
+    def __init__(self, cassette, request, key, response, started):
+        self.cassette = cassette
+        self.entry = {
+            "key": key,
+            "endpoint": endpoint_key(request),
+            "method": request.method,
+            "path": request.url.path,
+            "status": response.status_code,
+            "headers": {name: response.headers[name] for name in KEPT_HEADERS if name in response.headers},
+            "elapsed": round(time.monotonic() - started, 4),
+        }
+        self.streamed = response.headers.get("content-type", "").startswith("text/event-stream")
+        self.started = started
+        self.chunks = []
+        self.saved = False
+        # A chunk can end partway through a multi-byte character
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    def add(self, chunk):
+        self.chunks.append([round(time.monotonic() - self.started, 4), self._decoder.decode(chunk)])
+
+    def save(self):
+        if self.saved:
+            return
+        self.saved = True
+        chunks = self.chunks
+        if not self.streamed and chunks:
+            # Only stream timing matters; keep other bodies as one chunk
+            chunks = [[chunks[-1][0], "".join(text for _, text in chunks)]]
+        self.cassette.append({**self.entry, "chunks": chunks})
+
+
+class _RecordingStream(httpx.SyncByteStream):
+    def __init__(self, stream, recording):
+        self._stream = stream
+        self._recording = recording
+
+    def __iter__(self):
+        for chunk in self._stream:
+            self._recording.add(chunk)
+            yield chunk
+
+    def close(self):
+        self._stream.close()
+        self._recording.save()
+
+
+class _AsyncRecordingStream(httpx.AsyncByteStream):
+    def __init__(self, stream, recording):
+        self._stream = stream
+        self._recording = recording
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            self._recording.add(chunk)
+            yield chunk
+
+    async def aclose(self):
+        await self._stream.aclose()
+        self._recording.save()
+
+
+class _ReplayStream(httpx.SyncByteStream):
+    def __init__(self, chunks, speed):
+        self._chunks = chunks
+        self._speed = speed
+
+    def __iter__(self):
+        started = time.monotonic()
+        for offset, text in self._chunks:
+            delay = started + offset * self._speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            yield text.encode()
+
+
+class _AsyncReplayStream(httpx.AsyncByteStream):
+    def __init__(self, chunks, speed):
+        self._chunks = chunks
+        self._speed = speed
+
+    async def __aiter__(self):
+        started = time.monotonic()
+        for offset, text in self._chunks:
+            delay = started + offset * self._speed - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield text.encode()
+
+
+def _record_request(request):
+    # Ask for an uncompressed body so the cassette stores readable text
+    request.headers["Accept-Encoding"] = "identity"
+    return time.monotonic()
+
+
+def _recorded_response(request, entry, stream):
+    return httpx.Response(entry["status"], headers=entry["headers"], stream=stream, request=request)
+
+
+def _chunks_after_headers(entry):
+    # Chunk offsets count from the request; the header delay has already been waited
+    return [[max(0.0, offset - entry["elapsed"]), text] for offset, text in entry["chunks"]]
+
+
+def _missing(request, key):
+    log.warning("No recorded response for %s (%s)", endpoint_key(request), key)
+    return local_error(request, 404, f"Nothing recorded for {endpoint_key(request)} in the cassette")
+
+
+class CassetteTransport(httpx.BaseTransport):
+    """Records the wrapped transport's responses, or replays them in its place"""
+
+    def __init__(self, cassette, mode, transport=None, speed=1.0):
+        self.cassette = cassette
+        self.mode = mode
+        self.speed = speed
+        self._transport = transport
+
+    def handle_request(self, request):
+        key = request_key(request, request.read())
+        if self.mode == "replay":
+            entry = self.cassette.match(key, endpoint_key(request))
+            if entry is None:
+                return _missing(request, key)
+            time.sleep(entry["elapsed"] * self.speed)
+            return _recorded_response(request, entry, _ReplayStream(_chunks_after_headers(entry), self.speed))
+
+        started = _record_request(request)
+        response = self._transport.handle_request(request)
+        recording = _Recording(self.cassette, request, key, response, started)
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=_RecordingStream(response.stream, recording),
+            extensions=response.extensions,
+            request=request,
+        )
+
+    def close(self):
+        if self._transport is not None:
+            self._transport.close()
+
+
+class AsyncCassetteTransport(httpx.AsyncBaseTransport):
+    """Async counterpart of CassetteTransport"""
+
+    def __init__(self, cassette, mode, transport=None, speed=1.0):
+        self.cassette = cassette
+        self.mode = mode
+        self.speed = speed
+        self._transport = transport
+
+    async def handle_async_request(self, request):
+        key = request_key(request, await request.aread())
+        if self.mode == "replay":
+            entry = self.cassette.match(key, endpoint_key(request))
+            if entry is None:
+                return _missing(request, key)
+            await asyncio.sleep(entry["elapsed"] * self.speed)
+            return _recorded_response(request, entry, _AsyncReplayStream(_chunks_after_headers(entry), self.speed))
+
+        started = _record_request(request)
+        response = await self._transport.handle_async_request(request)
+        recording = _Recording(self.cassette, request, key, response, started)
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=_AsyncRecordingStream(response.stream, recording),
+            extensions=response.extensions,
+            request=request,
+        )
+
+    async def aclose(self):
+        if self._transport is not None:
+            await self._transport.aclose()
+
+
+_cassette = None
+_cassette_lock = threading.Lock()
+
+
+def cassette_settings():
+    """(path, mode, speed) from the environment; path is None when the mode is off"""
+    path = os.getenv("OPENAI_CASSETTE") or None
+    mode = os.getenv("OPENAI_CASSETTE_MODE", "replay").lower()
+    if path and mode not in ("record", "replay"):
+        raise ValueError(f"OPENAI_CASSETTE_MODE must be record or replay, not {mode!r}")
+    return path, mode, float(os.getenv("OPENAI_CASSETTE_SPEED", 1.0))
+
+
+def replaying():
+    path, mode, _ = cassette_settings()
+    return path is not None and mode == "replay"
+
+
+def _shared_cassette(path, mode):
+    # The sync and async clients share one cassette and its replay positions
+    global _cassette
+    with _cassette_lock:
+        if _cassette is None:
+            _cassette = Cassette(path)
+            if mode == "replay":
+                _cassette.load()
+            else:
+                log.warning("Recording OpenAI traffic, including prompts and answers, to %s", path)
+        return _cassette
+
+
+def wrap_transport(transport):
+    """transport, or a cassette transport recording or replacing it when OPENAI_CASSETTE is set"""
+    path, mode, speed = cassette_settings()
+    if path is None:
+        return transport
+    return CassetteTransport(_shared_cassette(path, mode), mode, transport, speed)
+
+
+def wrap_async_transport(transport):
+    path, mode, speed = cassette_settings()
+    if path is None:
+        return transport
+    return AsyncCassetteTransport(_shared_cassette(path, mode), mode, transport, speed)
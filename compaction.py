@@ -0,0 +1,126 @@
+"""Bounded-context compaction of interview transcripts.
+
+Once a transcript's estimated size passes the token budget, everything but
+the last few question/answer turns is folded into a structured profile of
+the user (goal, location, schedule, constraints, obstacles), and the model
+gets that profile plus the recent turns instead of the whole history. The
+profile is rebuilt from the transcript on every call, so it rolls forward as
+the window moves and needs no extra model calls or stored state. Older
+answers are shortened just enough to fit the budget.
+
+Token counts are estimates (about four characters per token), which is
+close enough to decide when to compact and to report what it saved.
+"""
+import json
+import re
+from dataclasses import dataclass
+
+CHARS_PER_TOKEN = 4
+MIN_ANSWER_CHARS = 80
+
+# Checked in order; a turn goes under the first field whose words appear in
+# its question or answer
+PROFILE_FIELDS = (
+    ("obstacles", ("obstacle", "challenge", "struggle", "hard", "difficult", "barrier", "stop", "fail", "worr", "stress")),
+    ("schedule", ("time", "when", "schedule", "day", "week", "month", "morning", "evening", "hour", "minute", "often", "routine")),
+    ("location", ("where", "location", "city", "town", "home", "local", "nearby", "outdoor", "indoor", "gym")),
+    ("constraints", ("budget", "cost", "money", "afford", "equipment", "injur", "health", "limit", "family", "work", "job", "kids")),
+    ("goal", ("goal", "success", "achieve", "want", "why", "motivat", "outcome", "hope", "look like")),
+)
+PROFILE_LABELS = {
+    "goal": "Goal",
+    "location": "Location",
+    "schedule": "Schedule",
+    "constraints": "Constraints",
+    "obstacles": "Obstacles",
+    "other": "Other answers",
+}
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def question_text(content):
+    """The question's text when the assistant replied with question JSON"""
+    if content.strip().startswith("{"):
+        try:
+            return json.loads(content).get("text", content)
+        except (ValueError, AttributeError):
+            pass
+    return content
+
+
+def shorten(text, limit):
+    text = re.sub(r"\s+", " ", text).strip()
+    if len(text) <= limit:
+        return text
+    return text[:limit].rsplit(" ", 1)[0] + "…"
+
+
+def profile_field(question, answer):
+    text = f"{question} {answer}".lower()
+    for field, words in PROFILE_FIELDS:
+        if any(word in text for word in words):
+            return field
+    return "other"
+
+
+@dataclass
+class CompactedTranscript:
+    """A transcript reduced to a profile summary plus its most recent turns"""
+    summary: str
+    recent: list
+    tokens_before: int
+    tokens_after: int
+
+    def messages(self):
+        """Messages to send in place of the transcript"""
+        return [{"role": "user", "content": self.summary}, *self.recent]
+
+
+def compact(messages, budget, recent_turns=3):
+    """Compact a transcript (oldest first, opening user message first).
+
+    Returns None when it already fits the budget or there are no older turns
+    to fold away; otherwise a CompactedTranscript.
+    """
+    tokens_before = sum(estimate_tokens(m["content"]) for m in messages)
+    if budget <= 0 or tokens_before <= budget or len(messages) < 2:
+        return None
+
+    # The opening message, then (question, answer) turns; an unanswered
+    # trailing question stays with the recent messages
+    body = messages[1:]
+    keep = min(len(body), 2 * recent_turns + len(body) % 2)
+    older, recent = body[:len(body) - keep], body[len(body) - keep:]
+    if not older:
+        return None
+
+    turns = [
+        (question_text(older[i]["content"]), older[i + 1]["content"])
+        for i in range(0, len(older) - 1, 2)
+    ]
+    recent_tokens = sum(estimate_tokens(m["content"]) for m in recent)
+    room = max(budget - recent_tokens, 0) * CHARS_PER_TOKEN
+    answer_chars = max(MIN_ANSWER_CHARS, room // (len(turns) + 1))
+
+    profile = {field: [] for field in PROFILE_LABELS}
+    for question, answer in turns:
+        profile[profile_field(question, answer)].append(f"{shorten(question, 120)} {shorten(answer, answer_chars)}")
+
+    lines = [
+        "Summary of the interview so far:",
+        f"About them: {shorten(messages[0]['content'], answer_chars)}",
+    ]
+    for field, label in PROFILE_LABELS.items():
+        if profile[field]:
+            lines.append(f"{label}: " + " | ".join(profile[field]))
+    summary = "\n".join(lines)
+
+    return CompactedTranscript(
+        summary=summary,
+        recent=recent,
+        tokens_before=tokens_before,
+        tokens_after=estimate_tokens(summary) + recent_tokens,
+    )
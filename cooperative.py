@@ -0,0 +1,86 @@
+"""Serving under green threads (gunicorn's gevent and eventlet workers).
+
+Those workers monkey-patch the standard library when they start, before the
+app is imported, so time.sleep (run polling, retry backoff), sockets (every
+OpenAI call through httpx), locks, semaphores, queues and threads all switch
+to another request instead of blocking the worker. The app needs no separate
+code path for that.
+
+The one thing patching gets wrong for this app is threading.local, which
+becomes greenlet-local: state meant to be reused by every request a thread
+serves (SQLite connections, the markdown converter) would be rebuilt for
+every request, and SQLite would hold files open per concurrent request.
+thread_local() keeps such state per OS thread instead. It is only touched in
+calls that never yield (SQLite statements and transactions, markdown
+conversion), so greenlets can't interleave on it. SQLiteFile gives every
+SQLite-backed store its connections that way.
+"""
+import os
+import sqlite3
+import sys
+import threading
+
+
+def green_mode():
+    """"gevent" or "eventlet" when the standard library is patched, else None"""
+    if "gevent.monkey" in sys.modules:
+        from gevent import monkey
+
+        if monkey.is_module_patched("threading"):
+            return "gevent"
+    if "eventlet.patcher" in sys.modules:
+        from eventlet import patcher
+
+        if patcher.is_monkey_patched("thread"):
+            return "eventlet"
+    return None
+
+
+def thread_local():
+    """A threading.local() that stays per OS thread when green threads are patched in"""
+    mode = green_mode()
+    if mode == "gevent":
+        from gevent import monkey
+
+        return monkey.get_original("threading", "local")()
+    if mode == "eventlet":
+        from eventlet import patcher
+
+        return patcher.original("threading").local()
+    return threading.local()
+
+
+class SQLiteFile:
+    """A SQLite file shared by every worker process, with one connection per OS thread"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = thread_local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.connect().execute("PRAGMA journal_mode=WAL")
+
+    def connect(self):
+        """This thread's connection, in autocommit mode"""
+        # sqlite3 connections can't be shared between threads
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            self._local.db = db
+        return db
+
+    def transaction(self):
+        """Run a with block's statements in one write transaction"""
+        return _Transaction(self.connect())
+
+
+class _Transaction:
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE")
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb):
+        self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
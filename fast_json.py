@@ -0,0 +1,55 @@
+"""JSON encoding and decoding with orjson when it is installed.
+
+FastJSONProvider is Flask's JSON provider for the app: responses and
+request bodies go through orjson, falling back to the standard library for
+values orjson can't encode, for json.dumps arguments orjson has no option
+for, and whenever orjson isn't available. Output matches the default
+provider's (compact or indented, sorted keys, same handling of dates).
+"""
+import json
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    loads = orjson.loads
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+else:
+    loads = json.loads
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    def _orjson_option(self, kwargs):
+        """orjson flags equivalent to json.dumps arguments, or None if some have none"""
+        option = ORJSON_OPTIONS
+        if kwargs.pop("sort_keys", self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        for name, value in kwargs.items():
+            # response() asks for compact output, or indent=2 in debug mode
+            if name == "separators" and tuple(value) == (",", ":"):
+                continue
+            if name == "indent" and value == 2:
+                option |= orjson.OPT_INDENT_2
+                continue
+            if name == "default" and value == self.default:
+                continue
+            return None
+        return option
+
+    def dumps(self, obj, **kwargs):
+        option = None if orjson is None else self._orjson_option(dict(kwargs))
+        if option is None:
+            return super().dumps(obj, **kwargs)
+        try:
+            return orjson.dumps(obj, default=self.default, option=option).decode()
+        except TypeError:
+            return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
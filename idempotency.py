@@ -0,0 +1,358 @@
+"""Run each answer submission once, however many times it arrives.
+
+Double-clicks, client retries after a 504 and flaky mobile networks resend
+the same answer; without a guard every copy appends another user message and
+starts another run on the thread. Each /submit_answer, /get_next_question
+and /stream-resolution request with an answer therefore has an idempotency
+key: the client's Idempotency-Key header
+(or "idempotencyKey" body field) when it sends one, otherwise the endpoint,
+thread ID and question number.
+
+The first request with a key claims it and runs. A duplicate that arrives
+while it is still running waits for it and gets the same response; one that
+arrives later gets the stored response without calling the model. Only
+successful (2xx) responses are stored: on an error the key is released, so
+a retry runs again. A key reused with a different request body is refused.
+
+Appending the answer to the thread is a step of its own (step_once): it is
+marked done under "<key>:answer", so a retry of a request that failed later
+on (a full job queue, a run timing out) doesn't append the answer again and
+only redoes what failed.
+
+The default store works within one process. Set IDEMPOTENCY_DB to a file
+path to keep keys in SQLite instead, shared by every worker on the machine;
+a duplicate that lands on another worker then waits by polling.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+import metrics
+from cache import TTLCache
+from cooperative import SQLiteFile
+
+CLAIMED = "claimed"
+RUNNING = "running"
+DONE = "done"
+
+POLL_INITIAL_DELAY = 0.05
+POLL_MAX_DELAY = 1.0
+
+_outcomes = {"ran": 0, "replayed": 0, "merged": 0, "reused": 0, "busy": 0}
+_outcomes_lock = threading.Lock()
+
+
+class KeyReused(Exception):
+    """The key was already used for a request with a different body"""
+
+
+class Busy(Exception):
+    """The request holding the key didn't finish within the wait"""
+
+
+@dataclass(frozen=True)
+class StoredResponse:
+    status: int
+    body: bytes
+    content_type: str
+
+    @property
+    def successful(self):
+        return 200 <= self.status < 300
+
+
+def request_key(endpoint, thread_id, question_number, client_key=None):
+    """The key of an answer submission, or None when it can't be identified"""
+    if client_key:
+        return f"{endpoint}:client:{client_key}"
+    if thread_id and question_number is not None:
+        return f"{endpoint}:{thread_id}:{question_number}"
+    return None
+
+
+def fingerprint(data):
+    """Hash of a JSON request body, independent of key order"""
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+# Stored under "<key>:<step>" once a step is done; the body is never replayed
+STEP_DONE = StoredResponse(204, b"", "text/plain")
+
+
+def _check_fingerprint(key, stored, given):
+    if stored != given:
+        raise KeyReused(f"Idempotency key {key} was already used for a different request")
+
+
+class MemoryIdempotencyStore:
+    """Keys held in process; stored responses expire after ttl seconds.
+
+    A key that has been running for longer than lease seconds was never
+    finished (e.g. a stream that was never iterated) and is claimed again.
+    """
+
+    def __init__(self, max_keys=10000, ttl=3600, lease=300):
+        self.lease = lease
+        self._done = TTLCache(max_entries=max_keys, ttl=ttl)
+        self._running = {}
+        self._lock = threading.Lock()
+
+    def claim(self, key, fingerprint):
+        """Return (CLAIMED, None), (RUNNING, None) or (DONE, stored response)"""
+        with self._lock:
+            entry = self._done.get(key)
+            if entry is not None:
+                _check_fingerprint(key, entry[0], fingerprint)
+                return DONE, entry[1]
+            running = self._running.get(key)
+            if running is not None and running[1] > time.monotonic() - self.lease:
+                _check_fingerprint(key, running[0], fingerprint)
+                return RUNNING, None
+            self._running[key] = (fingerprint, time.monotonic())
+            return CLAIMED, None
+
+    def finish(self, key, response):
+        """Store a claimed key's successful response, or release the key"""
+        with self._lock:
+            running = self._running.pop(key, None)
+            if running is not None and response.successful:
+                self._done.set(key, (running[0], response))
+
+    def release(self, key):
+        with self._lock:
+            self._running.pop(key, None)
+
+    def stats(self):
+        return {"backend": "memory", "stored": len(self._done), "running": len(self._running)}
+
+
+class SQLiteIdempotencyStore:
+    """Keys in a SQLite file shared by every worker process.
+
+    A key that has been running for longer than lease seconds belongs to a
+    worker that died mid-request and is claimed again.
+    """
+
+    def __init__(self, path, ttl=3600, lease=300):
+        self.path = path
+        self.ttl = ttl
+        self.lease = lease
+        self._sqlite = SQLiteFile(path)
+        with self._sqlite.transaction() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS idempotency_keys ("
+                "key TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, status INTEGER, "
+                "body BLOB, content_type TEXT, updated_at REAL NOT NULL)"
+            )
+
+    def claim(self, key, fingerprint):
+        """Return (CLAIMED, None), (RUNNING, None) or (DONE, stored response)"""
+        now = time.time()
+        with self._sqlite.transaction() as db:
+            self._purge_expired(db, now)
+            row = db.execute(
+                "SELECT fingerprint, status, body, content_type FROM idempotency_keys WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                db.execute(
+                    "INSERT INTO idempotency_keys (key, fingerprint, updated_at) VALUES (?, ?, ?)",
+                    (key, fingerprint, now),
+                )
+                return CLAIMED, None
+            stored_fingerprint, status, body, content_type = row
+            _check_fingerprint(key, stored_fingerprint, fingerprint)
+            if status is None:
+                return RUNNING, None
+            return DONE, StoredResponse(status, bytes(body), content_type)
+
+    def finish(self, key, response):
+        """Store a claimed key's successful response, or release the key"""
+        if not response.successful:
+            self.release(key)
+            return
+        with self._sqlite.transaction() as db:
+            db.execute(
+                "UPDATE idempotency_keys SET status = ?, body = ?, content_type = ?, updated_at = ? "
+                "WHERE key = ? AND status IS NULL",
+                (response.status, response.body, response.content_type, time.time(), key),
+            )
+
+    def release(self, key):
+        with self._sqlite.transaction() as db:
+            db.execute("DELETE FROM idempotency_keys WHERE key = ? AND status IS NULL", (key,))
+
+    def stats(self):
+        with self._sqlite.transaction() as db:
+            stored, running = db.execute(
+                "SELECT COUNT(status), COUNT(*) - COUNT(status) FROM idempotency_keys"
+            ).fetchone()
+        return {"backend": "sqlite", "stored": stored, "running": running}
+
+    def _purge_expired(self, db, now):
+        db.execute(
+            "DELETE FROM idempotency_keys WHERE updated_at < "
+            "CASE WHEN status IS NULL THEN ? ELSE ? END",
+            (now - self.lease, now - self.ttl),
+        )
+
+
+def _count(outcome):
+    with _outcomes_lock:
+        _outcomes[outcome] += 1
+
+
+def outcomes():
+    """How many keyed requests ran, were replayed, merged into a running one, or were refused"""
+    with _outcomes_lock:
+        return dict(_outcomes)
+
+
+def claim_or_wait(store, key, fingerprint, wait=120):
+    """Claim key, or wait while another request holds it.
+
+    Returns (None, "ran") when the caller now holds the key and must finish
+    or release it, otherwise (stored response, outcome), where outcome is
+    "replayed" (stored earlier) or "merged" (waited for a concurrent
+    duplicate). Raises KeyReused or Busy.
+    """
+    deadline = time.monotonic() + wait
+    delay = POLL_INITIAL_DELAY
+    waited = False
+    try:
+        state, stored = store.claim(key, fingerprint)
+        if state == RUNNING:
+            waited = True
+            with metrics.span("duplicate_wait"):
+                while state == RUNNING:
+                    if time.monotonic() + delay > deadline:
+                        raise Busy(f"Request {key} is still in progress")
+                    time.sleep(delay)
+                    delay = min(delay * 2, POLL_MAX_DELAY)
+                    state, stored = store.claim(key, fingerprint)
+    except (KeyReused, Busy) as e:
+        _count("reused" if isinstance(e, KeyReused) else "busy")
+        raise
+    if state == DONE:
+        _count("merged" if waited else "replayed")
+        return stored, "merged" if waited else "replayed"
+    _count("ran")
+    return None, "ran"
+
+
+def single_flight(store, key, fingerprint, handler, wait=120):
+    """Run handler() for the first request with key; duplicates get its response.
+
+    handler returns a StoredResponse. Returns (response, outcome) as
+    claim_or_wait does, with the handler's response when it ran.
+    """
+    stored, outcome = claim_or_wait(store, key, fingerprint, wait)
+    if stored is not None:
+        return stored, outcome
+
+    try:
+        response = handler()
+    except BaseException:
+        store.release(key)
+        raise
+    store.finish(key, response)
+    return response, "ran"
+
+
+async def single_flight_async(store, key, fingerprint, handler, wait=120):
+    """single_flight for coroutines: handler is awaited and store calls run in a thread"""
+    deadline = time.monotonic() + wait
+    delay = POLL_INITIAL_DELAY
+    waited = False
+    try:
+        state, stored = await asyncio.to_thread(store.claim, key, fingerprint)
+        if state == RUNNING:
+            waited = True
+            with metrics.span("duplicate_wait"):
+                while state == RUNNING:
+                    if time.monotonic() + delay > deadline:
+                        raise Busy(f"Request {key} is still in progress")
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, POLL_MAX_DELAY)
+                    state, stored = await asyncio.to_thread(store.claim, key, fingerprint)
+    except (KeyReused, Busy) as e:
+        _count("reused" if isinstance(e, KeyReused) else "busy")
+        raise
+    if state == DONE:
+        _count("merged" if waited else "replayed")
+        return stored, "merged" if waited else "replayed"
+    _count("ran")
+
+    try:
+        response = await handler()
+    except BaseException:
+        await asyncio.to_thread(store.release, key)
+        raise
+    await asyncio.to_thread(store.finish, key, response)
+    return response, "ran"
+
+
+def _claim_step(state, step_key):
+    """Whether the step still has to run, given its claim state"""
+    if state == DONE:
+        return False
+    if state == RUNNING:
+        raise Busy(f"Step {step_key} of an earlier attempt never finished")
+    return True
+
+
+def step_once(store, key, fingerprint, step, action):
+    """Run action() once for the request holding key, across its retries.
+
+    Returns whether action ran: False when an earlier attempt of the same
+    request already did it. Without a key action always runs. Raises
+    KeyReused when the step was done for a different request body, and Busy
+    when an attempt died in the middle of it (until its lease runs out).
+    """
+    if key is None:
+        action()
+        return True
+    step_key = f"{key}:{step}"
+    state, _ = store.claim(step_key, fingerprint)
+    if not _claim_step(state, step_key):
+        return False
+    try:
+        action()
+    except BaseException:
+        store.release(step_key)
+        raise
+    store.finish(step_key, STEP_DONE)
+    return True
+
+
+async def step_once_async(store, key, fingerprint, step, action):
+    """step_once for coroutines: action() is awaited and store calls run in a thread"""
+    if key is None:
+        await action()
+        return True
+    step_key = f"{key}:{step}"
+    state, _ = await asyncio.to_thread(store.claim, step_key, fingerprint)
+    if not _claim_step(state, step_key):
+        return False
+    try:
+        await action()
+    except BaseException:
+        await asyncio.to_thread(store.release, step_key)
+        raise
+    await asyncio.to_thread(store.finish, step_key, STEP_DONE)
+    return True
+
+
+def create_idempotency_store():
+    """Build the store selected by the IDEMPOTENCY_* environment variables"""
+    ttl = int(os.getenv("IDEMPOTENCY_TTL", 3600))
+    path = os.getenv("IDEMPOTENCY_DB")
+    if path:
+        return SQLiteIdempotencyStore(path, ttl=ttl)
+    return MemoryIdempotencyStore(
+        max_keys=int(os.getenv("IDEMPOTENCY_MAX_KEYS", 10000)),
+        ttl=ttl,
+    )
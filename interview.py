@@ -0,0 +1,258 @@
+"""What the interview endpoints accept and answer, shared by app.py and asgi.py.
+
+The sync and async apps differ only in how they call OpenAI and the stores.
+Reading and checking a request, deciding what it needs (another question,
+the final plan, a background job) and building the response are done here,
+without I/O, so both apps accept and answer every request the same way.
+"""
+import re
+import sys
+from dataclasses import dataclass
+from typing import Optional
+
+import logs
+from prompts import initial_user_message
+
+log = logs.get_logger("interview")
+
+# Questions in an interview; the answer to the last one gets the plan
+QUESTION_COUNT = 10
+
+RESOLUTION_IDEA_STOPWORDS = {
+    "a", "an", "the", "i", "i'd", "i'm", "im", "id", "my", "me", "to", "want", "would",
+    "like", "be", "more", "this", "year", "new", "years", "goal", "resolution", "is",
+    "and", "of", "for", "in", "on", "some", "get", "start", "try", "going",
+}
+
+
+def normalize_resolution_idea(text):
+    """Reduce a free-text resolution idea to its significant words"""
+    words = re.findall(r"[a-z0-9']+", (text or "").lower())
+    return " ".join(word for word in words if word not in RESOLUTION_IDEA_STOPWORDS)
+
+
+def first_question_key(resolution_type, specific_resolution):
+    return (
+        (resolution_type or "").strip().lower(),
+        normalize_resolution_idea(specific_resolution)
+    )
+
+
+def cacheable_first_question(question, name, location):
+    """Only share valid questions that aren't about this user"""
+    if question is None:
+        return False
+    text = question["text"].lower()
+    return not any(detail and detail.lower() in text for detail in (name, location))
+
+
+def expected_messages(question_number):
+    """Transcript length once question_number has been answered: the initial
+    message plus a question and an answer per step"""
+    return 2 * question_number + 1
+
+
+def _object(data):
+    if not isinstance(data, dict):
+        raise ValueError("Expected a JSON object")
+    return data
+
+
+def _question_number(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid question number: {value!r}") from None
+
+
+@dataclass(frozen=True)
+class NewSession:
+    """A /start_session request"""
+    name: str
+    location: str
+    resolution_type: str
+    specific_resolution: str
+
+    @classmethod
+    def parse(cls, data):
+        data = _object(data)
+        return cls(
+            name=data.get('name', 'User'),
+            location=data.get('location', ''),
+            resolution_type=data.get('resolutionType', ''),
+            specific_resolution=data.get('specificResolution', ''),
+        )
+
+    @property
+    def initial_message(self):
+        return initial_user_message(self.name, self.location, self.resolution_type, self.specific_resolution)
+
+    @property
+    def cache_key(self):
+        return first_question_key(self.resolution_type, self.specific_resolution)
+
+    def cacheable(self, question):
+        return cacheable_first_question(question, self.name, self.location)
+
+
+def session_response(question, thread_id, question_assistant_id, resolution_assistant_id):
+    return {
+        "question": question,
+        "threadId": thread_id,
+        "questionNumber": 1,
+        "question_assistant_id": question_assistant_id,
+        "resolution_assistant_id": resolution_assistant_id,
+        "thread_id": thread_id
+    }
+
+
+@dataclass(frozen=True)
+class Answer:
+    """An answer to an interview question, checked before anything is recorded.
+
+    final is set when the answer completes the interview, and the endpoint
+    then produces the resolution instead of another question.
+    """
+    thread_id: str
+    text: str
+    question_number: int
+    question_assistant_id: Optional[str]
+    resolution_assistant_id: Optional[str]
+    final: bool
+    background: bool = False
+
+    @classmethod
+    def submitted(cls, data):
+        """A /submit_answer request; the answer to question 10 gets the plan"""
+        data = _object(data)
+        question_number = _question_number(data.get('questionNumber', 1))
+        answer = cls(
+            thread_id=data.get('threadId'),
+            text=data.get('answer'),
+            question_number=question_number,
+            question_assistant_id=data.get('questionAssistantId'),
+            resolution_assistant_id=data.get('resolutionAssistantId'),
+            final=question_number >= QUESTION_COUNT,
+            background=bool(data.get('background')),
+        )
+        if not all([answer.thread_id, answer.text, answer.question_assistant_id, answer.resolution_assistant_id]):
+            raise ValueError("Missing required data for answer submission")
+        return answer
+
+    @classmethod
+    def for_next_question(cls, data):
+        """A /get_next_question request, which counts questions from 0"""
+        data = _object(data)
+        question_number = _question_number(data.get('questionNumber', 0))
+        answer = cls(
+            thread_id=data.get('threadId'),
+            text=str(data.get('answer')),
+            question_number=question_number,
+            question_assistant_id=data.get('question_assistant_id'),
+            resolution_assistant_id=data.get('resolution_assistant_id'),
+            final=question_number >= QUESTION_COUNT - 1,
+        )
+        if not all([answer.thread_id, answer.question_assistant_id, answer.resolution_assistant_id]):
+            raise ValueError("Missing required session data")
+        return answer
+
+    @classmethod
+    def streamed(cls, data):
+        """A /stream-resolution request: a final answer, or None with just a threadId"""
+        data = _object(data)
+        if not data.get('answer'):
+            return None
+        return cls(
+            thread_id=data.get('threadId'),
+            text=data['answer'],
+            question_number=_question_number(data.get('questionNumber', QUESTION_COUNT)),
+            question_assistant_id=data.get('questionAssistantId'),
+            resolution_assistant_id=data.get('resolutionAssistantId'),
+            final=True,
+        )
+
+    @property
+    def expected_messages(self):
+        return expected_messages(self.question_number)
+
+    def plan_job(self):
+        """Parameters of the background job that writes this interview's plan"""
+        return {
+            "threadId": self.thread_id,
+            "resolutionAssistantId": self.resolution_assistant_id,
+            "expectedMessages": self.expected_messages
+        }
+
+
+def next_question_response(answer, question):
+    """/submit_answer's reply with the next question"""
+    return {
+        "question": question,
+        "threadId": answer.thread_id,
+        "questionNumber": answer.question_number + 1,
+        "questionAssistantId": answer.question_assistant_id,
+        "resolutionAssistantId": answer.resolution_assistant_id,
+        "done": False
+    }
+
+
+def question_response(answer, question):
+    """/get_next_question's reply, with its snake_case assistant fields"""
+    return {
+        "question": question,
+        "threadId": answer.thread_id,
+        "questionNumber": answer.question_number + 1,
+        "question_assistant_id": answer.question_assistant_id,
+        "resolution_assistant_id": answer.resolution_assistant_id
+    }
+
+
+def plan_response(resolution, permalink):
+    """The final /submit_answer reply, also the result of a resolution_plan job"""
+    return {"done": True, "resolution": resolution, "permalink": permalink}
+
+
+def resolution_response(thread_id, resolution, permalink, unescape=False):
+    """A resolution written on the interview thread (/generate-resolution).
+
+    unescape turns the model's escaped asterisks back into markdown.
+    """
+    return {
+        "resolution": resolution.replace('\\*', '*') if unescape else resolution,
+        "threadId": thread_id,
+        "isComplete": True,
+        "permalink": permalink
+    }
+
+
+def resolution_error(thread_id, error):
+    return {"error": str(error), "resolution": None, "threadId": thread_id}, 500, {}
+
+
+def is_timeout(error):
+    """Our own run deadlines, and request timeouts from the SDK or httpx"""
+    if isinstance(error, TimeoutError):
+        return True
+    # Loaded modules only: an error can't come from a library that was never imported
+    timeout_types = [
+        getattr(sys.modules.get(module), name, None)
+        for module, name in (('openai', 'APITimeoutError'), ('httpx', 'TimeoutException'), ('httpx2', 'TimeoutException'))
+    ]
+    return any(t is not None and isinstance(error, t) for t in timeout_types)
+
+
+def failure(error, endpoint):
+    """(body, status, headers) for an endpoint that raised: 504 for a timeout, otherwise 500.
+
+    Call it from the except block, so the traceback is logged.
+    """
+    if is_timeout(error):
+        log.warning("Timeout in %s: %s", endpoint, error)
+        return {"error": "Request timed out. Please try again."}, 504, {}
+    log.exception("Error in %s: %s", endpoint, error)
+    return {"error": str(error)}, 500, {}
+
+
+def queue_full():
+    """(body, status, headers) when no background job can be queued"""
+    return {"error": "Too many resolutions in progress, please retry shortly"}, 503, {"Retry-After": "5"}
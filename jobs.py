@@ -0,0 +1,241 @@
+"""Background jobs for slow model calls.
+
+A request that would otherwise wait up to a minute for a run can instead
+submit a job and return its ID at once; the client then polls the job's
+status. Jobs run on a bounded thread pool, and submissions are refused
+with QueueFull once too many are waiting, rather than queueing without
+limit.
+
+Job records are plain dicts:
+
+    {"jobId": ..., "kind": ..., "status": "queued" | "running" | "done" | "error",
+     "stage": ..., "result": ..., "error": ..., "createdAt": ..., "updatedAt": ...}
+
+The default store keeps records in this process. Set JOB_DB to a file path
+to keep them in SQLite instead: every worker on the machine can then report
+any job's status, and jobs left unfinished by a restart are run again.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import logs
+from cache import TTLCache
+from cooperative import SQLiteFile
+
+log = logs.get_logger("jobs")
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while the queue is at its depth limit"""
+
+
+class MemoryJobStore:
+    """Job records held in process for a fixed time after their last update"""
+
+    def __init__(self, ttl=3600, max_jobs=10000):
+        self._jobs = TTLCache(max_entries=max_jobs, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def create(self, job_id, kind, params):
+        now = time.time()
+        self._jobs.set(job_id, {
+            "jobId": job_id,
+            "kind": kind,
+            "params": params,
+            "status": "queued",
+            "stage": None,
+            "result": None,
+            "error": None,
+            "createdAt": now,
+            "updatedAt": now,
+        })
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                self._jobs.set(job_id, {**job, **fields, "updatedAt": time.time()})
+
+    def get(self, job_id):
+        job = self._jobs.get(job_id)
+        return None if job is None else dict(job)
+
+    def claim_stale(self, older_than):
+        # Nothing in memory outlives the process that was running it
+        return []
+
+
+class SQLiteJobStore:
+    """Job records in a SQLite file shared by every worker process"""
+
+    COLUMNS = "job_id, kind, params, status, stage, result, error, created_at, updated_at"
+
+    def __init__(self, path, ttl=3600):
+        self.path = path
+        self.ttl = ttl
+        self._sqlite = SQLiteFile(path)
+        db = self._sqlite.connect()
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "job_id TEXT PRIMARY KEY, kind TEXT NOT NULL, params TEXT NOT NULL, "
+            "status TEXT NOT NULL, stage TEXT, result TEXT, error TEXT, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+
+    def create(self, job_id, kind, params):
+        now = time.time()
+        db = self._sqlite.connect()
+        db.execute("DELETE FROM jobs WHERE updated_at < ?", (now - self.ttl,))
+        db.execute(
+            f"INSERT INTO jobs ({self.COLUMNS}) VALUES (?, ?, ?, 'queued', NULL, NULL, NULL, ?, ?)",
+            (job_id, kind, json.dumps(params), now, now),
+        )
+
+    def update(self, job_id, **fields):
+        unknown = set(fields) - {"status", "stage", "result", "error"}
+        if unknown:
+            raise ValueError(f"Unknown job fields: {unknown}")
+        values = [json.dumps(v) if k == "result" else v for k, v in fields.items()]
+        assignments = ", ".join(f"{k} = ?" for k in fields)
+        self._sqlite.connect().execute(
+            f"UPDATE jobs SET {assignments}, updated_at = ? WHERE job_id = ?",
+            (*values, time.time(), job_id),
+        )
+
+    def get(self, job_id):
+        row = self._sqlite.connect().execute(
+            f"SELECT {self.COLUMNS} FROM jobs WHERE job_id = ? AND updated_at >= ?",
+            (job_id, time.time() - self.ttl),
+        ).fetchone()
+        return None if row is None else self._record(row)
+
+    def claim_stale(self, older_than):
+        """Take over unfinished jobs nobody has updated recently"""
+        now = time.time()
+        db = self._sqlite.connect()
+        rows = db.execute(
+            f"SELECT {self.COLUMNS} FROM jobs WHERE status IN ('queued', 'running') "
+            "AND updated_at < ? AND updated_at >= ?",
+            (now - older_than, now - self.ttl),
+        ).fetchall()
+        claimed = []
+        for row in rows:
+            # Only one worker wins each job: the update matches the timestamp it read
+            cursor = db.execute(
+                "UPDATE jobs SET status = 'queued', updated_at = ? WHERE job_id = ? AND updated_at = ?",
+                (now, row[0], row[8]),
+            )
+            if cursor.rowcount:
+                claimed.append(self._record(row))
+        return claimed
+
+    def _record(self, row):
+        job_id, kind, params, status, stage, result, error, created_at, updated_at = row
+        return {
+            "jobId": job_id,
+            "kind": kind,
+            "params": json.loads(params),
+            "status": status,
+            "stage": stage,
+            "result": json.loads(result) if result is not None else None,
+            "error": error,
+            "createdAt": created_at,
+            "updatedAt": updated_at,
+        }
+
+
+class JobQueue:
+    """Runs registered job kinds on a bounded pool of worker threads"""
+
+    def __init__(self, store, max_workers=4, max_pending=32):
+        self.store = store
+        self.max_pending = max_pending
+        self._handlers = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+
+    def register(self, kind, handler):
+        """handler(params, progress) returns the job's JSON-serializable result"""
+        self._handlers[kind] = handler
+
+    def submit(self, kind, params):
+        """Queue a job and return its ID; raises QueueFull at the depth limit"""
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job_id = f"job_{uuid.uuid4().hex}"
+        self._reserve()
+        try:
+            self.store.create(job_id, kind, params)
+        except Exception:
+            self._release()
+            raise
+        self._executor.submit(self._run, job_id, kind, params)
+        return job_id
+
+    def full(self):
+        """Whether a job submitted now would be refused with QueueFull"""
+        with self._lock:
+            return self._pending >= self.max_pending
+
+    def status(self, job_id):
+        """The job's public record, or None if unknown or expired"""
+        job = self.store.get(job_id)
+        if job is not None:
+            job.pop("params", None)
+        return job
+
+    def resume_stale(self, older_than=300):
+        """Run again any unfinished jobs a stopped worker left behind"""
+        resumed = 0
+        for job in self.store.claim_stale(older_than):
+            if job["kind"] not in self._handlers:
+                continue
+            try:
+                self._reserve()
+            except QueueFull:
+                self.store.update(job["jobId"], status="error", error="Queue full when resuming job")
+                continue
+            self._executor.submit(self._run, job["jobId"], job["kind"], job["params"])
+            resumed += 1
+        return resumed
+
+    def _reserve(self):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise QueueFull(f"{self._pending} jobs already queued or running")
+            self._pending += 1
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+
+    def _run(self, job_id, kind, params):
+        try:
+            self.store.update(job_id, status="running")
+            result = self._handlers[kind](params, lambda stage: self.store.update(job_id, stage=stage))
+            self.store.update(job_id, status="done", stage=None, result=result)
+        except Exception as e:
+            log.exception("Job %s (%s) failed: %s", job_id, kind, e)
+            self.store.update(job_id, status="error", error=str(e))
+        finally:
+            self._release()
+
+    def stats(self):
+        return {"pending": self._pending, "max_pending": self.max_pending}
+
+
+def create_job_queue():
+    """Build the queue configured by the JOB_* environment variables"""
+    ttl = int(os.getenv("JOB_TTL", 3600))
+    path = os.getenv("JOB_DB")
+    store = SQLiteJobStore(path, ttl=ttl) if path else MemoryJobStore(ttl=ttl)
+    return JobQueue(
+        store,
+        max_workers=int(os.getenv("JOB_WORKERS", 4)),
+        max_pending=int(os.getenv("JOB_QUEUE_DEPTH", 32)),
+    )
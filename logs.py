@@ -0,0 +1,237 @@
+"""Application logging.
+
+Log calls only put a record on an in-memory queue; a background thread
+formats and writes them, so a request never waits on stdout. On top of the
+standard library's levels:
+
+- payload(value) wraps user answers, prompts, model replies and other large
+  values. Unless payload logging is on they are logged only as their size;
+  when it is on they are cut to LOG_PAYLOAD_MAX characters.
+- INFO and DEBUG records can be sampled (LOG_SAMPLE_RATE, or a per-call
+  extra={"sample": rate} for chatty messages). Warnings and errors are
+  always kept.
+- The level, payload logging and sample rate can be changed while the app
+  is running by writing LOG_CONTROL_FILE (see update_settings); every
+  worker process picks the change up within a couple of seconds. A control
+  file written before the server started is ignored, so the environment
+  settings win after a restart or deploy.
+
+    log = logs.get_logger(__name__)
+    log.info("Created thread %s", thread.id)
+    log.debug("Raw reply: %s", logs.payload(reply))
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+
+ROOT = "resolutionpal"
+
+# Filled from the environment by setup_logging, after .env has been loaded
+_settings = {"level": "INFO", "payloads": False, "sample_rate": 1.0}
+_payload_max = 500
+_control_file = None
+_started = 0.0
+_listener = None
+_lock = threading.Lock()
+
+
+class payload:
+    """A logged value that is hidden or truncated according to the payload setting"""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        text = self.value if isinstance(self.value, str) else repr(self.value)
+        if not _settings["payloads"]:
+            return f"<{len(text)} chars>"
+        if len(text) > _payload_max:
+            return f"{text[:_payload_max]}... <{len(text) - _payload_max} more chars>"
+        return text
+
+
+class SamplingFilter(logging.Filter):
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = getattr(record, "sample", _settings["sample_rate"])
+        return rate >= 1 or random.random() < rate
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+def get_logger(name):
+    """A logger under the application's root logger; call setup_logging once at startup"""
+    return logging.getLogger(f"{ROOT}.{name}" if name != ROOT else ROOT)
+
+
+def setup_logging():
+    """Route the application's records through a queue to a background writer"""
+    global _listener, _payload_max, _control_file, _started
+    with _lock:
+        if _listener is not None:
+            return
+        _settings.update(
+            level=os.getenv("LOG_LEVEL", "INFO").upper(),
+            payloads=os.getenv("LOG_PAYLOADS", "false").lower() in ("1", "true", "yes"),
+            sample_rate=_validated({"sample_rate": os.getenv("LOG_SAMPLE_RATE", 1.0)})["sample_rate"],
+        )
+        _payload_max = int(os.getenv("LOG_PAYLOAD_MAX", 500))
+        _control_file = os.getenv(
+            "LOG_CONTROL_FILE",
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance", "logging.json"),
+        )
+        # Set by the gunicorn config, so that workers it restarts later still
+        # pick up changes made since the server started
+        _started = float(os.getenv("SERVER_STARTED_AT") or time.time())
+
+        output = logging.StreamHandler(sys.stdout)
+        if os.getenv("LOG_FORMAT", "text").lower() == "json":
+            output.setFormatter(JSONFormatter())
+        else:
+            output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(process)d] %(name)s: %(message)s"))
+
+        records = queue.Queue(maxsize=int(os.getenv("LOG_QUEUE_SIZE", 10000)))
+        handler = _DroppingQueueHandler(records)
+        handler.addFilter(SamplingFilter())
+
+        root = logging.getLogger(ROOT)
+        root.addHandler(handler)
+        root.propagate = False
+        _apply(_settings)
+
+        _listener = logging.handlers.QueueListener(records, output)
+        _start_threads()
+        atexit.register(lambda: _listener.stop())
+        # Threads don't survive fork (e.g. gunicorn --preload); start fresh ones in the child
+        os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def _start_threads():
+    _listener.start()
+    threading.Thread(target=_watch_control_file, name="log-control", daemon=True).start()
+
+
+def _restart_after_fork():
+    global _listener
+    _listener = logging.handlers.QueueListener(_listener.queue, *_listener.handlers)
+    _start_threads()
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks the caller: when the writer falls behind, records are dropped"""
+
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _DroppingQueueHandler.dropped += 1
+
+
+def settings():
+    return dict(_settings)
+
+
+def dropped_records():
+    return _DroppingQueueHandler.dropped
+
+
+def update_settings(level=None, payloads=None, sample_rate=None):
+    """Change logging in this process now and, through the control file, in every worker"""
+    changes = _validated(
+        {k: v for k, v in (("level", level), ("payloads", payloads), ("sample_rate", sample_rate)) if v is not None}
+    )
+    new_settings = {**_settings, **changes}
+    _apply(new_settings)
+    os.makedirs(os.path.dirname(_control_file) or ".", exist_ok=True)
+    temporary = f"{_control_file}.{os.getpid()}.tmp"
+    with open(temporary, "w") as f:
+        json.dump(new_settings, f)
+    os.replace(temporary, _control_file)
+    return settings()
+
+
+def _validated(changes):
+    """Normalized copy of settings changes; raises ValueError for a value that isn't valid"""
+    validated = {}
+    if "level" in changes:
+        level = str(changes["level"]).upper()
+        if not isinstance(logging.getLevelName(level), int):
+            raise ValueError(f"Unknown log level: {changes['level']}")
+        validated["level"] = level
+    if "payloads" in changes:
+        if not isinstance(changes["payloads"], bool):
+            raise ValueError(f"payloads must be true or false, not {changes['payloads']!r}")
+        validated["payloads"] = changes["payloads"]
+    if "sample_rate" in changes:
+        try:
+            if isinstance(changes["sample_rate"], bool):
+                raise TypeError
+            rate = float(changes["sample_rate"])
+        except (TypeError, ValueError):
+            raise ValueError(f"sample rate must be a number, not {changes['sample_rate']!r}") from None
+        # Also rejects NaN
+        if not 0 <= rate <= 1:
+            raise ValueError(f"sample rate must be between 0 and 1, not {rate}")
+        validated["sample_rate"] = rate
+    return validated
+
+
+def _apply(new_settings):
+    # setLevel rejects unknown levels before anything is changed
+    logging.getLogger(ROOT).setLevel(new_settings.get("level", _settings["level"]))
+    _settings.update(new_settings)
+
+
+def _watch_control_file(interval=2.0):
+    last_modified = None
+    while True:
+        last_modified = _check_control_file(last_modified)
+        time.sleep(interval)
+
+
+def _check_control_file(last_modified):
+    """Apply the control file if it changed since last_modified; returns its new mtime"""
+    modified = last_modified
+    try:
+        modified = os.stat(_control_file).st_mtime
+        if modified == last_modified:
+            return modified
+        if modified < _started:
+            if last_modified is None:
+                logging.getLogger(ROOT).info("Ignoring %s, written before the server started", _control_file)
+            return modified
+        with open(_control_file) as f:
+            stored = json.load(f)
+        if not isinstance(stored, dict):
+            raise ValueError("not a JSON object")
+        # Validated again: the file can be edited by hand or by an older version
+        _apply(_validated({k: v for k, v in stored.items() if k in _settings}))
+        return modified
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logging.getLogger(ROOT).warning("Ignoring unreadable %s: %s", _control_file, e)
+        return modified
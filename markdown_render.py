@@ -0,0 +1,45 @@
+"""Markdown rendering for /render-resolution.
+
+Each thread keeps one markdown.Markdown converter and resets it between
+documents instead of building a new one (and loading its extensions) per
+request. Rendered HTML is cached by the SHA-256 of the markdown, which is
+also the ETag, so clients re-rendering the same resolution (refresh, share,
+print) get it from the cache or as a 304 without rendering at all.
+"""
+import hashlib
+import os
+
+from cache import ByteLRUCache
+from cooperative import thread_local
+
+_local = thread_local()
+
+render_cache = ByteLRUCache(
+    max_bytes=int(os.getenv("RENDER_CACHE_BYTES", 16 * 1024 * 1024)),
+    size_of=lambda html: len(html.encode("utf-8")),
+)
+
+
+def _converter():
+    converter = getattr(_local, "converter", None)
+    if converter is None:
+        # Imported on first use, like the converter, to keep it out of startup
+        import markdown
+
+        converter = _local.converter = markdown.Markdown()
+    return converter
+
+
+def content_hash(markdown_text):
+    """The cache key and ETag of a markdown document"""
+    return hashlib.sha256(markdown_text.encode("utf-8")).hexdigest()
+
+
+def render(markdown_text, digest=None):
+    """HTML for the markdown, from the cache when this text was rendered before"""
+    digest = digest or content_hash(markdown_text)
+    html = render_cache.get(digest)
+    if html is None:
+        html = _converter().reset().convert(markdown_text)
+        render_cache.set(digest, html)
+    return html
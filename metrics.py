@@ -0,0 +1,205 @@
+"""Latency histograms served in the Prometheus text format.
+
+Code under a request times its stages with span():
+
+    with metrics.span("thread_create"):
+        thread = client.beta.threads.create(...)
+
+Each span is recorded under the endpoint handling the current request (set
+once per request with set_endpoint, and carried across threads and
+coroutines by a context variable), so /metrics shows how long every stage of
+every endpoint takes.
+
+Metrics are kept per process: with several gunicorn workers each scrape of
+/metrics reports the worker that answered it (see resolutionpal_process_pid).
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_endpoint = ContextVar("endpoint", default="other")
+_registry = []
+_in_flight = 0
+_in_flight_lock = threading.Lock()
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series["buckets"]):
+                    lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', bound)])} {count}")
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', '+Inf')])} {series['count']}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {series['sum']}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {series['count']}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._series.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Gauge:
+    """A value read when /metrics is scraped; read() returns a number or {label_value: number}"""
+
+    def __init__(self, name, documentation, read, labelname=None):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+        self.labelname = labelname
+        _registry.append(self)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        value = self.read()
+        if isinstance(value, dict):
+            for label, number in sorted(value.items()):
+                lines.append(f"{self.name}{_labels((self.labelname,), (label,))} {number}")
+        else:
+            lines.append(f"{self.name} {value}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram(
+    "resolutionpal_request_seconds",
+    "Time to handle a request, by endpoint and status code",
+    ("endpoint", "status"),
+)
+STAGE_SECONDS = Histogram(
+    "resolutionpal_stage_seconds",
+    "Time spent in each stage of an endpoint",
+    ("endpoint", "stage"),
+)
+RUN_POLLS = Histogram(
+    "resolutionpal_run_polls",
+    "Status polls needed before a run finished (0 when it was streamed)",
+    ("endpoint", "mode"),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34),
+)
+PROMPT_TOKENS = Counter(
+    "resolutionpal_openai_prompt_tokens_total",
+    "Input tokens sent to OpenAI, by endpoint and whether the prompt cache served them",
+    ("endpoint", "cache"),
+)
+CONTEXT_TOKENS = Counter(
+    "resolutionpal_context_tokens_total",
+    "Estimated transcript tokens of compacted calls, before and after compaction",
+    ("endpoint", "stage"),
+)
+Gauge("resolutionpal_process_pid", "The worker process reporting these metrics", os.getpid)
+Gauge("resolutionpal_process_start_time_seconds", "When this worker process started", lambda start=time.time(): start)
+Gauge("resolutionpal_requests_in_flight", "Requests this worker is handling right now", lambda: _in_flight)
+
+
+def set_endpoint(name):
+    """Label the rest of this request's (or job's) spans with name"""
+    _endpoint.set(name)
+
+
+def current_endpoint():
+    return _endpoint.get()
+
+
+@contextmanager
+def span(stage):
+    """Time a block as a stage of the current endpoint"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, endpoint=_endpoint.get(), stage=stage)
+
+
+def request_started():
+    global _in_flight
+    with _in_flight_lock:
+        _in_flight += 1
+
+
+def request_finished():
+    global _in_flight
+    with _in_flight_lock:
+        _in_flight -= 1
+
+
+def observe_request(seconds, status):
+    REQUEST_SECONDS.observe(seconds, endpoint=_endpoint.get(), status=status)
+
+
+def observe_run(polls, streamed):
+    RUN_POLLS.observe(polls, endpoint=_endpoint.get(), mode="stream" if streamed else "poll")
+
+
+def observe_prompt_tokens(prompt_tokens, cached_tokens):
+    endpoint = _endpoint.get()
+    PROMPT_TOKENS.inc(cached_tokens, endpoint=endpoint, cache="hit")
+    PROMPT_TOKENS.inc(prompt_tokens - cached_tokens, endpoint=endpoint, cache="miss")
+
+
+def observe_compaction(tokens_before, tokens_after):
+    endpoint = _endpoint.get()
+    CONTEXT_TOKENS.inc(tokens_before, endpoint=endpoint, stage="before")
+    CONTEXT_TOKENS.inc(tokens_after, endpoint=endpoint, stage="after")
+
+
+def render():
+    """Every metric in the Prometheus text exposition format"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,139 @@
+"""HTTP connection pools for the OpenAI clients.
+
+Each process keeps one pool per client (sync, and async in ASGI mode), shared
+by every request, so the many calls an interview makes reuse warm TLS
+connections instead of opening new ones. Pool size, keep-alive, HTTP/2 and
+the connect/read/write/pool timeouts come from OPENAI_* environment
+variables; the total time a request may take across retries is enforced by
+the rate governor (OPENAI_TOTAL_TIMEOUT). With OPENAI_CASSETTE set, traffic
+is recorded to or replayed from a cassette beneath the governor (see
+cassette.py).
+
+pool_stats() reports, per pool, how many connections are open and idle and
+how many requests reused a connection rather than opening one, for sizing
+OPENAI_POOL_MAX_CONNECTIONS against the number of workers.
+"""
+import os
+import threading
+import weakref
+
+from openai import DefaultAsyncHttpxClient, DefaultHttpxClient
+
+from cassette import wrap_async_transport, wrap_transport
+from rate_governor import AsyncGovernedTransport, GovernedTransport
+
+try:
+    import httpx
+except ImportError:  # newer openai releases depend on httpx2 instead
+    import httpx2 as httpx
+
+_transports = []
+
+
+def pool_settings():
+    """Pool limits, timeouts and protocol from the environment"""
+    return {
+        "limits": httpx.Limits(
+            max_connections=int(os.getenv("OPENAI_POOL_MAX_CONNECTIONS", 100)),
+            max_keepalive_connections=int(os.getenv("OPENAI_POOL_MAX_KEEPALIVE", 20)),
+            keepalive_expiry=float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", 30)),
+        ),
+        "timeout": httpx.Timeout(
+            connect=float(os.getenv("OPENAI_CONNECT_TIMEOUT", 5)),
+            read=float(os.getenv("OPENAI_READ_TIMEOUT", 60)),
+            write=float(os.getenv("OPENAI_WRITE_TIMEOUT", 30)),
+            pool=float(os.getenv("OPENAI_POOL_TIMEOUT", 10)),
+        ),
+        # Needs the h2 package (pip install "httpx[http2]")
+        "http2": os.getenv("OPENAI_HTTP2", "false").lower() in ("1", "true", "yes"),
+    }
+
+
+class _PoolCounter:
+    """Counts requests and newly opened connections for one pool"""
+
+    def __init__(self, name, transport):
+        self.name = name
+        self.transport = transport
+        self.requests = 0
+        self.opened = 0
+        self._seen = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def _connections(self):
+        # httpx keeps its connection pool private; report nothing rather than fail
+        return list(getattr(getattr(self.transport, "_pool", None), "connections", []))
+
+    def count(self):
+        with self._lock:
+            self.requests += 1
+            for connection in self._connections():
+                if connection not in self._seen:
+                    self._seen.add(connection)
+                    self.opened += 1
+
+    def stats(self):
+        connections = self._connections()
+        return {
+            "client": self.name,
+            "open": len(connections),
+            "idle": sum(1 for c in connections if c.is_idle()),
+            "http2": sum(1 for c in connections if "HTTP/2" in c.info()),
+            "requests": self.requests,
+            "connections_opened": self.opened,
+            "reused": max(0, self.requests - self.opened),
+        }
+
+
+class CountingTransport(httpx.BaseTransport):
+    def __init__(self, transport, name="sync"):
+        self._transport = transport
+        self.counter = _PoolCounter(name, transport)
+        _transports.append(self.counter)
+
+    def handle_request(self, request):
+        response = self._transport.handle_request(request)
+        self.counter.count()
+        return response
+
+    def close(self):
+        self._transport.close()
+
+
+class AsyncCountingTransport(httpx.AsyncBaseTransport):
+    def __init__(self, transport, name="async"):
+        self._transport = transport
+        self.counter = _PoolCounter(name, transport)
+        _transports.append(self.counter)
+
+    async def handle_async_request(self, request):
+        response = await self._transport.handle_async_request(request)
+        self.counter.count()
+        return response
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+def create_http_client(governor):
+    """The sync OpenAI client's HTTP client: pooled, counted and governed"""
+    settings = pool_settings()
+    pool = httpx.HTTPTransport(http2=settings["http2"], limits=settings["limits"])
+    return DefaultHttpxClient(
+        transport=GovernedTransport(governor, wrap_transport(CountingTransport(pool))),
+        timeout=settings["timeout"],
+    )
+
+
+def create_async_http_client(governor):
+    """The async OpenAI client's HTTP client: pooled, counted and governed"""
+    settings = pool_settings()
+    pool = httpx.AsyncHTTPTransport(http2=settings["http2"], limits=settings["limits"])
+    return DefaultAsyncHttpxClient(
+        transport=AsyncGovernedTransport(governor, wrap_async_transport(AsyncCountingTransport(pool))),
+        timeout=settings["timeout"],
+    )
+
+
+def pool_stats():
+    return [counter.stats() for counter in _transports]
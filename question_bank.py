@@ -0,0 +1,111 @@
+"""Precomputed interview questions served without a model call.
+
+The bank is built offline by build_question_bank.py and stored as gzipped
+JSON. Each resolution focus has a small tree of validated questions:
+
+    {"version": 1, "categories": {"<resolution type>": [node, ...]}}
+
+where node 0 is the first question and each node is
+
+    {"q": {"type": ..., "text": ..., "options": [...]},
+     "next": {"<normalized answer>": node_index, "*": node_index}}
+
+"*" is followed for any answer that has no branch of its own. A node
+without a matching branch (typically a TEXT question) ends the bank's part
+of the interview and the model takes over.
+
+A session's place in the tree is found by walking its transcript, so no
+extra per-session state is needed.
+"""
+import gzip
+import json
+import os
+import re
+
+BANK_VERSION = 1
+
+
+def normalize_answer(text):
+    return re.sub(r"\s+", " ", str(text or "")).strip().lower()
+
+
+def normalize_category(resolution_type):
+    return normalize_answer(resolution_type)
+
+
+class QuestionBank:
+    def __init__(self, categories):
+        self.categories = categories
+        # Sessions are matched to a category by the first question they were asked
+        self._by_first_question = {}
+        for category, nodes in categories.items():
+            if nodes:
+                self._by_first_question.setdefault(nodes[0]["q"]["text"], []).append(category)
+
+    @classmethod
+    def load(cls, path):
+        """Load a bank file, or return None if it doesn't exist"""
+        if not path or not os.path.exists(path):
+            return None
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != BANK_VERSION:
+            raise ValueError(f"Unsupported question bank version: {data.get('version')}")
+        return cls(data["categories"])
+
+    def save(self, path, **metadata):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            json.dump(
+                {"version": BANK_VERSION, **metadata, "categories": self.categories},
+                f,
+                separators=(",", ":"),
+            )
+
+    def first_question(self, resolution_type):
+        nodes = self.categories.get(normalize_category(resolution_type))
+        return nodes[0]["q"] if nodes else None
+
+    def next_question(self, transcript):
+        """Return the bank's next question for a transcript ending in an answer.
+
+        transcript is the session's messages, oldest first: the initial user
+        message, then alternating questions (JSON) and answers. Returns None
+        once the interview has left the bank.
+        """
+        questions = [m["content"] for m in transcript[1:] if m["role"] == "assistant"]
+        answers = [m["content"] for m in transcript[1:] if m["role"] == "user"]
+        if not questions or len(answers) != len(questions):
+            return None
+
+        try:
+            first_text = json.loads(questions[0])["text"]
+        except (ValueError, KeyError, TypeError):
+            return None
+
+        for category in self._by_first_question.get(first_text, []):
+            question = self._walk(self.categories[category], questions, answers)
+            if question is not None:
+                return question
+        return None
+
+    def _walk(self, nodes, questions, answers):
+        node = nodes[0]
+        for asked, answer in zip(questions, answers):
+            try:
+                if json.loads(asked)["text"] != node["q"]["text"]:
+                    return None
+            except (ValueError, KeyError, TypeError):
+                return None
+            branches = node.get("next", {})
+            index = branches.get(normalize_answer(answer), branches.get("*"))
+            if index is None:
+                return None
+            node = nodes[index]
+        return node["q"]
+
+    def stats(self):
+        return {
+            "categories": len(self.categories),
+            "questions": sum(len(nodes) for nodes in self.categories.values()),
+        }
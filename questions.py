@@ -0,0 +1,136 @@
+"""Interview question models, the JSON schema questions are requested with,
+and the parser for question replies.
+
+Question runs and completions ask for QUESTION_RESPONSE_FORMAT, a strict
+JSON schema derived from the QuestionChoice/QuestionYesNo/QuestionText
+models, so replies normally validate in a single pass of the compiled
+validator (pydantic-core parses and validates the JSON together). Replies
+that don't match get the lenient treatment the app always had; only when
+that fails too is the reply treated as malformed (see app.repaired_question).
+"""
+import re
+from typing import Annotated, List, Literal, Optional, Union, get_args
+
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
+
+import fast_json
+import logs
+
+log = logs.get_logger("questions")
+
+
+class Question(BaseModel):
+    type: str = Field(..., description="Question type: TEXT, CHOICE, or YES/NO")
+    text: str = Field(..., description="The question text")
+    options: Optional[List[str]] = Field(default=None, description="Options for CHOICE questions")
+
+class QuestionChoice(BaseModel):
+    type: Literal["CHOICE"]
+    text: str
+    options: List[str]
+
+class QuestionYesNo(BaseModel):
+    type: Literal["YES/NO"]
+    text: str
+
+class QuestionText(BaseModel):
+    type: Literal["TEXT"]
+    text: str
+
+QUESTION_VARIANTS = (QuestionChoice, QuestionYesNo, QuestionText)
+QUESTION_TYPES = [get_args(model.model_fields["type"].annotation)[0] for model in QUESTION_VARIANTS]
+
+QUESTION_VALIDATOR = TypeAdapter(
+    Annotated[Union[QUESTION_VARIANTS], Field(discriminator="type")]
+)
+
+
+def question_schema():
+    """One strict object schema covering every question variant.
+
+    Strict mode needs every property required and a single object at the
+    root, so the variants are merged: `type` is one of their literals and
+    `options` is null unless the question is a CHOICE.
+    """
+    return {
+        "type": "object",
+        "properties": {
+            "type": {"type": "string", "enum": QUESTION_TYPES},
+            "text": {"type": "string", "description": Question.model_fields["text"].description},
+            "options": {
+                "type": ["array", "null"],
+                "items": {"type": "string"},
+                "description": "Options for CHOICE questions, null otherwise",
+            },
+        },
+        "required": ["type", "text", "options"],
+        "additionalProperties": False,
+    }
+
+
+QUESTION_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "interview_question", "strict": True, "schema": question_schema()},
+}
+
+JSON_OBJECT = re.compile(r"\{.*\}", re.S)
+
+
+def format_question_data(data: dict) -> dict:
+    """Format and validate question data to ensure consistent structure."""
+    formatted = {
+        "type": str(data.get("type") or "TEXT").upper(),
+        "text": data.get("text") or data.get("question", ""),
+        "options": data.get("options", None)
+    }
+
+    # Clean up the type
+    if formatted["type"] not in QUESTION_TYPES:
+        formatted["type"] = "TEXT"
+
+    # Ensure text is a string
+    formatted["text"] = str(formatted["text"]).strip()
+
+    # Handle options for CHOICE type
+    if formatted["type"] == "CHOICE" and not formatted["options"]:
+        formatted["type"] = "TEXT"  # Fallback to TEXT if no options provided
+
+    # Clean up options if present
+    if formatted["options"]:
+        formatted["options"] = [str(opt).strip() for opt in formatted["options"]]
+
+    return formatted
+
+
+def lenient_question_data(raw_text):
+    """The first JSON object in the reply (e.g. inside a code fence), or None"""
+    match = JSON_OBJECT.search(raw_text)
+    if not match:
+        return None
+    try:
+        data = fast_json.loads(match.group(0))
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def text_question(raw_text):
+    """The last resort for a malformed reply: show it as a free-text question"""
+    return {"type": "TEXT", "text": raw_text.strip(), "options": None}
+
+
+def parse_question(raw_text: str) -> Optional[dict]:
+    """Turn a question reply into a validated question dict, or None if it is malformed"""
+    log.debug("Raw question response: %s", logs.payload(raw_text))
+    try:
+        question = QUESTION_VALIDATOR.validate_json(raw_text)
+        data = {"type": question.type, "text": question.text, "options": getattr(question, "options", None)}
+    except ValidationError:
+        data = lenient_question_data(raw_text)
+        if data is None:
+            return None
+
+    formatted = format_question_data(data)
+    if not formatted["text"]:
+        return None
+    return Question(**formatted).model_dump()
@@ -0,0 +1,423 @@
+"""Admission control for outbound OpenAI requests.
+
+Every request the OpenAI clients send goes through a governed HTTP transport
+that, in order:
+
+- fails fast with a local 503 while the circuit breaker is open, i.e. after
+  several consecutive upstream failures, until a cooldown has passed;
+- takes a token from a rate bucket kept in a SQLite file, so every worker
+  process on the machine shares one request rate (only when a rate is set);
+- waits for one of a limited number of in-flight slots for that endpoint,
+  and holds it until the response body is closed, so a streamed run counts
+  for as long as it streams;
+- retries with jittered exponential backoff, honouring Retry-After: 429s
+  and connection errors (nothing was sent) always, and 5xx responses and
+  errors after the request went out only when repeating it is safe (GET and
+  the like, or an Idempotency-Key header). A POST that creates a message or
+  a run may already have done so when its response is lost, so it is not
+  sent again. A 429's Retry-After also pauses the shared bucket, so the
+  other workers back off too instead of all retrying at once.
+
+The SDK's own retries are turned off for governed clients so requests
+aren't retried twice.
+"""
+import asyncio
+import os
+import random
+import re
+import threading
+import time
+
+try:
+    import httpx
+except ImportError:  # newer openai releases depend on httpx2 instead
+    import httpx2 as httpx
+
+import logs
+from cooperative import SQLiteFile
+
+log = logs.get_logger("openai")
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRY_AFTER = 60
+# Sending these again can't create anything twice
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+# Raised before any of the request was sent
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+# Path segments that are object IDs, e.g. /v1/threads/thread_abc/runs/run_def
+ID_SEGMENT = re.compile(r"^(thread|run|msg|asst|step|call|file|vs|chatcmpl)_")
+
+
+def endpoint_name(request):
+    """Group requests by API resource, ignoring object IDs"""
+    segments = [s for s in request.url.path.split("/") if s and s != "v1"]
+    return "/".join(s for s in segments if not ID_SEGMENT.match(s)) or "/"
+
+
+def retry_after(response):
+    """Seconds the server asked us to wait, if it said"""
+    for header, divisor in (("retry-after-ms", 1000), ("retry-after", 1)):
+        value = response.headers.get(header)
+        if value:
+            try:
+                return float(value) / divisor
+            except ValueError:
+                pass
+    return None
+
+
+def safe_to_repeat(request):
+    return request.method in IDEMPOTENT_METHODS or "idempotency-key" in request.headers
+
+
+def local_error(request, status, message):
+    """A response in OpenAI's error format for requests refused before sending"""
+    return httpx.Response(
+        status,
+        json={"error": {"message": message, "type": "local_admission_control"}},
+        request=request,
+    )
+
+
+class _SlotReleasingStream(httpx.SyncByteStream):
+    """A response body that gives back its concurrency slot when closed"""
+
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            release, self._release = self._release, None
+            if release is not None:
+                release()
+
+
+class _AsyncSlotReleasingStream(httpx.AsyncByteStream):
+    """Async version of _SlotReleasingStream"""
+
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            release, self._release = self._release, None
+            if release is not None:
+                release()
+
+
+class SharedTokenBucket:
+    """A token bucket whose state lives in SQLite, shared across processes"""
+
+    def __init__(self, path, rate_per_minute, burst=None):
+        self.path = path
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(burst or max(1, rate_per_minute // 10))
+        self._sqlite = SQLiteFile(path)
+        db = self._sqlite.connect()
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS token_bucket ("
+            "name TEXT PRIMARY KEY, tokens REAL NOT NULL, "
+            "updated_at REAL NOT NULL, paused_until REAL NOT NULL)"
+        )
+        db.execute(
+            "INSERT OR IGNORE INTO token_bucket VALUES ('openai', ?, ?, 0)",
+            (self.capacity, time.time()),
+        )
+
+    def take(self):
+        """Take a token; returns 0 on success or the seconds to wait before trying again"""
+        with self._sqlite.transaction() as db:
+            now = time.time()
+            tokens, updated_at, paused_until = db.execute(
+                "SELECT tokens, updated_at, paused_until FROM token_bucket WHERE name = 'openai'"
+            ).fetchone()
+            tokens = min(self.capacity, tokens + max(0.0, now - updated_at) * self.rate)
+            if now < paused_until:
+                wait = paused_until - now
+            elif tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / self.rate
+            db.execute(
+                "UPDATE token_bucket SET tokens = ?, updated_at = ? WHERE name = 'openai'",
+                (tokens, now),
+            )
+        return wait
+
+    def pause(self, seconds):
+        """Stop every process taking tokens for a while"""
+        self._sqlite.connect().execute(
+            "UPDATE token_bucket SET paused_until = MAX(paused_until, ?) WHERE name = 'openai'",
+            (time.time() + seconds,),
+        )
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures; lets one trial request through after a cooldown"""
+
+    def __init__(self, threshold=5, cooldown=30):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.cooldown or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.failures >= self.threshold:
+                if self.opened_at is None:
+                    log.error("OpenAI circuit breaker opened after %d consecutive failures", self.failures)
+                self.opened_at = time.monotonic()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "open" if time.monotonic() - self.opened_at < self.cooldown else "half-open"
+
+
+class RateGovernor:
+    """Policy shared by the sync and async governed transports"""
+
+    def __init__(self, bucket=None, max_concurrency=8, max_retries=3, breaker=None,
+                 slot_timeout=30, backoff_base=0.5, backoff_max=8.0, total_timeout=None):
+        self.bucket = bucket
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.breaker = breaker or CircuitBreaker()
+        self.slot_timeout = slot_timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # Upper bound on one request's attempts and backoff combined
+        self.total_timeout = total_timeout
+        self._slots = {}
+        self._lock = threading.Lock()
+
+    def slot(self, endpoint):
+        with self._lock:
+            if endpoint not in self._slots:
+                self._slots[endpoint] = threading.BoundedSemaphore(self.max_concurrency)
+            return self._slots[endpoint]
+
+    def backoff(self, attempt, response=None, started=None):
+        """Delay before the next attempt: the server's Retry-After, else full jitter"""
+        delay = None
+        if response is not None:
+            delay = retry_after(response)
+            if delay is not None:
+                delay = min(delay, MAX_RETRY_AFTER)
+                if response.status_code == 429 and self.bucket is not None:
+                    self.bucket.pause(delay)
+        if delay is None:
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if self.total_timeout and started is not None:
+            delay = min(delay, max(0.0, started + self.total_timeout - time.monotonic()))
+        return delay
+
+    def should_retry(self, attempt, request, response=None, error=None, started=None):
+        """Whether to send request again after a retryable response or a transport error"""
+        if response is not None:
+            if response.status_code not in RETRY_STATUSES:
+                return False
+            # A 429 was refused unprocessed; a 5xx may have been processed
+            if response.status_code != 429 and not safe_to_repeat(request):
+                return False
+        elif not isinstance(error, UNSENT_ERRORS) and not safe_to_repeat(request):
+            return False
+        if self.breaker.state == "open":
+            return False
+        if self.total_timeout and started is not None and time.monotonic() - started >= self.total_timeout:
+            return False
+        return attempt < self.max_retries
+
+    def record(self, response=None):
+        """Feed the breaker: 5xx and connection errors count as upstream failures"""
+        if response is None or response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def stats(self):
+        return {
+            "breaker": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "endpoints": sorted(self._slots),
+        }
+
+
+class GovernedTransport(httpx.BaseTransport):
+    """Sync transport applying a RateGovernor to every request"""
+
+    def __init__(self, governor, transport=None):
+        self.governor = governor
+        self._transport = transport or httpx.HTTPTransport()
+
+    def handle_request(self, request):
+        governor = self.governor
+        endpoint = endpoint_name(request)
+        attempt = 0
+        started = time.monotonic()
+        while True:
+            if not governor.breaker.allow():
+                return local_error(request, 503, "OpenAI is failing; not sending requests for a while")
+            while governor.bucket is not None:
+                wait = governor.bucket.take()
+                if not wait:
+                    break
+                time.sleep(wait)
+
+            slot = governor.slot(endpoint)
+            if not slot.acquire(timeout=governor.slot_timeout):
+                return local_error(request, 429, f"Too many concurrent OpenAI requests to {endpoint}")
+            try:
+                response = self._transport.handle_request(request)
+            except httpx.TransportError as e:
+                slot.release()
+                governor.record()
+                if not governor.should_retry(attempt, request, error=e, started=started):
+                    raise
+                log.warning("OpenAI %s request failed (%s), retrying", endpoint, e.__class__.__name__)
+                response = None
+            except BaseException:
+                slot.release()
+                raise
+            else:
+                if response.is_closed:
+                    # Built from content already in memory; close() won't be called
+                    slot.release()
+                else:
+                    response.stream = _SlotReleasingStream(response.stream, slot.release)
+
+            if response is not None:
+                governor.record(response)
+                if not governor.should_retry(attempt, request, response, started=started):
+                    return response
+                log.warning("OpenAI %s returned %d, retrying", endpoint, response.status_code)
+                response.read()
+                response.close()
+            time.sleep(governor.backoff(attempt, response, started))
+            attempt += 1
+
+    def close(self):
+        self._transport.close()
+
+
+class AsyncGovernedTransport(httpx.AsyncBaseTransport):
+    """Async transport applying a RateGovernor to every request"""
+
+    def __init__(self, governor, transport=None):
+        self.governor = governor
+        self._transport = transport or httpx.AsyncHTTPTransport()
+        self._slots = {}
+
+    def slot(self, endpoint):
+        if endpoint not in self._slots:
+            self._slots[endpoint] = asyncio.Semaphore(self.governor.max_concurrency)
+        return self._slots[endpoint]
+
+    async def handle_async_request(self, request):
+        governor = self.governor
+        endpoint = endpoint_name(request)
+        attempt = 0
+        started = time.monotonic()
+        while True:
+            if not governor.breaker.allow():
+                return local_error(request, 503, "OpenAI is failing; not sending requests for a while")
+            while governor.bucket is not None:
+                # The bucket may wait on another process's SQLite lock; keep that off the loop
+                wait = await asyncio.to_thread(governor.bucket.take)
+                if not wait:
+                    break
+                await asyncio.sleep(wait)
+
+            slot = self.slot(endpoint)
+            try:
+                await asyncio.wait_for(slot.acquire(), governor.slot_timeout)
+            except asyncio.TimeoutError:
+                return local_error(request, 429, f"Too many concurrent OpenAI requests to {endpoint}")
+            try:
+                response = await self._transport.handle_async_request(request)
+            except httpx.TransportError as e:
+                slot.release()
+                governor.record()
+                if not governor.should_retry(attempt, request, error=e, started=started):
+                    raise
+                log.warning("OpenAI %s request failed (%s), retrying", endpoint, e.__class__.__name__)
+                response = None
+            except BaseException:
+                slot.release()
+                raise
+            else:
+                if response.is_closed:
+                    # Built from content already in memory; close() won't be called
+                    slot.release()
+                else:
+                    response.stream = _AsyncSlotReleasingStream(response.stream, slot.release)
+
+            if response is not None:
+                governor.record(response)
+                if not governor.should_retry(attempt, request, response, started=started):
+                    return response
+                log.warning("OpenAI %s returned %d, retrying", endpoint, response.status_code)
+                await response.aread()
+                await response.aclose()
+            await asyncio.sleep(governor.backoff(attempt, response, started))
+            attempt += 1
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+def create_rate_governor(default_db_path):
+    """Build the governor configured by the OPENAI_* environment variables"""
+    rate = int(os.getenv("OPENAI_RPM", 0))
+    bucket = None
+    if rate > 0:
+        bucket = SharedTokenBucket(
+            os.getenv("OPENAI_RATE_DB", default_db_path),
+            rate,
+            burst=int(os.getenv("OPENAI_BURST", 0)) or None,
+        )
+    return RateGovernor(
+        bucket=bucket,
+        max_concurrency=int(os.getenv("OPENAI_MAX_CONCURRENCY", 8)),
+        max_retries=int(os.getenv("OPENAI_MAX_RETRIES", 3)),
+        breaker=CircuitBreaker(
+            threshold=int(os.getenv("OPENAI_BREAKER_THRESHOLD", 5)),
+            cooldown=float(os.getenv("OPENAI_BREAKER_COOLDOWN", 30)),
+        ),
+        total_timeout=float(os.getenv("OPENAI_TOTAL_TIMEOUT", 120)) or None,
+    )
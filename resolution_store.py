@@ -0,0 +1,196 @@
+"""Finished resolutions, stored by content hash and served as permalink pages.
+
+A resolution is sanitized (the same tags and attributes the browser keeps
+with DOMPurify) and stored in SQLite under the hash of its content, so
+saving the same plan twice gives the same permalink. The page for a
+permalink is rendered on its first view, and stored alongside the
+resolution with gzip and (when the brotli package is installed) brotli
+variants and a strong ETag per variant. Later views, from any worker, are
+served from those bytes; a small in-process LRU keeps the hottest pages
+out of SQLite too. Pages link fingerprinted static files, so each is stored
+for the static build it was rendered with and rendered again after a new
+build.
+"""
+import gzip
+import hashlib
+import os
+import time
+from html import escape
+from html.parser import HTMLParser
+
+from cache import ByteLRUCache
+from cooperative import SQLiteFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ALLOWED_TAGS = {"div", "h1", "h2", "h3", "p", "ul", "li", "b", "a", "br", "span"}
+VOID_TAGS = {"br"}
+DROP_CONTENT_TAGS = {"script", "style", "iframe", "object", "embed", "template"}
+SAFE_URL_SCHEMES = ("http://", "https://", "mailto:")
+
+
+class _Sanitizer(HTMLParser):
+    """Keep allowed tags (class on any, href on links), escape all text"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.out = []
+        self.open_tags = []
+        self.dropping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROP_CONTENT_TAGS:
+            self.dropping += 1
+            return
+        if self.dropping or tag not in ALLOWED_TAGS:
+            return
+        kept = [f' class="{escape(value or "")}"' for name, value in attrs if name == "class"]
+        if tag == "a":
+            href = dict(attrs).get("href") or ""
+            if href.strip().lower().startswith(SAFE_URL_SCHEMES):
+                kept.append(f' href="{escape(href.strip())}"')
+            kept.append(' target="_blank" rel="noopener noreferrer"')
+        self.out.append(f"<{tag}{''.join(kept)}>")
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag in self.open_tags and tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in DROP_CONTENT_TAGS:
+            self.dropping = max(self.dropping - 1, 0)
+            return
+        if self.dropping or tag not in self.open_tags:
+            return
+        while self.open_tags:
+            open_tag = self.open_tags.pop()
+            self.out.append(f"</{open_tag}>")
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        if not self.dropping:
+            self.out.append(escape(data, quote=False))
+
+    def result(self):
+        self.close()
+        return "".join(self.out) + "".join(f"</{tag}>" for tag in reversed(self.open_tags))
+
+
+def sanitize_resolution(resolution):
+    """The resolution HTML as the browser would display it, minus anything unsafe"""
+    # The frontend decodes entity-escaped markup before sanitizing; do the same
+    decoded = (
+        resolution.replace("\\*", "*")
+        .replace("&lt;", "<")
+        .replace("&gt;", ">")
+        .replace("&quot;", '"')
+        .replace("&#39;", "'")
+        .replace("&amp;", "&")
+    )
+    sanitizer = _Sanitizer()
+    sanitizer.feed(decoded)
+    return sanitizer.result()
+
+
+def resolution_id(content):
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:32]
+
+
+def encode_variants(page):
+    """The page's bytes per content coding, each with its strong ETag"""
+    raw = page.encode("utf-8")
+    digest = hashlib.sha256(raw).hexdigest()[:32]
+    variants = {
+        "identity": (raw, digest),
+        "gzip": (gzip.compress(raw, compresslevel=9, mtime=0), f"{digest}-gz"),
+    }
+    if brotli is not None:
+        variants["br"] = (brotli.compress(raw, quality=11), f"{digest}-br")
+    return variants
+
+
+class ResolutionStore:
+    """Resolutions and their rendered pages in a SQLite file shared by every worker"""
+
+    def __init__(self, path, page_cache_bytes=8 * 1024 * 1024):
+        self.path = path
+        self._sqlite = SQLiteFile(path)
+        self._pages = ByteLRUCache(
+            max_bytes=page_cache_bytes,
+            size_of=lambda variants: sum(len(body) for body, _ in variants.values()),
+        )
+        db = self._sqlite.connect()
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS resolutions ("
+            "id TEXT PRIMARY KEY, content TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        columns = [row[1] for row in db.execute("PRAGMA table_info(resolution_pages)")]
+        if columns and "build" not in columns:
+            # Pages stored before they were kept per build; they are rendered again
+            db.execute("DROP TABLE resolution_pages")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS resolution_pages ("
+            "id TEXT NOT NULL, coding TEXT NOT NULL, body BLOB NOT NULL, etag TEXT NOT NULL, "
+            "build TEXT NOT NULL, PRIMARY KEY (id, coding))"
+        )
+
+    def save(self, resolution):
+        """Store a finished resolution and return its ID (the same for the same content)"""
+        content = sanitize_resolution(resolution)
+        key = resolution_id(content)
+        self._sqlite.connect().execute(
+            "INSERT OR IGNORE INTO resolutions (id, content, created_at) VALUES (?, ?, ?)",
+            (key, content, time.time()),
+        )
+        return key
+
+    def content(self, key):
+        """The stored (sanitized) resolution HTML, or None"""
+        row = self._sqlite.connect().execute("SELECT content FROM resolutions WHERE id = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def page(self, key, render, build=""):
+        """{coding: (body, etag)} for the resolution's page, or None if it isn't stored.
+
+        render(content) builds the page HTML; it is only called the first time
+        the page is requested with this static build.
+        """
+        variants = self._pages.get((key, build))
+        if variants is not None:
+            return variants
+
+        rows = self._sqlite.connect().execute(
+            "SELECT coding, body, etag FROM resolution_pages WHERE id = ? AND build = ?", (key, build)
+        ).fetchall()
+        if rows:
+            variants = {coding: (bytes(body), etag) for coding, body, etag in rows}
+        else:
+            content = self.content(key)
+            if content is None:
+                return None
+            variants = encode_variants(render(content))
+            # Replaces the page of an earlier build
+            self._sqlite.connect().executemany(
+                "INSERT OR REPLACE INTO resolution_pages (id, coding, body, etag, build) VALUES (?, ?, ?, ?, ?)",
+                [(key, coding, body, etag, build) for coding, (body, etag) in variants.items()],
+            )
+        self._pages.set((key, build), variants)
+        return variants
+
+    def stats(self):
+        return {"page_cache": self._pages.stats()}
+
+
+def create_resolution_store(default_path):
+    """Build the store at RESOLUTION_DB (default_path when unset)"""
+    return ResolutionStore(
+        os.getenv("RESOLUTION_DB", default_path),
+        page_cache_bytes=int(os.getenv("RESOLUTION_PAGE_CACHE_BYTES", 8 * 1024 * 1024)),
+    )
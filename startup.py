@@ -0,0 +1,97 @@
+"""Startup timing and deferred construction.
+
+app.py marks the end of each startup phase (imports, configuration, stores,
+...) with mark(); each phase's duration is the time since the previous mark.
+Heavy dependencies that only some requests need are wrapped in Deferred, so
+the landing page and static files never wait for them: the openai SDK (and
+with it pydantic and the HTTP stack) is imported when the first request
+calls OpenAI, not when a worker boots. Deferred construction is timed too.
+
+first_response() records how long after the process started the first
+response was sent. stats() reports all of it, for /stats and /metrics.
+"""
+import importlib
+import os
+import threading
+import time
+
+_phases = {}
+_deferred = {}
+_first_response = None
+
+
+def _process_started():
+    """Wall-clock start of this process (the fork, for a gunicorn worker)"""
+    try:
+        with open("/proc/self/stat") as f:
+            # The command name may contain spaces; fields after it are fixed
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/stat") as f:
+            boot_time = next(int(line.split()[1]) for line in f if line.startswith("btime "))
+        return boot_time + start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, StopIteration):
+        # Not Linux: count from the first import of this module instead
+        return time.time()
+
+
+PROCESS_STARTED = _process_started()
+_phases["interpreter"] = max(0.0, time.time() - PROCESS_STARTED)
+_last_mark = time.perf_counter()
+
+
+def mark(phase):
+    """End a startup phase, timed from the previous mark"""
+    global _last_mark
+    now = time.perf_counter()
+    _phases[phase] = now - _last_mark
+    _last_mark = now
+
+
+def first_response():
+    """Record the time from process start to the first response (only the first call counts)"""
+    global _first_response
+    if _first_response is None:
+        _first_response = time.time() - PROCESS_STARTED
+
+
+class Deferred:
+    """Builds its object on first attribute access and then stands in for it"""
+
+    def __init__(self, name, factory):
+        self._name = name
+        self._factory = factory
+        self._value = None
+        self._lock = threading.Lock()
+
+    @property
+    def built(self):
+        return self._value is not None
+
+    def get(self):
+        value = self._value
+        if value is None:
+            with self._lock:
+                value = self._value
+                if value is None:
+                    started = time.perf_counter()
+                    value = self._factory()
+                    _deferred[self._name] = time.perf_counter() - started
+                    self._value = value
+        return value
+
+    def __getattr__(self, attribute):
+        return getattr(self.get(), attribute)
+
+
+def deferred_import(module_name):
+    """A module imported on first use"""
+    return Deferred(f"import {module_name}", lambda: importlib.import_module(module_name))
+
+
+def stats():
+    return {
+        "phases": {phase: round(seconds, 4) for phase, seconds in _phases.items()},
+        "boot_seconds": round(sum(_phases.values()), 4),
+        "deferred": {name: round(seconds, 4) for name, seconds in _deferred.items()},
+        "first_response_seconds": None if _first_response is None else round(_first_response, 4),
+    }
@@ -602,6 +602,18 @@ async function submitAnswer(answer) {
         console.log('Current thread ID:', threadId);
         console.log('Current question assistant ID:', questionAssistantId);
 
+        // The final answer streams the resolution plan as it is written
+        if (currentQuestionNumber >= 10) {
+            await streamResolution({
+                answer: answer,
+                threadId: threadId,
+                questionAssistantId: questionAssistantId,
+                resolutionAssistantId: resolutionAssistantId,
+                questionNumber: currentQuestionNumber
+            });
+            return;
+        }
+
         const response = await fetch('/submit_answer', {
             method: 'POST',
             headers: {
@@ -647,6 +659,57 @@ async function submitAnswer(answer) {
     }
 }
 
+async function streamResolution(payload) {
+    const response = await fetch('/stream-resolution', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify(payload)
+    });
+
+    if (!response.ok || !response.body) {
+        throw new Error('Failed to stream resolution');
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let resolution = '';
+    let lastRender = 0;
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // Server-Sent Events are separated by a blank line
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+
+        for (const raw of events) {
+            const event = (raw.match(/^event: (.*)$/m) || [])[1];
+            const data = JSON.parse((raw.match(/^data: (.*)$/m) || [])[1] || '{}');
+
+            if (event === 'delta') {
+                resolution += data.text;
+                // Re-render the partial plan a few times per second
+                if (Date.now() - lastRender > 250) {
+                    displayResolution(resolution);
+                    lastRender = Date.now();
+                }
+            } else if (event === 'done') {
+                displayResolution(data.resolution);
+                return data;
+            } else if (event === 'error') {
+                throw new Error(data.error);
+            }
+        }
+    }
+
+    throw new Error('Resolution stream ended unexpectedly');
+}
+
 function submitAnswerFromInput() {
     const input = document.getElementById('answer-input');
     if (input && input.value.trim()) {
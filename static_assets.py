@@ -0,0 +1,210 @@
+"""Static files served by a WSGI middleware in front of the Flask app.
+
+StaticAssets answers GET/HEAD requests for /static/... (and /favicon.ico)
+from a table built once at startup, so they skip Flask's routing, request
+hooks and filesystem lookups. Fingerprinted files from build_static.py
+(/static/build/...) are served with their precompressed gzip/brotli variant
+when the client accepts one, a strong ETag and a one-year immutable cache
+lifetime; templates link them with asset_url(). Other files under static/
+are served as-is and revalidated with an ETag on every use. Anything not in
+the table goes to the Flask app unchanged.
+
+Pages cached elsewhere (permalink pages, browser and CDN caches) can still
+link files of an earlier build. Fingerprinted files of earlier builds that
+are still on disk are served as they were. An earlier file that is gone is
+answered with the current version of the same file, revalidated rather than
+immutable.
+"""
+import json
+import mimetypes
+import os
+import re
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+BUILD_DIR = "build"
+MANIFEST_NAME = "manifest.json"
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+CODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+BLOCK_SIZE = 64 * 1024
+
+
+# build_static.fingerprinted(): name.<12 hex digits>.ext
+FINGERPRINT = re.compile(r"\.[0-9a-f]{12}(?=\.[^./]*$|$)")
+
+
+def load_manifest(static_dir):
+    """{"files": {original path: {"path": fingerprinted path, "encodings": [...]}}, "built_at": ...},
+    with no files before the first build"""
+    try:
+        with open(os.path.join(static_dir, BUILD_DIR, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {"files": {}}
+    if not isinstance(manifest, dict) or not isinstance(manifest.get("files"), dict):
+        return {"files": {}}
+    return manifest
+
+
+def accepted_codings(environ):
+    codings = set()
+    for part in environ.get("HTTP_ACCEPT_ENCODING", "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            codings.add(coding.strip().lower())
+    return codings
+
+
+def content_type(path):
+    mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    if mimetype.startswith("text/") or mimetype in ("application/javascript", "application/json"):
+        return f"{mimetype}; charset=utf-8"
+    return mimetype
+
+
+class _Asset:
+    def __init__(self, path, immutable, encodings=()):
+        self.path = path
+        self.immutable = immutable
+        self.content_type = content_type(path)
+        self.encodings = list(encodings)
+        # Sizes of immutable files never change, so they are read once here
+        self.sizes = {}
+        if immutable:
+            self.sizes["identity"] = os.path.getsize(path)
+            for coding in self.encodings:
+                self.sizes[coding] = os.path.getsize(path + CODING_SUFFIXES[coding])
+            # The file name holds the content hash
+            self.etag = os.path.basename(path)
+
+    def variant(self, environ):
+        accepted = accepted_codings(environ)
+        for coding in self.encodings:
+            if coding in accepted:
+                return coding
+        return "identity"
+
+    def serve(self, environ, start_response):
+        coding = self.variant(environ)
+        path = self.path + CODING_SUFFIXES.get(coding, "")
+        if self.immutable:
+            size = self.sizes[coding]
+            etag = self.etag if coding == "identity" else f"{self.etag}-{coding}"
+            cache_control = IMMUTABLE
+        else:
+            stat = os.stat(path)
+            size = stat.st_size
+            etag = f"{int(stat.st_mtime)}-{size}"
+            cache_control = REVALIDATE
+
+        headers = [("ETag", f'"{etag}"'), ("Cache-Control", cache_control)]
+        if self.encodings:
+            headers.append(("Vary", "Accept-Encoding"))
+
+        if_none_match = environ.get("HTTP_IF_NONE_MATCH", "")
+        if if_none_match.strip() == "*" or f'"{etag}"' in if_none_match:
+            start_response("304 Not Modified", headers)
+            return []
+
+        headers += [("Content-Type", self.content_type), ("Content-Length", str(size))]
+        if coding != "identity":
+            headers.append(("Content-Encoding", coding))
+        start_response("200 OK", headers)
+        if environ["REQUEST_METHOD"] == "HEAD":
+            return []
+
+        f = open(path, "rb")
+        file_wrapper = environ.get("wsgi.file_wrapper")
+        if file_wrapper is not None:
+            return file_wrapper(f, BLOCK_SIZE)
+        return _read_blocks(f)
+
+
+def _read_blocks(f):
+    with f:
+        while True:
+            block = f.read(BLOCK_SIZE)
+            if not block:
+                return
+            yield block
+
+
+class StaticAssets:
+    """WSGI middleware serving static files before the request reaches Flask"""
+
+    def __init__(self, app, static_dir=STATIC_DIR, url_prefix="/static"):
+        self.app = app
+        self.url_prefix = url_prefix
+        manifest = load_manifest(static_dir)
+        self.manifest = manifest["files"]
+        # Identifies the build, for caches of pages that link its files
+        self.build = str(manifest.get("built_at", ""))
+        self.routes = {}
+        # Original path -> its current file, for fingerprinted URLs of builds that are gone
+        self.renamed = {}
+
+        build_dir = os.path.join(static_dir, BUILD_DIR)
+        for dirpath, dirnames, filenames in os.walk(static_dir):
+            dirnames[:] = [d for d in dirnames if os.path.join(dirpath, d) != build_dir]
+            for filename in filenames:
+                if filename.startswith("."):
+                    continue
+                path = os.path.join(dirpath, filename)
+                name = os.path.relpath(path, static_dir).replace(os.sep, "/")
+                self.routes[f"{url_prefix}/{name}"] = _Asset(path, immutable=False)
+
+        for name, entry in self.manifest.items():
+            path = os.path.join(build_dir, entry["path"])
+            if os.path.exists(path):
+                self.routes[f"{url_prefix}/{BUILD_DIR}/{entry['path']}"] = _Asset(
+                    path, immutable=True, encodings=entry["encodings"]
+                )
+                self.renamed[name] = _Asset(path, immutable=False, encodings=entry["encodings"])
+
+        # Files of earlier builds that build_static.py kept
+        for dirpath, dirnames, filenames in os.walk(build_dir):
+            for filename in filenames:
+                if filename == MANIFEST_NAME or filename.endswith(tuple(CODING_SUFFIXES.values())):
+                    continue
+                path = os.path.join(dirpath, filename)
+                route = f"{url_prefix}/{BUILD_DIR}/{os.path.relpath(path, build_dir).replace(os.sep, '/')}"
+                if route not in self.routes:
+                    encodings = [c for c, suffix in CODING_SUFFIXES.items() if os.path.exists(path + suffix)]
+                    self.routes[route] = _Asset(path, immutable=True, encodings=encodings)
+
+        favicon = self.routes.get(f"{url_prefix}/favicon.ico")
+        if favicon is not None:
+            self.routes["/favicon.ico"] = favicon
+
+    def url(self, filename):
+        """The fingerprinted URL of a static file, or its plain URL before the first build"""
+        entry = self.manifest.get(filename)
+        if entry is not None and f"{self.url_prefix}/{BUILD_DIR}/{entry['path']}" in self.routes:
+            return f"{self.url_prefix}/{BUILD_DIR}/{entry['path']}"
+        return f"{self.url_prefix}/{filename}"
+
+    def _earlier_build(self, path):
+        """The current file for a fingerprinted URL of a build that is no longer on disk"""
+        prefix = f"{self.url_prefix}/{BUILD_DIR}/"
+        if not path.startswith(prefix):
+            return None
+        name, found = FINGERPRINT.subn("", path[len(prefix):], count=1)
+        return self.renamed.get(name) if found else None
+
+    def stats(self):
+        return {
+            "files": len(self.routes),
+            "fingerprinted": sum(1 for asset in self.routes.values() if asset.immutable),
+        }
+
+    def __call__(self, environ, start_response):
+        path = environ.get("PATH_INFO", "")
+        asset = self.routes.get(path) or self._earlier_build(path)
+        if asset is None or environ.get("REQUEST_METHOD") not in ("GET", "HEAD"):
+            return self.app(environ, start_response)
+        try:
+            return asset.serve(environ, start_response)
+        except FileNotFoundError:
+            # Removed since startup; let Flask answer
+            return self.app(environ, start_response)
@@ -0,0 +1,57 @@
+import time
+
+from cache import ByteLRUCache, TTLCache
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats() == {"entries": 2, "hits": 3, "misses": 1, "hit_ratio": 0.75}
+
+
+def test_ttl_cache_entries_expire_after_last_write(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = TTLCache(ttl=10)
+    cache.set("a", 1)
+    now[0] += 8
+    assert cache.get("a") == 1
+    cache.set("a", 2)
+    now[0] += 8
+    assert cache.get("a") == 2
+    now[0] += 3
+    assert cache.get("a", "gone") == "gone"
+    assert len(cache) == 0
+
+
+def test_ttl_cache_pop():
+    cache = TTLCache()
+    cache.set("a", 1)
+    assert cache.pop("a") == 1
+    assert cache.pop("a", "missing") == "missing"
+
+
+def test_byte_lru_cache_is_bounded_by_size():
+    cache = ByteLRUCache(max_bytes=10)
+    cache.set("a", b"1234")
+    cache.set("b", b"1234")
+    cache.get("a")
+    cache.set("c", b"1234")
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (b"1234", b"1234")
+    assert cache.bytes == 8
+
+
+def test_byte_lru_cache_replaces_and_skips_oversized_values():
+    cache = ByteLRUCache(max_bytes=10)
+    cache.set("a", b"1234")
+    cache.set("a", b"12")
+    assert cache.bytes == 2
+    cache.set("b", b"x" * 11)
+    assert cache.get("b") is None
+    assert cache.stats()["entries"] == 1
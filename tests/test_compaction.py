@@ -0,0 +1,120 @@
+import json
+
+import pytest
+
+import compaction
+import interview
+
+OPENING = "Hi, I'm Sam from Leeds. I'd like to start running this year."
+
+
+def question(text):
+    return json.dumps({"type": "text", "text": text, "options": []})
+
+
+def transcript(turns, trailing_question=None):
+    """Interview messages: the opening, then a question and answer per turn"""
+    messages = [{"role": "user", "content": OPENING}]
+    for asked, answered in turns:
+        messages.append({"role": "assistant", "content": question(asked)})
+        messages.append({"role": "user", "content": answered})
+    if trailing_question:
+        messages.append({"role": "assistant", "content": question(trailing_question)})
+    return messages
+
+
+TURNS = [
+    ("What time of day works best for you?", "Early mornings before work. " * 10),
+    ("What has made this difficult before?", "I lose motivation in winter."),
+    ("Favourite colour?", "Blue."),
+    ("How will you track progress?", "A running app."),
+    ("Who can support you?", "My sister."),
+]
+
+
+def test_transcripts_within_the_budget_are_left_alone():
+    messages = transcript(TURNS)
+    assert compaction.compact(messages, budget=10_000) is None
+    assert compaction.compact(messages, budget=0) is None
+    assert compaction.compact(messages[:1], budget=1) is None
+
+
+def test_nothing_to_fold_when_every_turn_is_recent():
+    assert compaction.compact(transcript(TURNS[:2]), budget=1, recent_turns=2) is None
+
+
+def test_recent_turns_are_kept_and_older_ones_summarized():
+    messages = transcript(TURNS)
+    compacted = compaction.compact(messages, budget=60, recent_turns=2)
+
+    assert compacted.recent == messages[-4:]
+    assert compacted.messages() == [{"role": "user", "content": compacted.summary}, *messages[-4:]]
+    lines = compacted.summary.splitlines()
+    assert lines[0] == "Summary of the interview so far:"
+    assert lines[1] == f"About them: {OPENING}"
+    assert lines[2].startswith("Schedule: What time of day works best for you? Early mornings")
+    assert lines[2].endswith("…")
+    assert lines[3] == "Obstacles: What has made this difficult before? I lose motivation in winter."
+    assert lines[4] == "Other answers: Favourite colour? Blue."
+    assert "How will you track progress?" not in compacted.summary
+    assert '"text"' not in compacted.summary
+    assert compacted.tokens_before == sum(compaction.estimate_tokens(m["content"]) for m in messages)
+    assert compacted.tokens_after < compacted.tokens_before
+
+
+def test_unanswered_question_stays_with_the_recent_turns():
+    messages = transcript(TURNS, trailing_question="What would success look like?")
+    compacted = compaction.compact(messages, budget=60, recent_turns=2)
+    assert compacted.recent == messages[-5:]
+    assert compacted.recent[0]["content"] == question("How will you track progress?")
+    assert compacted.recent[-1]["content"] == question("What would success look like?")
+    assert "Favourite colour? Blue." in compacted.summary
+    assert "How will you track progress?" not in compacted.summary
+
+
+def test_profile_fields_are_checked_in_order():
+    assert compaction.profile_field("What time is hard for you?", "Evenings") == "obstacles"
+    assert compaction.profile_field("Where will you train?", "At the gym") == "location"
+    assert compaction.profile_field("Anything else?", "No") == "other"
+    assert compaction.question_text(question("Why now?")) == "Why now?"
+    assert compaction.question_text("{not json") == "{not json"
+
+
+@pytest.fixture(scope="module")
+def app(tmp_path_factory):
+    env = pytest.MonkeyPatch()
+    instance = tmp_path_factory.mktemp("instance")
+    env.setenv("OPENAI_API_KEY", "test")
+    env.setenv("RESOLUTION_DB", str(instance / "resolutions.db"))
+    env.setenv("OPENAI_RATE_DB", str(instance / "rate.db"))
+    import app
+    yield app
+    env.undo()
+
+
+def test_mirror_is_used_only_with_the_expected_message_count(app):
+    messages = transcript(TURNS[:2])
+    app.transcripts.create("thread_mirror", messages)
+    texts = [m["content"] for m in messages]
+    expected = interview.expected_messages(2)
+
+    assert expected == len(messages)
+    assert app.mirrored_transcript("thread_mirror", expected) == texts
+    assert app.mirrored_transcript("thread_mirror") == texts
+    # Another worker recorded a later answer: the mirror is stale
+    assert app.mirrored_transcript("thread_mirror", expected + 2) is None
+    assert app.mirrored_transcript("thread_unknown", expected) is None
+    assert app.AssistantsConversation().transcript("thread_mirror", expected) == texts
+
+
+def test_plan_history_is_compacted_over_the_budget(app, monkeypatch):
+    texts = [m["content"] for m in transcript(TURNS)]
+    full = app.compacted_history(texts)
+    assert "Favourite colour?" in full
+
+    monkeypatch.setattr(app, "CONTEXT_TOKEN_BUDGET", 60)
+    monkeypatch.setattr(app, "CONTEXT_RECENT_TURNS", 2)
+    compacted = app.compacted_history(texts)
+    assert compacted.startswith("Initial User Information:\nSummary of the interview so far:")
+    assert "Who can support you?" in compacted
+    assert len(compacted) < len(full)
@@ -0,0 +1,57 @@
+import datetime
+import json
+
+import pytest
+from flask import Flask, jsonify
+
+import fast_json
+
+pytestmark = pytest.mark.skipif(fast_json.orjson is None, reason="orjson is not installed")
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.json = fast_json.FastJSONProvider(app)
+    return app
+
+
+@pytest.fixture
+def orjson_calls(monkeypatch):
+    calls = []
+    dumps = fast_json.orjson.dumps
+
+    def counting_dumps(*args, **kwargs):
+        calls.append(kwargs.get("option"))
+        return dumps(*args, **kwargs)
+
+    monkeypatch.setattr(fast_json.orjson, "dumps", counting_dumps)
+    return calls
+
+
+def test_jsonify_goes_through_orjson(app, orjson_calls):
+    with app.app_context():
+        response = jsonify({"b": 1, "a": [1, 2]})
+    assert len(orjson_calls) == 1
+    assert response.get_data(as_text=True) == '{"a":[1,2],"b":1}\n'
+
+
+def test_debug_output_is_indented_by_orjson(app, orjson_calls):
+    app.debug = True
+    with app.app_context():
+        body = jsonify({"b": 1, "a": 2}).get_data(as_text=True)
+    assert orjson_calls == [fast_json.ORJSON_OPTIONS | fast_json.orjson.OPT_SORT_KEYS | fast_json.orjson.OPT_INDENT_2]
+    assert body == json.dumps({"a": 2, "b": 1}, indent=2) + "\n"
+
+
+def test_output_matches_default_provider(app):
+    value = {"when": datetime.datetime(2026, 1, 2, 3, 4, 5), "n": None, "z": [1.5, "x"]}
+    with app.app_context():
+        fast = app.json.dumps(value)
+        default = json.loads(super(fast_json.FastJSONProvider, app.json).dumps(value))
+    assert json.loads(fast) == default
+
+
+def test_unmapped_arguments_fall_back_to_the_standard_library(app, orjson_calls):
+    assert app.json.dumps({"a": 1}, indent=4) == json.dumps({"a": 1}, indent=4)
+    assert orjson_calls == []
@@ -0,0 +1,146 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import idempotency
+from idempotency import StoredResponse
+
+OK = StoredResponse(200, b'{"question": "next"}', "application/json")
+FAILED = StoredResponse(500, b'{"error": "boom"}', "application/json")
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return idempotency.MemoryIdempotencyStore()
+    return idempotency.SQLiteIdempotencyStore(str(tmp_path / "keys.db"))
+
+
+def counting(response, delay=0.0):
+    calls = []
+
+    def handler():
+        calls.append(1)
+        time.sleep(delay)
+        return response
+    return handler, calls
+
+
+def test_retry_gets_the_stored_response_without_running_again(store):
+    handler, calls = counting(OK)
+    assert idempotency.single_flight(store, "k", "f", handler) == (OK, "ran")
+    assert idempotency.single_flight(store, "k", "f", handler) == (OK, "replayed")
+    assert len(calls) == 1
+
+
+def test_concurrent_duplicates_share_one_run(store):
+    handler, calls = counting(OK, delay=0.3)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(idempotency.single_flight(store, "k", "f", handler)))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert sorted(outcome for _, outcome in results) == ["merged"] * 4 + ["ran"]
+    assert all(response == OK for response, _ in results)
+
+
+def test_errors_are_not_stored(store):
+    failing, failed_calls = counting(FAILED)
+    assert idempotency.single_flight(store, "k", "f", failing) == (FAILED, "ran")
+    handler, calls = counting(OK)
+    assert idempotency.single_flight(store, "k", "f", handler) == (OK, "ran")
+    assert len(failed_calls) == len(calls) == 1
+
+
+def test_exceptions_release_the_key(store):
+    def broken():
+        raise RuntimeError("upstream")
+
+    with pytest.raises(RuntimeError):
+        idempotency.single_flight(store, "k", "f", broken)
+    assert store.claim("k", "f")[0] == idempotency.CLAIMED
+
+
+def test_key_reused_for_a_different_body_is_refused(store):
+    idempotency.single_flight(store, "k", "f", lambda: OK)
+    with pytest.raises(idempotency.KeyReused):
+        idempotency.single_flight(store, "k", "other", lambda: OK)
+
+
+def test_duplicate_gives_up_after_the_wait(store):
+    assert store.claim("k", "f")[0] == idempotency.CLAIMED
+    with pytest.raises(idempotency.Busy):
+        idempotency.single_flight(store, "k", "f", lambda: OK, wait=0.2)
+
+
+def test_abandoned_claims_expire_after_the_lease(store):
+    store.lease = 0.1
+    assert store.claim("k", "f")[0] == idempotency.CLAIMED
+    assert store.claim("k", "f")[0] == idempotency.RUNNING
+    time.sleep(0.15)
+    assert store.claim("k", "f")[0] == idempotency.CLAIMED
+
+
+def test_step_runs_once_across_retries_of_a_failed_request(store):
+    appended = []
+
+    def attempt(fail):
+        idempotency.step_once(store, "k", "f", "answer", lambda: appended.append("answer"))
+        if fail:
+            raise RuntimeError("queue full")
+        return OK
+
+    with pytest.raises(RuntimeError):
+        idempotency.single_flight(store, "k", "f", lambda: attempt(fail=True))
+    assert idempotency.single_flight(store, "k", "f", lambda: attempt(fail=False)) == (OK, "ran")
+    assert appended == ["answer"]
+
+
+def test_step_that_fails_runs_again(store):
+    def broken():
+        raise RuntimeError("upstream")
+
+    with pytest.raises(RuntimeError):
+        idempotency.step_once(store, "k", "f", "answer", broken)
+    assert idempotency.step_once(store, "k", "f", "answer", lambda: None) is True
+    assert idempotency.step_once(store, "k", "f", "answer", lambda: None) is False
+
+
+def test_step_done_for_a_different_body_is_refused(store):
+    idempotency.step_once(store, "k", "f", "answer", lambda: None)
+    with pytest.raises(idempotency.KeyReused):
+        idempotency.step_once(store, "k", "other", "answer", lambda: None)
+
+
+def test_step_without_a_key_always_runs(store):
+    calls = []
+    for _ in range(2):
+        assert idempotency.step_once(store, None, "f", "answer", lambda: calls.append(1)) is True
+    assert len(calls) == 2
+
+
+def test_async_step_runs_once(store):
+    calls = []
+
+    async def append():
+        calls.append(1)
+
+    async def attempts():
+        return [await idempotency.step_once_async(store, "k", "f", "answer", append) for _ in range(2)]
+
+    assert asyncio.run(attempts()) == [True, False]
+    assert len(calls) == 1
+
+
+def test_request_key():
+    assert idempotency.request_key("/submit_answer", "thread", 3) == "/submit_answer:thread:3"
+    assert idempotency.request_key("/submit_answer", "thread", 3, "abc") == "/submit_answer:client:abc"
+    assert idempotency.request_key("/submit_answer", None, 3) is None
+    assert idempotency.fingerprint({"a": 1, "b": 2}) == idempotency.fingerprint({"b": 2, "a": 1})
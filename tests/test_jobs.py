@@ -0,0 +1,80 @@
+import threading
+import time
+
+import pytest
+
+from jobs import JobQueue, MemoryJobStore, QueueFull, SQLiteJobStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryJobStore()
+    return SQLiteJobStore(str(tmp_path / "jobs.db"))
+
+
+def wait_for(queue, job_id, status="done", timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.status(job_id)
+        if job["status"] == status:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"{job_id} is still {job['status']}")
+
+
+def test_store_records_updates(store):
+    store.create("job_1", "resolution", {"threadId": "t"})
+    store.update("job_1", status="done", result={"html": "<p>ok</p>"})
+    job = store.get("job_1")
+    assert job["params"] == {"threadId": "t"}
+    assert (job["status"], job["result"]) == ("done", {"html": "<p>ok</p>"})
+    assert store.get("job_2") is None
+
+
+def test_sqlite_store_claims_stale_jobs_once(tmp_path, monkeypatch):
+    path = str(tmp_path / "jobs.db")
+    store = SQLiteJobStore(path)
+    store.create("job_1", "resolution", {})
+    store.create("job_2", "resolution", {})
+    store.update("job_2", status="done")
+    later = time.time() + 600
+    monkeypatch.setattr(time, "time", lambda: later)
+    assert [job["jobId"] for job in store.claim_stale(older_than=300)] == ["job_1"]
+    assert SQLiteJobStore(path).claim_stale(older_than=300) == []
+
+
+def test_queue_runs_jobs_and_reports_progress(store):
+    queue = JobQueue(store, max_workers=1)
+    queue.register("double", lambda params, progress: progress("working") or params["n"] * 2)
+    job = wait_for(queue, queue.submit("double", {"n": 21}))
+    assert (job["result"], job["stage"]) == (42, None)
+    assert "params" not in job
+
+
+def test_queue_records_failures(store):
+    queue = JobQueue(store, max_workers=1)
+
+    def fail(params, progress):
+        raise RuntimeError("model unavailable")
+
+    queue.register("fail", fail)
+    job = wait_for(queue, queue.submit("fail", {}), status="error")
+    assert job["error"] == "model unavailable"
+    assert queue.stats()["pending"] == 0
+
+
+def test_queue_refuses_jobs_beyond_its_depth(store):
+    release = threading.Event()
+    queue = JobQueue(store, max_workers=1, max_pending=1)
+    queue.register("block", lambda params, progress: release.wait(5))
+    assert not queue.full()
+    job_id = queue.submit("block", {})
+    assert queue.full()
+    with pytest.raises(QueueFull):
+        queue.submit("block", {})
+    release.set()
+    wait_for(queue, job_id)
+    assert not queue.full()
+    with pytest.raises(ValueError):
+        queue.submit("unknown", {})
@@ -0,0 +1,64 @@
+import json
+import logging
+
+import pytest
+
+import logs
+
+
+@pytest.fixture(autouse=True)
+def control_file(tmp_path, monkeypatch):
+    path = tmp_path / "logging.json"
+    monkeypatch.setattr(logs, "_control_file", str(path))
+    monkeypatch.setattr(logs, "_settings", {"level": "INFO", "payloads": False, "sample_rate": 1.0})
+    root = logging.getLogger(logs.ROOT)
+    level = root.level
+    yield path
+    root.setLevel(level)
+
+
+def test_valid_changes_are_applied_and_shared(control_file):
+    updated = logs.update_settings(level="debug", payloads=True, sample_rate="0.5")
+    assert updated == {"level": "DEBUG", "payloads": True, "sample_rate": 0.5}
+    assert json.loads(control_file.read_text()) == updated
+
+
+@pytest.mark.parametrize("changes", [
+    {"sample_rate": "half"},
+    {"sample_rate": 1.5},
+    {"sample_rate": -0.1},
+    {"sample_rate": float("nan")},
+    {"sample_rate": True},
+    {"payloads": "false"},
+    {"payloads": 1},
+    {"level": "LOUD"},
+])
+def test_invalid_changes_are_rejected_before_anything_is_written(control_file, changes):
+    with pytest.raises(ValueError):
+        logs.update_settings(**changes)
+    assert logs.settings() == {"level": "INFO", "payloads": False, "sample_rate": 1.0}
+    assert not control_file.exists()
+
+
+def test_sampling_filter_uses_a_validated_rate():
+    logs.update_settings(sample_rate="0")
+    record = logging.LogRecord(logs.ROOT, logging.INFO, __file__, 1, "message", (), None)
+    assert logs.SamplingFilter().filter(record) is False
+
+
+def test_control_file_from_before_startup_is_ignored(control_file, monkeypatch):
+    control_file.write_text(json.dumps({"level": "DEBUG", "payloads": True}))
+    monkeypatch.setattr(logs, "_started", control_file.stat().st_mtime + 1)
+    logs._check_control_file(None)
+    assert logs.settings() == {"level": "INFO", "payloads": False, "sample_rate": 1.0}
+
+
+def test_control_file_changes_are_validated_and_applied(control_file, monkeypatch):
+    monkeypatch.setattr(logs, "_started", 0.0)
+    control_file.write_text(json.dumps({"level": "warning", "sample_rate": 0.25, "other": 1}))
+    modified = logs._check_control_file(None)
+    assert logs.settings() == {"level": "WARNING", "payloads": False, "sample_rate": 0.25}
+
+    control_file.write_text(json.dumps({"payloads": "yes"}))
+    logs._check_control_file(modified - 1)
+    assert logs.settings()["payloads"] is False
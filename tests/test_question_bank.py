@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+from question_bank import QuestionBank, normalize_answer
+
+WHEN = {"type": "CHOICE", "text": "When will you train?", "options": ["Mornings", "Evenings"]}
+MORNING = {"type": "YES/NO", "text": "Are you an early riser?", "options": None}
+OTHER = {"type": "TEXT", "text": "What gets in the way?", "options": None}
+WHY = {"type": "TEXT", "text": "Why does this matter to you?", "options": None}
+
+
+@pytest.fixture
+def bank():
+    return QuestionBank({
+        "fitness": [
+            {"q": WHEN, "next": {"mornings": 1, "*": 2}},
+            {"q": MORNING, "next": {"*": 3}},
+            {"q": OTHER, "next": {"*": 3}},
+            {"q": WHY},
+        ],
+    })
+
+
+def transcript(*turns):
+    messages = [{"role": "user", "content": "I want to get fit"}]
+    for question, answer in turns:
+        messages.append({"role": "assistant", "content": json.dumps(question)})
+        if answer is not None:
+            messages.append({"role": "user", "content": answer})
+    return messages
+
+
+def test_normalize_answer():
+    assert normalize_answer("  Early\n  MORNINGS ") == "early mornings"
+    assert normalize_answer(None) == ""
+
+
+def test_first_question_by_category(bank):
+    assert bank.first_question(" Fitness ") == WHEN
+    assert bank.first_question("finance") is None
+
+
+def test_answer_follows_its_branch(bank):
+    assert bank.next_question(transcript((WHEN, "mornings "))) == MORNING
+
+
+def test_other_answers_follow_the_wildcard(bank):
+    assert bank.next_question(transcript((WHEN, "Lunch breaks"))) == OTHER
+    assert bank.next_question(transcript((WHEN, "Evenings"), (OTHER, "Work"))) == WHY
+
+
+def test_node_without_branches_leaves_the_bank(bank):
+    assert bank.next_question(transcript((WHEN, "Mornings"), (MORNING, "Yes"), (WHY, "Health"))) is None
+
+
+@pytest.mark.parametrize("messages", [
+    transcript(),
+    transcript((WHEN, None)),
+    transcript((WHY, "Health")),
+    transcript((WHEN, "Mornings"), (OTHER, "Work")),
+    [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "not json"}, {"role": "user", "content": "x"}],
+])
+def test_transcripts_the_bank_did_not_ask_leave_it(bank, messages):
+    assert bank.next_question(messages) is None
+
+
+def test_saved_bank_loads_again(bank, tmp_path):
+    path = str(tmp_path / "bank.json.gz")
+    bank.save(path, model="test")
+    assert QuestionBank.load(path).categories == bank.categories
+    assert QuestionBank.load(str(tmp_path / "missing.json.gz")) is None
@@ -0,0 +1,65 @@
+import pytest
+
+import questions
+
+
+def test_schema_is_strict_and_covers_every_variant():
+    schema = questions.question_schema()
+    assert schema["additionalProperties"] is False
+    assert schema["required"] == list(schema["properties"])
+    assert schema["properties"]["type"]["enum"] == ["CHOICE", "YES/NO", "TEXT"]
+
+
+@pytest.mark.parametrize("reply, expected", [
+    (
+        '{"type": "CHOICE", "text": "How often?", "options": ["Daily", " Weekly "]}',
+        {"type": "CHOICE", "text": "How often?", "options": ["Daily", "Weekly"]},
+    ),
+    (
+        '{"type": "YES/NO", "text": "Do you run?", "options": null}',
+        {"type": "YES/NO", "text": "Do you run?", "options": None},
+    ),
+    (
+        '{"type": "TEXT", "text": " Why now? ", "options": null}',
+        {"type": "TEXT", "text": "Why now?", "options": None},
+    ),
+])
+def test_schema_replies_are_parsed(reply, expected):
+    assert questions.parse_question(reply) == expected
+
+
+@pytest.mark.parametrize("reply, expected", [
+    # Wrapped in a code fence and prose
+    (
+        'Here you go:\n```json\n{"type": "choice", "text": "Where?", "options": ["Home", "Gym"]}\n```',
+        {"type": "CHOICE", "text": "Where?", "options": ["Home", "Gym"]},
+    ),
+    # "question" instead of "text", unknown type
+    (
+        '{"type": "SCALE", "question": "How motivated are you?"}',
+        {"type": "TEXT", "text": "How motivated are you?", "options": None},
+    ),
+    # A choice without options is asked as free text
+    (
+        '{"type": "CHOICE", "text": "Pick one", "options": []}',
+        {"type": "TEXT", "text": "Pick one", "options": []},
+    ),
+])
+def test_partially_valid_replies_are_repaired(reply, expected):
+    assert questions.parse_question(reply) == expected
+
+
+@pytest.mark.parametrize("reply", [
+    "What is your budget?",
+    '{"type": "TEXT", "text": ""}',
+    '["not", "an", "object"]',
+    '{"type": "TEXT", "text": "unterminated',
+])
+def test_malformed_replies_are_rejected(reply):
+    assert questions.parse_question(reply) is None
+
+
+def test_text_question_is_the_last_resort():
+    assert questions.text_question("  What is your budget?\n") == {
+        "type": "TEXT", "text": "What is your budget?", "options": None,
+    }
@@ -0,0 +1,122 @@
+import time
+
+import pytest
+
+from rate_governor import CircuitBreaker, GovernedTransport, RateGovernor, SharedTokenBucket, httpx
+
+URL = "https://api.openai.com/v1/threads/thread_abc/runs"
+
+
+def governed(handler, **settings):
+    calls = []
+
+    def counting(request):
+        calls.append(request)
+        return handler(request)
+
+    governor = RateGovernor(backoff_base=0.001, backoff_max=0.001, **settings)
+    client = httpx.Client(transport=GovernedTransport(governor, httpx.MockTransport(counting)))
+    return client, calls
+
+
+def status(code):
+    return lambda request: httpx.Response(code, json={})
+
+
+@pytest.mark.parametrize("method, code, headers, sends", [
+    ("GET", 500, {}, 4),
+    ("POST", 500, {}, 1),
+    ("POST", 500, {"Idempotency-Key": "abc"}, 4),
+    ("POST", 429, {}, 4),
+    ("POST", 400, {}, 1),
+])
+def test_retries_only_what_is_safe_to_send_again(method, code, headers, sends):
+    client, calls = governed(status(code), breaker=CircuitBreaker(threshold=100))
+    assert client.request(method, URL, headers=headers).status_code == code
+    assert len(calls) == sends
+
+
+def test_connection_errors_are_retried_for_any_method():
+    def refuse(request):
+        raise httpx.ConnectError("refused", request=request)
+
+    client, calls = governed(refuse, breaker=CircuitBreaker(threshold=100))
+    with pytest.raises(httpx.ConnectError):
+        client.post(URL)
+    assert len(calls) == 4
+
+
+def test_lost_responses_to_posts_are_not_retried():
+    def timeout(request):
+        raise httpx.ReadTimeout("no response", request=request)
+
+    client, calls = governed(timeout)
+    with pytest.raises(httpx.ReadTimeout):
+        client.post(URL)
+    assert len(calls) == 1
+
+
+class Events(httpx.SyncByteStream):
+    def __iter__(self):
+        yield b"event: thread.run.completed\n\n"
+
+
+def test_streamed_responses_hold_their_slot_until_closed():
+    client, _ = governed(lambda request: httpx.Response(200, stream=Events()), max_concurrency=1, slot_timeout=0.05)
+    with client.stream("POST", URL) as streaming:
+        assert streaming.status_code == 200
+        refused = client.post(URL)
+        assert refused.status_code == 429
+        assert refused.json()["error"]["type"] == "local_admission_control"
+    assert client.post(URL).status_code == 200
+    assert client.post(URL).status_code == 200
+
+
+def test_breaker_opens_after_consecutive_failures_and_closes_after_a_good_trial():
+    breaker = CircuitBreaker(threshold=2, cooldown=0.1)
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    time.sleep(0.12)
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+    # Only one trial request at a time
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_failed_trial_reopens_the_breaker():
+    breaker = CircuitBreaker(threshold=1, cooldown=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker(threshold=2)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+
+def test_token_bucket_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "bucket.db")
+    bucket = SharedTokenBucket(path, rate_per_minute=60, burst=2)
+    other = SharedTokenBucket(path, rate_per_minute=60, burst=2)
+    assert bucket.take() == 0
+    assert other.take() == 0
+    assert 0.9 < bucket.take() <= 1.0
+
+
+def test_token_bucket_pause_holds_every_instance(tmp_path):
+    path = str(tmp_path / "bucket.db")
+    bucket = SharedTokenBucket(path, rate_per_minute=600, burst=5)
+    SharedTokenBucket(path, rate_per_minute=600).pause(30)
+    assert 29 < bucket.take() <= 30
@@ -0,0 +1,61 @@
+import pytest
+
+import resolution_store
+
+
+@pytest.fixture
+def store(tmp_path):
+    return resolution_store.ResolutionStore(str(tmp_path / "resolutions.db"))
+
+
+def test_same_content_gets_the_same_permalink(store):
+    assert store.save("<h2>Plan</h2>") == store.save("<h2>Plan</h2>")
+
+
+def test_pages_are_rendered_once_per_build(store):
+    key = store.save("<h2>Plan</h2>")
+    renders = []
+
+    def render(build):
+        def render_page(content):
+            renders.append(build)
+            return f"<link href='/static/build/styles.{build}.css'>{content}"
+        return render_page
+
+    first = store.page(key, render("aaa"), build="1")
+    assert store.page(key, render("aaa"), build="1") == first
+    second = store.page(key, render("bbb"), build="2")
+    assert renders == ["aaa", "bbb"]
+    assert second["identity"][0] != first["identity"][0]
+    assert b"styles.bbb.css" in second["identity"][0]
+
+    # Another worker, without the in-process cache, gets the new build's page
+    other = resolution_store.ResolutionStore(store.path)
+    assert other.page(key, render("ccc"), build="2") == second
+
+
+def test_unknown_resolution_has_no_page(store):
+    assert store.page("missing", lambda content: content) is None
+
+
+def test_sanitize_drops_scripts_and_unknown_tags():
+    html = "<div><script>alert(1)</script><style>p{}</style><img src=x onerror=y><b>ok</b></div>"
+    assert resolution_store.sanitize_resolution(html) == "<div><b>ok</b></div>"
+
+
+def test_sanitize_keeps_class_and_only_safe_links():
+    html = (
+        '<p class="note" onclick="x()">'
+        '<a href="https://example.com/?a=1&b=2">safe</a>'
+        '<a href="javascript:alert(1)">unsafe</a></p>'
+    )
+    assert resolution_store.sanitize_resolution(html) == (
+        '<p class="note">'
+        '<a href="https://example.com/?a=1&amp;b=2" target="_blank" rel="noopener noreferrer">safe</a>'
+        '<a target="_blank" rel="noopener noreferrer">unsafe</a></p>'
+    )
+
+
+def test_sanitize_decodes_escaped_markup_and_closes_open_tags():
+    html = "&lt;ul&gt;&lt;li&gt;5 \\* 2 &amp;amp; more<br>"
+    assert resolution_store.sanitize_resolution(html) == "<ul><li>5 * 2 &amp; more<br></li></ul>"
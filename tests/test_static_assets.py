@@ -0,0 +1,68 @@
+import subprocess
+import sys
+
+import pytest
+from werkzeug.test import Client
+from werkzeug.wrappers import Response
+
+import static_assets
+
+
+def not_found(environ, start_response):
+    return Response("not found", status=404)(environ, start_response)
+
+
+def build(static_dir, *args):
+    subprocess.run(
+        [sys.executable, "build_static.py", "--static-dir", str(static_dir), *args],
+        check=True, capture_output=True,
+    )
+
+
+@pytest.fixture
+def static_dir(tmp_path):
+    (tmp_path / "styles.css").write_text("body { color: red; }\n" * 20)
+    return tmp_path
+
+
+def test_fingerprinted_files_are_immutable_and_precompressed(static_dir):
+    build(static_dir)
+    assets = static_assets.StaticAssets(not_found, str(static_dir))
+    url = assets.url("styles.css")
+    assert url.startswith("/static/build/styles.") and assets.build
+
+    response = Client(assets).get(url, headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Cache-Control"] == static_assets.IMMUTABLE
+
+
+def test_files_of_earlier_builds_are_still_served(static_dir):
+    build(static_dir)
+    old_url = static_assets.StaticAssets(not_found, str(static_dir)).url("styles.css")
+    (static_dir / "styles.css").write_text("body { color: blue; }\n" * 20)
+    build(static_dir)
+
+    assets = static_assets.StaticAssets(not_found, str(static_dir))
+    assert assets.url("styles.css") != old_url
+    response = Client(assets).get(old_url)
+    assert response.status_code == 200
+    assert b"red" in response.data
+
+
+def test_missing_earlier_build_falls_back_to_the_current_file(static_dir):
+    build(static_dir)
+    old_url = static_assets.StaticAssets(not_found, str(static_dir)).url("styles.css")
+    (static_dir / "styles.css").write_text("body { color: blue; }\n" * 20)
+    build(static_dir, "--clean")
+
+    response = Client(static_assets.StaticAssets(not_found, str(static_dir))).get(old_url)
+    assert response.status_code == 200
+    assert b"blue" in response.data
+    assert response.headers["Cache-Control"] == static_assets.REVALIDATE
+
+
+def test_unknown_files_go_to_the_app(static_dir):
+    build(static_dir)
+    client = Client(static_assets.StaticAssets(not_found, str(static_dir)))
+    assert client.get("/static/build/missing.0123456789ab.css").status_code == 404
@@ -0,0 +1,49 @@
+import time
+
+import pytest
+
+from transcript_store import MemoryTranscriptStore, SQLiteTranscriptStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, tmp_path):
+    def make(ttl=3600):
+        if request.param == "memory":
+            return MemoryTranscriptStore(ttl=ttl)
+        return SQLiteTranscriptStore(str(tmp_path / "transcripts.db"), ttl=ttl)
+    return make
+
+
+def test_messages_are_kept_in_order(make_store):
+    store = make_store()
+    store.create("s1", [{"role": "assistant", "content": "Q1"}])
+    assert store.append("s1", "user", "A1")
+    assert store.append("s1", "assistant", "Q2")
+    assert store.get("s1") == [
+        {"role": "assistant", "content": "Q1"},
+        {"role": "user", "content": "A1"},
+        {"role": "assistant", "content": "Q2"},
+    ]
+
+
+def test_unknown_session(make_store):
+    store = make_store()
+    assert store.get("missing") is None
+    assert not store.append("missing", "user", "A1")
+
+
+def test_get_returns_a_copy(make_store):
+    store = make_store()
+    store.create("s1")
+    store.get("s1").append({"role": "user", "content": "stray"})
+    assert store.get("s1") == []
+
+
+def test_idle_sessions_expire(make_store, monkeypatch):
+    store = make_store(ttl=10)
+    store.create("s1")
+    later = time.time() + 11
+    monkeypatch.setattr(time, "time", lambda: later)
+    monkeypatch.setattr(time, "monotonic", lambda: later)
+    assert store.get("s1") is None
+    assert not store.append("s1", "user", "A1")
@@ -0,0 +1,133 @@
+"""Local mirror of each interview's messages.
+
+Every question and answer is appended as it passes through the server, so
+building the final resolution prompt never has to list the remote thread.
+Transcripts are plain lists of {"role": ..., "content": ...} dicts, oldest
+first.
+
+The default store keeps transcripts in this process (LRU with a TTL). Set
+TRANSCRIPT_DB to a file path to keep them in SQLite instead, which every
+worker on the machine shares.
+"""
+import os
+import threading
+import time
+
+from cache import TTLCache
+from cooperative import SQLiteFile
+
+
+class MemoryTranscriptStore:
+    """Transcripts held in process, evicted least-recently-used or when idle"""
+
+    def __init__(self, max_sessions=10000, ttl=6 * 3600):
+        self._sessions = TTLCache(max_entries=max_sessions, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def create(self, session_id, messages=None):
+        self._sessions.set(session_id, list(messages or []))
+
+    def append(self, session_id, role, content):
+        """Append a message; returns False if the session is unknown or expired"""
+        with self._lock:
+            messages = self._sessions.get(session_id)
+            if messages is None:
+                return False
+            messages.append({"role": role, "content": content})
+            # Writing again restarts the session's TTL
+            self._sessions.set(session_id, messages)
+            return True
+
+    def get(self, session_id):
+        """Return a copy of the transcript, or None if unknown or expired"""
+        with self._lock:
+            messages = self._sessions.get(session_id)
+            return None if messages is None else list(messages)
+
+
+class SQLiteTranscriptStore:
+    """Transcripts in a SQLite file shared by every worker process"""
+
+    def __init__(self, path, ttl=6 * 3600):
+        self.path = path
+        self.ttl = ttl
+        self._sqlite = SQLiteFile(path)
+        with self._sqlite.transaction() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS transcript_sessions ("
+                "session_id TEXT PRIMARY KEY, updated_at REAL NOT NULL)"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS transcript_messages ("
+                "session_id TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL, "
+                "content TEXT NOT NULL, PRIMARY KEY (session_id, seq))"
+            )
+
+    def create(self, session_id, messages=None):
+        now = time.time()
+        with self._sqlite.transaction() as db:
+            self._purge_expired(db, now)
+            db.execute("DELETE FROM transcript_messages WHERE session_id = ?", (session_id,))
+            db.execute(
+                "INSERT OR REPLACE INTO transcript_sessions (session_id, updated_at) VALUES (?, ?)",
+                (session_id, now),
+            )
+            db.executemany(
+                "INSERT INTO transcript_messages (session_id, seq, role, content) VALUES (?, ?, ?, ?)",
+                [(session_id, seq, m["role"], m["content"]) for seq, m in enumerate(messages or [])],
+            )
+
+    def append(self, session_id, role, content):
+        """Append a message; returns False if the session is unknown or expired"""
+        now = time.time()
+        with self._sqlite.transaction() as db:
+            row = db.execute(
+                "SELECT updated_at FROM transcript_sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None or row[0] < now - self.ttl:
+                return False
+            db.execute(
+                "INSERT INTO transcript_messages (session_id, seq, role, content) "
+                "SELECT ?, COUNT(*), ?, ? FROM transcript_messages WHERE session_id = ?",
+                (session_id, role, content, session_id),
+            )
+            db.execute(
+                "UPDATE transcript_sessions SET updated_at = ? WHERE session_id = ?",
+                (now, session_id),
+            )
+            return True
+
+    def get(self, session_id):
+        """Return the transcript, or None if unknown or expired"""
+        with self._sqlite.transaction() as db:
+            row = db.execute(
+                "SELECT updated_at FROM transcript_sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None or row[0] < time.time() - self.ttl:
+                return None
+            rows = db.execute(
+                "SELECT role, content FROM transcript_messages WHERE session_id = ? ORDER BY seq",
+                (session_id,),
+            ).fetchall()
+            return [{"role": role, "content": content} for role, content in rows]
+
+    def _purge_expired(self, db, now):
+        cutoff = now - self.ttl
+        db.execute(
+            "DELETE FROM transcript_messages WHERE session_id IN "
+            "(SELECT session_id FROM transcript_sessions WHERE updated_at < ?)",
+            (cutoff,),
+        )
+        db.execute("DELETE FROM transcript_sessions WHERE updated_at < ?", (cutoff,))
+
+
+def create_transcript_store():
+    """Build the store selected by the TRANSCRIPT_* environment variables"""
+    ttl = int(os.getenv("TRANSCRIPT_TTL", 6 * 3600))
+    path = os.getenv("TRANSCRIPT_DB")
+    if path:
+        return SQLiteTranscriptStore(path, ttl=ttl)
+    return MemoryTranscriptStore(
+        max_sessions=int(os.getenv("TRANSCRIPT_MAX_SESSIONS", 10000)),
+        ttl=ttl,
+    )